@@ -5,3 +5,5 @@ class ContractsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "contracts"
 
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,153 @@
+import base64
+import functools
+import os
+from collections import namedtuple
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+from .storage import blob_digest, get_document_storage
+
+SIGNING_SALT = 'contracts.direct_uploads'
+
+UploadedObject = namedtuple('UploadedObject', ['size', 'sha256'])
+
+
+@functools.lru_cache(maxsize=None)
+def get_direct_uploads():
+    """
+    Backend presigning direct document uploads (``DOCUMENT_DIRECT_UPLOADS``):
+    the browser PUTs the file straight to storage and the API only records
+    it when the client confirms.
+
+    A backend implements ``presign(upload, request)``; ``stat(upload)``,
+    the size and SHA-256 of what was uploaded or None; ``ingest(upload)``,
+    which takes a new reference on the object in the document storage and
+    returns its name; and ``delete(upload)``, which drops the uploaded
+    object once it has been ingested or rejected.
+    """
+    config = settings.DOCUMENT_DIRECT_UPLOADS
+    return import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+
+
+class LocalPresignedUploads:
+    """
+    URLs carry a signed, expiring token for ``LocalDirectUploadView``,
+    which streams the PUT body into the document storage, where it is
+    hashed and deduplicated like any other upload. For development and
+    single-server installs: the bytes still pass through the app servers.
+    """
+
+    requires_sha256 = False
+
+    def presign(self, upload, request):
+        token = signing.dumps(str(upload.pk), salt=SIGNING_SALT)
+        url = reverse('document-direct-upload', args=[token])
+        return {
+            'url': request.build_absolute_uri(url),
+            'method': 'PUT',
+            'headers': {'Content-Type': 'application/octet-stream'},
+        }
+
+    @staticmethod
+    def unsign(token):
+        """Upload id of a token; raises ``signing.BadSignature`` when invalid or expired"""
+        max_age = settings.DIRECT_UPLOAD_URL_LIFETIME.total_seconds()
+        return signing.loads(token, salt=SIGNING_SALT, max_age=max_age)
+
+    def stat(self, upload):
+        storage = get_document_storage()
+        if not upload.object_name or not storage.exists(upload.object_name):
+            return None
+        return UploadedObject(storage.size(upload.object_name), blob_digest(upload.object_name))
+
+    def ingest(self, upload):
+        # The PUT already stored the blob; the document takes its own reference
+        storage = get_document_storage()
+        size, sha256 = self.stat(upload)
+        return storage.ingest(storage.path(upload.object_name), sha256, size)
+
+    def delete(self, upload):
+        if upload.object_name:
+            get_document_storage().delete(upload.object_name)
+
+
+class S3PresignedUploads:
+    """
+    Presigned ``PutObject`` URLs for an S3-compatible bucket (AWS, or MinIO
+    through ``endpoint_url``), so upload bytes never reach the app servers.
+
+    The URL is signed with the declared SHA-256 as ``x-amz-checksum-sha256``:
+    the bucket rejects a body that does not match, and ``stat`` reads the
+    checksum back with HEAD. On confirm the object is copied from the bucket
+    into the document storage over the server's own link, then deleted.
+    """
+
+    requires_sha256 = True
+
+    def __init__(self, bucket, key_prefix='direct-uploads/', **client_options):
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError:
+            raise ImproperlyConfigured('S3PresignedUploads requires boto3')
+        self.bucket = bucket
+        self.key_prefix = key_prefix
+        # Checksum headers are only signed by SigV4
+        client_options.setdefault('config', Config(signature_version='s3v4'))
+        self.client = boto3.client('s3', **client_options)
+
+    def presign(self, upload, request):
+        upload.object_name = f'{self.key_prefix}{upload.pk}'
+        upload.save(update_fields=['object_name', 'updated_at'])
+        checksum = base64.b64encode(bytes.fromhex(upload.sha256)).decode('ascii')
+        url = self.client.generate_presigned_url(
+            'put_object',
+            Params={
+                'Bucket': self.bucket,
+                'Key': upload.object_name,
+                'ContentType': 'application/octet-stream',
+                'ContentLength': upload.length,
+                'ChecksumSHA256': checksum,
+            },
+            ExpiresIn=int(settings.DIRECT_UPLOAD_URL_LIFETIME.total_seconds()),
+        )
+        return {
+            'url': url,
+            'method': 'PUT',
+            'headers': {
+                'Content-Type': 'application/octet-stream',
+                'x-amz-checksum-sha256': checksum,
+            },
+        }
+
+    def stat(self, upload):
+        from botocore.exceptions import ClientError
+
+        try:
+            head = self.client.head_object(
+                Bucket=self.bucket, Key=upload.object_name, ChecksumMode='ENABLED'
+            )
+        except ClientError as exc:
+            if exc.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        checksum = head.get('ChecksumSHA256') or ''
+        # Multipart uploads carry a checksum of part checksums ("...-3")
+        sha256 = base64.b64decode(checksum).hex() if checksum and '-' not in checksum else None
+        return UploadedObject(head['ContentLength'], sha256)
+
+    def ingest(self, upload):
+        body = self.client.get_object(Bucket=self.bucket, Key=upload.object_name)['Body']
+        try:
+            return get_document_storage().save(os.path.basename(upload.filename), File(body))
+        finally:
+            body.close()
+
+    def delete(self, upload):
+        if upload.object_name:
+            self.client.delete_object(Bucket=self.bucket, Key=upload.object_name)
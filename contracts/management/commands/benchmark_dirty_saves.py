@@ -0,0 +1,117 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from contracts.models import Contract
+from milestones.models import Milestone
+from payments.models import Payment
+from user.models import UserAccount
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the write volume of status flips saved with every column "
+        "against saves of the changed columns only. Works on throwaway rows "
+        "inside a transaction that is rolled back. On PostgreSQL the WAL "
+        "generated by each run is reported as well."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200,
+                            help='Rows per model.')
+        parser.add_argument('--text-size', type=int, default=20000,
+                            help='Characters in each description/notes column.')
+
+    def handle(self, *args, **options):
+        rows = max(1, options['rows'])
+        text = 'x' * max(0, options['text_size'])
+
+        with transaction.atomic():
+            instances = self._create_rows(rows, text)
+            results = []
+            for label, objects, statuses in instances:
+                for mode, all_fields in (('all columns', True), ('dirty only', False)):
+                    results.append((label, mode, *self._run(objects, statuses, all_fields)))
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"{'model':<10} {'mode':<12} {'updates':>8} {'SQL bytes':>12} "
+            f"{'WAL bytes':>12} {'seconds':>8}"
+        )
+        for label, mode, updates, sql_bytes, wal_bytes, seconds in results:
+            wal = '-' if wal_bytes is None else f'{wal_bytes:,}'
+            self.stdout.write(
+                f'{label:<10} {mode:<12} {updates:>8} {sql_bytes:>12,} {wal:>12} {seconds:>8.3f}'
+            )
+
+    def _create_rows(self, rows, text):
+        suffix = time.time_ns()
+        parent = UserAccount.objects.create_user(f'bench-parent-{suffix}@example.com', None)
+        surrogate = UserAccount.objects.create_user(f'bench-surrogate-{suffix}@example.com', None)
+        contracts = [
+            Contract.objects.create(
+                intended_parent=parent,
+                surrogate=surrogate,
+                title=f'Benchmark {index}',
+                description=text,
+                contract_amount=Decimal('1000.00'),
+            )
+            for index in range(rows)
+        ]
+        milestones = [
+            Milestone.objects.create(
+                contract=contract,
+                title='Benchmark',
+                description=text,
+                completion_notes=text,
+                amount=Decimal('10.00'),
+            )
+            for contract in contracts
+        ]
+        payments = [
+            Payment.objects.create(
+                contract=contract,
+                payer=parent,
+                payee=surrogate,
+                amount=Decimal('10.00'),
+                payment_type='milestone',
+                description=text,
+                notes=text,
+            )
+            for contract in contracts
+        ]
+        # Reload so every instance carries a snapshot, as in a view
+        return [
+            ('contract', list(Contract.objects.filter(pk__in=[c.pk for c in contracts])),
+             ('pending', 'active')),
+            ('milestone', list(Milestone.objects.filter(pk__in=[m.pk for m in milestones])),
+             ('in_progress', 'pending')),
+            ('payment', list(Payment.objects.filter(pk__in=[p.pk for p in payments])),
+             ('processing', 'pending')),
+        ]
+
+    def _run(self, objects, statuses, all_fields):
+        wal_start = self._wal_position()
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            for new_status in statuses:
+                for instance in objects:
+                    instance.status = new_status
+                    instance.save(all_fields=all_fields)
+        seconds = time.perf_counter() - started
+        wal_end = self._wal_position()
+
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        sql_bytes = sum(len(sql.encode('utf-8')) for sql in updates)
+        wal_bytes = None if wal_start is None else wal_end - wal_start
+        return len(updates), sql_bytes, wal_bytes, seconds
+
+    def _wal_position(self):
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_current_wal_insert_lsn() - '0/0'")
+            return int(cursor.fetchone()[0])
@@ -0,0 +1,201 @@
+import hashlib
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from contracts.models import ContractDocument, DocumentBlob, DocumentUpload
+from contracts.storage import blob_digest, blob_name
+from milestones.models import MilestoneDocument
+
+DOCUMENT_MODELS = (ContractDocument, MilestoneDocument)
+
+
+def _key(name):
+    """12-byte digest standing in for a media path in the reference set"""
+    return hashlib.blake2b(name.encode('utf-8'), digest_size=12).digest()
+
+
+class Command(BaseCommand):
+    help = (
+        "Find files under MEDIA_ROOT that no document, blob or pending "
+        "upload refers to and that are older than a grace period, and "
+        "report or remove them, along with blobs whose last reference was "
+        "released more than a grace period ago."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help='Leave files modified more recently than this alone.')
+        parser.add_argument('--workers', type=int, default=min(8, os.cpu_count() or 1),
+                            help='Threads walking the media tree.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report orphaned files without removing them.',
+        )
+
+    def handle(self, *args, **options):
+        root = os.path.abspath(settings.MEDIA_ROOT)
+        cutoff = time.time() - options['grace_hours'] * 3600
+        dry_run = options['dry_run']
+        batch_size = max(1, options['batch_size'])
+        started = time.perf_counter()
+
+        blob_cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        blobs, blob_bytes = self._collect_blobs(root, blob_cutoff, batch_size, dry_run)
+        referenced = self._referenced(batch_size)
+        loaded = time.perf_counter()
+
+        scanned = scanned_bytes = 0
+        orphans = []
+        for path, size, mtime in self._walk(root, max(1, options['workers'])):
+            scanned += 1
+            scanned_bytes += size
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            if mtime < cutoff and _key(name) not in referenced:
+                orphans.append((name, path, size))
+        walked = time.perf_counter()
+
+        removed = freed = 0
+        for name, path, size in orphans:
+            if dry_run:
+                self.stdout.write(f'orphaned: {name} ({size:,} bytes)')
+                continue
+            if self._still_referenced(name):
+                continue
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                continue
+            removed += 1
+            freed += size
+
+        walk_seconds = walked - loaded
+        rate = scanned / walk_seconds if walk_seconds else 0
+        prefix = '[dry run] ' if dry_run else ''
+        self.stdout.write(
+            f'{prefix}{len(referenced):,} referenced path(s) loaded in {loaded - started:.3f}s; '
+            f'{scanned:,} file(s), {scanned_bytes:,} bytes walked in {walk_seconds:.3f}s '
+            f'({rate:,.0f} files/s)'
+        )
+        orphan_bytes = sum(size for _, _, size in orphans)
+        if dry_run:
+            summary = (
+                f'{blobs:,} unreferenced blob(s), {len(orphans):,} orphaned file(s), '
+                f'{blob_bytes + orphan_bytes:,} bytes would be removed'
+            )
+        else:
+            summary = (
+                f'{blobs:,} unreferenced blob(s) and {removed:,} orphaned file(s) removed, '
+                f'{blob_bytes + freed:,} bytes freed'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}{summary}; elapsed {time.perf_counter() - started:.3f}s'
+        ))
+
+    def _referenced(self, batch_size):
+        """Keys of every media path something still points at"""
+        referenced = set()
+        sources = [(model, 'file', {}) for model in DOCUMENT_MODELS]
+        # Unconfirmed direct uploads hold a reference until they expire
+        sources.append((DocumentUpload, 'object_name', {'completed_at__isnull': True}))
+        for model, field, filters in sources:
+            last = None
+            queryset = model.objects.filter(**filters).exclude(**{field: ''})
+            while True:
+                batch = queryset if last is None else queryset.filter(pk__gt=last)
+                rows = list(batch.order_by('pk').values_list('pk', field)[:batch_size])
+                if not rows:
+                    break
+                last = rows[-1][0]
+                referenced.update(_key(name) for _, name in rows)
+
+        # Every blob with a row: referenced ones even if no document points
+        # at them, unreferenced ones are _collect_blobs()'s
+        last = ''
+        while True:
+            digests = list(
+                DocumentBlob.objects.filter(sha256__gt=last)
+                .order_by('sha256').values_list('sha256', flat=True)[:batch_size]
+            )
+            if not digests:
+                break
+            last = digests[-1]
+            referenced.update(_key(blob_name(sha256)) for sha256 in digests)
+        return referenced
+
+    def _collect_blobs(self, root, cutoff, batch_size, dry_run):
+        """
+        Remove unreferenced blobs created before ``cutoff`` that the
+        ``on_commit`` collect of their last release never got to (the
+        process died, or the hook failed). Returns how many and their bytes.
+        """
+        collected = collected_bytes = 0
+        last = ''
+        while True:
+            rows = list(
+                DocumentBlob.objects.filter(sha256__gt=last, ref_count=0, created_at__lt=cutoff)
+                .order_by('sha256').values_list('sha256', 'size')[:batch_size]
+            )
+            if not rows:
+                break
+            last = rows[-1][0]
+            for sha256, size in rows:
+                name = blob_name(sha256)
+                if dry_run:
+                    self.stdout.write(f'unreferenced blob: {name} ({size:,} bytes)')
+                elif not DocumentBlob.collect(sha256, lambda: self._unlink(os.path.join(root, name))):
+                    continue
+                collected += 1
+                collected_bytes += size
+        return collected, collected_bytes
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def _walk(self, root, workers):
+        """Yield ``(path, size, mtime)`` of every file, directories scanned in parallel"""
+        if not os.path.isdir(root):
+            return
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = {executor.submit(self._scan, root)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    files, directories = future.result()
+                    pending.update(executor.submit(self._scan, directory) for directory in directories)
+                    yield from files
+
+    def _scan(self, directory):
+        files, directories = [], []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        directories.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        files.append((entry.path, stat.st_size, stat.st_mtime))
+        except FileNotFoundError:
+            pass
+        return files, directories
+
+    def _still_referenced(self, name):
+        """Re-check one orphan right before removing it, in case it was just stored"""
+        sha256 = blob_digest(name)
+        if sha256 is not None and DocumentBlob.objects.filter(pk=sha256).exists():
+            # Blob rows, even unreferenced ones, are removed by DocumentBlob.collect()
+            return True
+        if DocumentUpload.objects.filter(object_name=name, completed_at__isnull=True).exists():
+            return True
+        return any(model.objects.filter(file=name).exists() for model in DOCUMENT_MODELS)
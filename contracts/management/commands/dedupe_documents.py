@@ -0,0 +1,112 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from contracts.models import ContractDocument, DocumentBlob
+from contracts.storage import blob_digest, get_document_storage
+from core.uploads import file_sha256
+from milestones.models import MilestoneDocument
+
+DOCUMENT_MODELS = (ContractDocument, MilestoneDocument)
+
+
+class Command(BaseCommand):
+    help = (
+        "Move document files stored before deduplication into the "
+        "content-addressed blob store: hash them in parallel, point every "
+        "document at the blob of its content and remove the old copies."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=min(8, os.cpu_count() or 1),
+                            help='Threads hashing files.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Hash the files and report the savings without writing anything.',
+        )
+
+    def handle(self, *args, **options):
+        storage = get_document_storage()
+        dry_run = options['dry_run']
+        started = time.perf_counter()
+
+        references = self._legacy_references(max(1, options['batch_size']))
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as executor:
+            hashed = dict(zip(references, executor.map(
+                lambda name: self._hash(storage.path(name)), references
+            )))
+        hashing_seconds = time.perf_counter() - started
+
+        missing = [name for name, result in hashed.items() if result is None]
+        contents = {result[0]: result[1] for result in hashed.values() if result is not None}
+        stored = set(
+            DocumentBlob.objects.filter(pk__in=list(contents)).values_list('pk', flat=True)
+        )
+        legacy_bytes = sum(result[1] for result in hashed.values() if result is not None)
+        new_bytes = sum(size for sha256, size in contents.items() if sha256 not in stored)
+
+        moved = 0
+        if not dry_run:
+            for name, result in hashed.items():
+                if result is not None:
+                    moved += self._move(storage, name, *result, references[name])
+
+        for name in missing:
+            self.stderr.write(f'missing: {name}')
+        elapsed = time.perf_counter() - started
+        rate = legacy_bytes / hashing_seconds / 1e6 if hashing_seconds else 0
+        prefix = '[dry run] ' if dry_run else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}{len(hashed)} file(s) for '
+            f'{sum(len(docs) for docs in references.values())} document(s): '
+            f'{len(contents)} distinct content(s), {len(contents) - len(stored)} new blob(s), '
+            f'{len(missing)} missing, {moved} document(s) moved'
+        ))
+        self.stdout.write(
+            f'{prefix}{legacy_bytes:,} bytes hashed at {rate:.1f} MB/s; '
+            f'{legacy_bytes - new_bytes:,} bytes reclaimed; elapsed {elapsed:.3f}s'
+        )
+
+    def _legacy_references(self, batch_size):
+        """``{file name: [(model, pk), ...]}`` of files outside the blob store"""
+        references = {}
+        for model in DOCUMENT_MODELS:
+            last = 0
+            while True:
+                rows = list(
+                    model.objects.filter(pk__gt=last).order_by('pk')
+                    .values_list('pk', 'file')[:batch_size]
+                )
+                if not rows:
+                    break
+                last = rows[-1][0]
+                for pk, name in rows:
+                    if name and blob_digest(name) is None:
+                        references.setdefault(name, []).append((model, pk))
+        return references
+
+    def _hash(self, path):
+        try:
+            return file_sha256(path), os.path.getsize(path)
+        except FileNotFoundError:
+            return None
+
+    def _move(self, storage, name, sha256, size, documents):
+        """Point ``documents`` at the blob of ``name``; returns how many moved"""
+        moved = 0
+        with transaction.atomic():
+            for model, pk in documents:
+                blob = storage.ingest(storage.path(name), sha256, size)
+                # Skip documents whose file changed since they were read
+                if model.objects.filter(pk=pk, file=name).update(file=blob):
+                    moved += 1
+                else:
+                    storage.delete(blob)
+        if not any(model.objects.filter(file=name).exists() for model in DOCUMENT_MODELS):
+            os.unlink(storage.path(name))
+        return moved
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from contracts.models import DocumentUpload
+from core.uploads import Spool, SpoolBusy
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired resumable uploads and their spool files in batches. "
+        "Meant to run periodically."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        deleted = busy = 0
+        last = None
+        while True:
+            # Served by the expires_at index
+            batch = DocumentUpload.objects.filter(expires_at__lte=now).order_by('expires_at', 'pk')
+            if last is not None:
+                batch = batch.filter(expires_at__gte=last[0]).exclude(
+                    expires_at=last[0], pk__lte=last[1]
+                )
+            uploads = list(batch[:options['batch_size']])
+            if not uploads:
+                break
+            last = (uploads[-1].expires_at, uploads[-1].pk)
+            for upload in uploads:
+                try:
+                    with Spool(upload.spool_path) as spool:
+                        spool.discard()
+                        upload.discard()
+                except SpoolBusy:
+                    # Still being written to; the next run gets it
+                    busy += 1
+                    continue
+                deleted += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} expired upload(s); skipped {busy} in use'
+        ))
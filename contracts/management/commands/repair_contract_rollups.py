@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from contracts.models import Contract, ContractRollup
+from core.cache import invalidate_contract
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute contract rollups from the milestone and payment tables and "
+        "report rows that had drifted from their stored totals."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drift without writing anything.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        dry_run = options['dry_run']
+        started = time.perf_counter()
+
+        checked = drifted = batches = 0
+        last = 0
+        while True:
+            contract_ids = list(
+                Contract.objects.filter(pk__gt=last).order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not contract_ids:
+                break
+            batches += 1
+            checked += len(contract_ids)
+            last = contract_ids[-1]
+
+            with transaction.atomic():
+                stored = {
+                    rollup.contract_id: self._totals(rollup)
+                    for rollup in ContractRollup.objects.select_for_update().filter(
+                        contract_id__in=contract_ids
+                    )
+                }
+                rebuilt = ContractRollup.recompute(contract_ids)
+                changed = [
+                    rollup.contract_id for rollup in rebuilt
+                    if stored.get(rollup.contract_id) != self._totals(rollup)
+                ]
+                if dry_run:
+                    transaction.set_rollback(True)
+            drifted += len(changed)
+            for contract_id in changed:
+                self.stdout.write(f'contract {contract_id}: {stored.get(contract_id, "missing")}')
+                if not dry_run:
+                    invalidate_contract(contract_id)
+
+        elapsed = time.perf_counter() - started
+        prefix = '[dry run] ' if dry_run else ''
+        verb = 'would be repaired' if dry_run else 'repaired'
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}Checked {checked} contract rollup(s) in {batches} batch(es): '
+            f'{drifted} {verb} ({elapsed:.3f}s)'
+        ))
+
+    def _totals(self, rollup):
+        return {field: getattr(rollup, field) for field in ContractRollup.TOTAL_FIELDS}
@@ -0,0 +1,85 @@
+# Generated by Django 4.2.27 on 2026-10-18 00:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("contracts", "0002_keyset_ordering"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="contract",
+            index=models.Index(
+                fields=["intended_parent", "-created_at", "-id"],
+                name="contract_parent_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="contract",
+            index=models.Index(
+                fields=["surrogate", "-created_at", "-id"],
+                name="contract_surrogate_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="contract",
+            index=models.Index(
+                condition=models.Q(("status__in", ["pending", "active"])),
+                fields=["intended_parent", "-created_at"],
+                name="contract_parent_active_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="contract",
+            index=models.Index(
+                condition=models.Q(("status__in", ["pending", "active"])),
+                fields=["surrogate", "-created_at"],
+                name="contract_surrogate_active_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="contractdocument",
+            index=models.Index(
+                fields=["contract", "-uploaded_at", "-id"],
+                name="contractdoc_contract_idx",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="contract",
+            name="intended_parent",
+            field=models.ForeignKey(
+                db_index=False,
+                help_text="The intended parent(s)",
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="contracts_as_parent",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="contract",
+            name="surrogate",
+            field=models.ForeignKey(
+                db_index=False,
+                help_text="The surrogate mother",
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="contracts_as_surrogate",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="contractdocument",
+            name="contract",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="documents",
+                to="contracts.contract",
+            ),
+        ),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 4.2.27 on 2026-10-18 00:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_participants(apps, schema_editor):
+    Contract = apps.get_model("contracts", "Contract")
+    ContractParticipant = apps.get_model("contracts", "ContractParticipant")
+
+    batch = []
+    contracts = Contract.objects.values_list("id", "intended_parent_id", "surrogate_id")
+    for contract_id, parent_id, surrogate_id in contracts.iterator(chunk_size=2000):
+        batch.append(
+            ContractParticipant(
+                contract_id=contract_id, user_id=parent_id, role="intended_parent"
+            )
+        )
+        batch.append(
+            ContractParticipant(
+                contract_id=contract_id, user_id=surrogate_id, role="surrogate"
+            )
+        )
+        if len(batch) >= 2000:
+            ContractParticipant.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    ContractParticipant.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("contracts", "0003_access_path_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContractParticipant",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "role",
+                    models.CharField(
+                        choices=[
+                            ("intended_parent", "Intended Parent"),
+                            ("surrogate", "Surrogate"),
+                            ("agency", "Agency"),
+                            ("lawyer", "Lawyer"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "contract",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="participants",
+                        to="contracts.contract",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="contract_participations",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["contract", "role"],
+                "indexes": [
+                    models.Index(
+                        fields=["user", "contract"],
+                        name="participant_user_contract_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="contractparticipant",
+            constraint=models.UniqueConstraint(
+                fields=("contract", "user", "role"), name="contract_participant_unique"
+            ),
+        ),
+        migrations.RunPython(backfill_participants, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-18 01:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contracts", "0004_contract_participants"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="contract",
+            name="version",
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.27 on 2026-10-18 01:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contracts", "0005_contract_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="contract",
+            name="overdue_milestones",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text="Open milestones past their due date, kept by scan_overdue_milestones",
+            ),
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 4.2.27 on 2026-10-18 01:13
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+import django.db.models.deletion
+
+
+def backfill_rollups(apps, schema_editor):
+    Contract = apps.get_model("contracts", "Contract")
+    ContractRollup = apps.get_model("contracts", "ContractRollup")
+    Milestone = apps.get_model("milestones", "Milestone")
+    Payment = apps.get_model("payments", "Payment")
+
+    completed = Q(status="completed")
+    contract_ids = list(Contract.objects.order_by("pk").values_list("pk", flat=True))
+    for start in range(0, len(contract_ids), 500):
+        batch = contract_ids[start : start + 500]
+        totals = {contract_id: {} for contract_id in batch}
+        milestones = (
+            Milestone.objects.filter(contract_id__in=batch)
+            .order_by()
+            .values("contract_id")
+            .annotate(
+                milestone_count=Count("id"),
+                milestones_completed=Count("id", filter=completed),
+                milestone_amount=Sum("amount"),
+                completed_milestone_amount=Sum("amount", filter=completed),
+            )
+        )
+        payments = (
+            Payment.objects.filter(contract_id__in=batch, status="completed")
+            .order_by()
+            .values("contract_id")
+            .annotate(total_paid=Sum("amount"))
+        )
+        for row in [*milestones, *payments]:
+            contract_id = row.pop("contract_id")
+            totals[contract_id].update(
+                {field: value or 0 for field, value in row.items()}
+            )
+        ContractRollup.objects.bulk_create(
+            [
+                ContractRollup(contract_id=contract_id, **values)
+                for contract_id, values in totals.items()
+            ]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contracts", "0006_overdue_tracking"),
+        ("milestones", "0007_overdue_tracking"),
+        ("payments", "0008_milestone_payments"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContractRollup",
+            fields=[
+                (
+                    "contract",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="rollup",
+                        serialize=False,
+                        to="contracts.contract",
+                    ),
+                ),
+                ("milestone_count", models.PositiveIntegerField(default=0)),
+                ("milestones_completed", models.PositiveIntegerField(default=0)),
+                (
+                    "milestone_amount",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                (
+                    "completed_milestone_amount",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                (
+                    "total_paid",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        help_text="Sum of completed payments",
+                        max_digits=12,
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
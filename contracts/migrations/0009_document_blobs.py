@@ -0,0 +1,55 @@
+# Generated by Django 4.2.27 on 2026-10-18 01:21
+
+import os
+
+import contracts.storage
+from django.db import migrations, models
+
+
+def backfill_filenames(apps, schema_editor):
+    ContractDocument = apps.get_model("contracts", "ContractDocument")
+    documents = []
+    for document in ContractDocument.objects.filter(filename="").only("id", "file").iterator():
+        document.filename = os.path.basename(document.file.name)
+        documents.append(document)
+    ContractDocument.objects.bulk_update(documents, ["filename"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contracts", "0008_document_uploads"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DocumentBlob",
+            fields=[
+                (
+                    "sha256",
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ("size", models.PositiveBigIntegerField()),
+                ("ref_count", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="contractdocument",
+            name="filename",
+            field=models.CharField(
+                blank=True,
+                help_text="Name the file was uploaded under; stored files are named by content",
+                max_length=255,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="contractdocument",
+            name="file",
+            field=models.FileField(
+                storage=contracts.storage.get_document_storage,
+                upload_to="contracts/documents/",
+            ),
+        ),
+        migrations.RunPython(backfill_filenames, migrations.RunPython.noop),
+    ]
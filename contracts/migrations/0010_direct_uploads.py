@@ -0,0 +1,30 @@
+# Generated by Django 4.2.27 on 2026-10-18 01:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contracts", "0009_document_blobs"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="documentupload",
+            name="direct",
+            field=models.BooleanField(
+                default=False,
+                help_text="Sent in one PUT to a presigned URL instead of in chunks",
+            ),
+        ),
+        migrations.AddField(
+            model_name="documentupload",
+            name="object_name",
+            field=models.CharField(
+                blank=True,
+                help_text="Name in the document storage a direct upload is written to",
+                max_length=255,
+            ),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.27 on 2026-10-18 02:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_updated_at(apps, schema_editor):
+    ContractDocument = apps.get_model("contracts", "ContractDocument")
+    ContractDocument.objects.update(updated_at=models.F("uploaded_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contracts", "0010_direct_uploads"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="contractdocument",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
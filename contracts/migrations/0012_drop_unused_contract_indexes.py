@@ -0,0 +1,25 @@
+# Generated by Django 4.2.27 on 2026-10-18 02:06
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contracts", "0011_document_updated_at"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="contractparticipant",
+            options={},
+        ),
+        migrations.RemoveIndex(
+            model_name="contract",
+            name="contract_parent_active_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="contract",
+            name="contract_surrogate_active_idx",
+        ),
+    ]
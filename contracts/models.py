@@ -1,8 +1,20 @@
-from django.db import models
+import os
+import uuid
+from decimal import Decimal
+
+from django.core.files import File
+from django.db import models, transaction
+from django.db.models import Count, F, Q, Sum
 from django.conf import settings
+from django.utils import timezone
+
+from core.models import DirtyFieldsMixin, VersionedModel
+from core.uploads import ChecksumMismatch, file_sha256, spool_path
 
+from .storage import get_document_storage
 
-class Contract(models.Model):
+
+class Contract(DirtyFieldsMixin, VersionedModel):
     """Contract model for surrogate escrow agreements"""
     
     STATUS_CHOICES = [
@@ -13,17 +25,28 @@ class Contract(models.Model):
         ('cancelled', 'Cancelled'),
     ]
     
+    # Statuses each status may move to in a bulk transition
+    STATUS_TRANSITIONS = {
+        'draft': ('pending', 'cancelled'),
+        'pending': ('draft', 'active', 'cancelled'),
+        'active': ('completed', 'cancelled'),
+        'completed': (),
+        'cancelled': (),
+    }
+    
     # Parties
     intended_parent = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
         related_name='contracts_as_parent',
+        db_index=False,  # covered by contract_parent_created_idx
         help_text='The intended parent(s)'
     )
     surrogate = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
         related_name='contracts_as_surrogate',
+        db_index=False,  # covered by contract_surrogate_created_idx
         help_text='The surrogate mother'
     )
     
@@ -36,6 +59,11 @@ class Contract(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
     start_date = models.DateField(null=True, blank=True)
     end_date = models.DateField(null=True, blank=True)
+    overdue_milestones = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text='Open milestones past their due date, kept by scan_overdue_milestones'
+    )
     
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
@@ -48,19 +76,383 @@ class Contract(models.Model):
     )
     
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Role-scoped list queries: filter on one party, sort by recency.
+            models.Index(
+                fields=['intended_parent', '-created_at', '-id'],
+                name='contract_parent_created_idx',
+            ),
+            models.Index(
+                fields=['surrogate', '-created_at', '-id'],
+                name='contract_surrogate_created_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.get_status_display()}"
+    
+    def save(self, *args, **kwargs):
+        # Participant rows only need syncing when a party column is written
+        update_fields = kwargs.get('update_fields')
+        written = self.get_dirty_fields() if update_fields is None else update_fields
+        parties_changed = self._state.adding or bool(
+            {'intended_parent', 'surrogate', 'intended_parent_id', 'surrogate_id'} & set(written)
+        )
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if parties_changed:
+                self.sync_participants()
+            if adding:
+                ContractRollup.objects.create(contract=self)
+    
+    def sync_participants(self):
+        """Mirror the intended_parent/surrogate columns into ContractParticipant"""
+        parties = {
+            ContractParticipant.ROLE_INTENDED_PARENT: self.intended_parent_id,
+            ContractParticipant.ROLE_SURROGATE: self.surrogate_id,
+        }
+        current = Q()
+        for role, user_id in parties.items():
+            current |= Q(role=role, user_id=user_id)
+        
+        ContractParticipant.objects.filter(
+            contract=self, role__in=parties
+        ).exclude(current).delete()
+        ContractParticipant.objects.bulk_create(
+            [
+                ContractParticipant(contract=self, user_id=user_id, role=role)
+                for role, user_id in parties.items()
+            ],
+            ignore_conflicts=True,
+        )
+
+
+class ContractParticipant(models.Model):
+    """
+    Denormalized (contract, user, role) rows used for access checks.
+
+    The intended parent and surrogate rows are maintained by
+    ``Contract.save()``; additional parties such as agencies and lawyers are
+    added directly.
+    """
+    
+    ROLE_INTENDED_PARENT = 'intended_parent'
+    ROLE_SURROGATE = 'surrogate'
+    ROLE_CHOICES = [
+        (ROLE_INTENDED_PARENT, 'Intended Parent'),
+        (ROLE_SURROGATE, 'Surrogate'),
+        ('agency', 'Agency'),
+        ('lawyer', 'Lawyer'),
+    ]
+    
+    contract = models.ForeignKey(
+        Contract,
+        on_delete=models.CASCADE,
+        related_name='participants',
+        db_index=False,  # covered by contract_participant_unique
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='contract_participations',
+        db_index=False,  # covered by participant_user_contract_idx
+    )
+    role = models.CharField(max_length=20, choices=ROLE_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['contract', 'user', 'role'],
+                name='contract_participant_unique',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'contract'], name='participant_user_contract_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user} - {self.get_role_display()} on {self.contract_id}"
+    
+    @classmethod
+    def visible_to(cls, user, contract_ref='pk'):
+        """
+        Condition limiting a queryset to contracts ``user`` takes part in.
+
+        ``contract_ref`` is the path from the outer model to the contract id,
+        e.g. ``'contract_id'`` for milestones or ``'milestone__contract_id'``.
+        The ``IN (SELECT contract_id ...)`` is planned as a semi-join driven by
+        one range scan of ``participant_user_contract_idx``.
+        """
+        contract_ids = cls.objects.filter(user=user).values('contract_id')
+        return Q(**{f'{contract_ref}__in': contract_ids})
 
 
-class ContractDocument(models.Model):
+class ContractRollup(models.Model):
+    """
+    Per-contract milestone and payment totals, kept up to date with delta
+    arithmetic by ``Milestone.save()`` / ``Payment.save()`` in the same
+    transaction, so contract screens read them instead of aggregating.
+
+    Writes that bypass ``save()`` (bulk updates, ``bulk_create``) call
+    ``recompute()``; ``manage.py repair_contract_rollups`` rebuilds all rows.
+    """
+    
+    contract = models.OneToOneField(
+        Contract,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='rollup'
+    )
+    milestone_count = models.PositiveIntegerField(default=0)
+    milestones_completed = models.PositiveIntegerField(default=0)
+    milestone_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    completed_milestone_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_paid = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        help_text='Sum of completed payments'
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    TOTAL_FIELDS = (
+        'milestone_count',
+        'milestones_completed',
+        'milestone_amount',
+        'completed_milestone_amount',
+        'total_paid',
+    )
+    
+    def __str__(self):
+        return f"Rollup for contract {self.contract_id}"
+    
+    @property
+    def completion_percentage(self):
+        if not self.milestone_count:
+            return Decimal('0.00')
+        return (Decimal(100) * self.milestones_completed / self.milestone_count).quantize(Decimal('0.01'))
+    
+    @staticmethod
+    def merge_deltas(*contributions):
+        """
+        Sum ``(sign, contract_id, {field: value})`` contributions into
+        ``{contract_id: {field: delta}}``; old values go in with sign -1.
+        """
+        deltas = {}
+        for sign, contract_id, values in contributions:
+            if contract_id is None:
+                continue
+            totals = deltas.setdefault(contract_id, {})
+            for field, value in values.items():
+                totals[field] = totals.get(field, 0) + sign * value
+        return deltas
+    
+    @classmethod
+    def apply_deltas(cls, deltas):
+        """Add ``{contract_id: {field: delta}}`` to the stored totals"""
+        now = timezone.now()
+        missing = []
+        for contract_id, changes in deltas.items():
+            changes = {field: F(field) + delta for field, delta in changes.items() if delta}
+            if not changes:
+                continue
+            if not cls.objects.filter(contract_id=contract_id).update(updated_at=now, **changes):
+                missing.append(contract_id)
+        if missing:
+            cls.recompute(missing)
+    
+    @classmethod
+    def recompute(cls, contract_ids):
+        """Rebuild the rows of ``contract_ids`` from two grouped aggregates"""
+        from milestones.models import Milestone
+        from payments.models import Payment
+        
+        contract_ids = list(Contract.objects.filter(pk__in=list(contract_ids)).values_list('pk', flat=True))
+        if not contract_ids:
+            return []
+        completed = Q(status='completed')
+        totals = {contract_id: dict.fromkeys(cls.TOTAL_FIELDS, 0) for contract_id in contract_ids}
+        milestones = (
+            Milestone.objects.filter(contract_id__in=contract_ids)
+            .order_by()
+            .values('contract_id')
+            .annotate(
+                milestone_count=Count('id'),
+                milestones_completed=Count('id', filter=completed),
+                milestone_amount=Sum('amount'),
+                completed_milestone_amount=Sum('amount', filter=completed),
+            )
+        )
+        payments = (
+            Payment.objects.filter(contract_id__in=contract_ids, status='completed')
+            .order_by()
+            .values('contract_id')
+            .annotate(total_paid=Sum('amount'))
+        )
+        for row in [*milestones, *payments]:
+            contract_id = row.pop('contract_id')
+            totals[contract_id].update({field: value or 0 for field, value in row.items()})
+        
+        rollups = [cls(contract_id=contract_id, **values) for contract_id, values in totals.items()]
+        return cls.objects.bulk_create(
+            rollups,
+            update_conflicts=True,
+            unique_fields=['contract'],
+            update_fields=[*cls.TOTAL_FIELDS, 'updated_at'],
+        )
+
+
+class ContractRollupMixin:
+    """
+    Model mixin keeping ``ContractRollup`` in step with ``save()`` and
+    ``delete()``: the row's old contribution (from the load-time snapshot
+    of ``DirtyFieldsMixin``) is subtracted and the new one added, in the
+    same transaction as the write.
+
+    Subclasses implement ``rollup_contribution(state)``, mapping the values
+    of ``rollup_attnames`` to ``(contract_id, {rollup field: value})``.
+    """
+    
+    rollup_attnames = ('contract_id', 'status', 'amount')
+    
+    def _previous_rollup_state(self):
+        """Values as loaded; None for a new row, False when not all were loaded"""
+        if self._state.adding:
+            return None
+        snapshot = getattr(self, '_loaded_values', None) or {}
+        if not all(name in snapshot for name in self.rollup_attnames):
+            return False
+        return {name: snapshot[name] for name in self.rollup_attnames}
+    
+    def save(self, *args, **kwargs):
+        previous = self._previous_rollup_state()
+        update_fields = kwargs.get('update_fields')
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if previous is False:
+                ContractRollup.recompute([self.contract_id])
+                return
+            
+            current = {}
+            for name in self.rollup_attnames:
+                # Values left out of update_fields were not written
+                written = (
+                    update_fields is None
+                    or name in update_fields
+                    or name.removesuffix('_id') in update_fields
+                )
+                current[name] = getattr(self, name) if written or previous is None else previous[name]
+            contributions = [(1, *self.rollup_contribution(current))]
+            if previous is not None:
+                contributions.append((-1, *self.rollup_contribution(previous)))
+            ContractRollup.apply_deltas(ContractRollup.merge_deltas(*contributions))
+    
+    def delete(self, *args, **kwargs):
+        state = self._previous_rollup_state() or {
+            name: getattr(self, name) for name in self.rollup_attnames
+        }
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            ContractRollup.apply_deltas(
+                ContractRollup.merge_deltas((-1, *self.rollup_contribution(state)))
+            )
+        return result
+
+
+class DocumentBlob(models.Model):
+    """
+    One stored file content, shared by every document whose file has that
+    SHA-256 (see ``contracts.storage.ContentAddressedStorage``).
+    ``ref_count`` is the number of document files pointing at it.
+    """
+    
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Blob {self.sha256} ({self.ref_count} refs)"
+    
+    @classmethod
+    def acquire(cls, sha256, size, put):
+        """
+        Add a reference to blob ``sha256``. ``put()`` stores the file and
+        runs with the row locked, so it cannot interleave with ``collect()``
+        removing the same blob.
+        """
+        with transaction.atomic():
+            cls.objects.select_for_update().get_or_create(sha256=sha256, defaults={'size': size})
+            put()
+            cls.objects.filter(pk=sha256).update(ref_count=F('ref_count') + 1)
+    
+    @classmethod
+    def release(cls, sha256, remove):
+        """
+        Drop a reference to blob ``sha256``; once the transaction commits,
+        a blob left without references is removed with ``remove()``.
+        """
+        released = cls.objects.filter(pk=sha256, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+        if released:
+            transaction.on_commit(lambda: cls.collect(sha256, remove))
+    
+    @classmethod
+    def collect(cls, sha256, remove):
+        """Remove blob ``sha256`` if it still has no references; True if it did"""
+        with transaction.atomic():
+            blob = cls.objects.select_for_update().filter(pk=sha256, ref_count=0).first()
+            if blob is None:
+                return False
+            remove()
+            blob.delete()
+            return True
+
+
+class DocumentFileMixin:
+    """
+    Model mixin for documents whose ``file`` lives in the document storage:
+    records the uploaded name in ``filename`` and, when a save replaces the
+    file, releases the reference to the old one in the same transaction.
+    """
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_file_name = instance.__dict__.get('file')
+        return instance
+    
+    def save(self, *args, **kwargs):
+        if self.file and not self.file._committed:
+            self.filename = os.path.basename(self.file.name)
+        previous = getattr(self, '_loaded_file_name', None)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if previous and previous != self.file.name:
+                self.file.storage.delete(previous)
+        self._loaded_file_name = self.file.name
+
+
+class ContractDocument(DocumentFileMixin, models.Model):
     """Documents associated with a contract"""
     
-    contract = models.ForeignKey(Contract, on_delete=models.CASCADE, related_name='documents')
+    contract = models.ForeignKey(
+        Contract,
+        on_delete=models.CASCADE,
+        related_name='documents',
+        db_index=False,  # covered by contractdoc_contract_idx
+    )
     title = models.CharField(max_length=255)
-    file = models.FileField(upload_to='contracts/documents/')
+    file = models.FileField(upload_to='contracts/documents/', storage=get_document_storage)
+    filename = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text='Name the file was uploaded under; stored files are named by content'
+    )
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     uploaded_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.SET_NULL,
@@ -68,7 +460,169 @@ class ContractDocument(models.Model):
     )
     
     class Meta:
-        ordering = ['-uploaded_at']
+        ordering = ['-uploaded_at', '-id']
+        indexes = [
+            models.Index(
+                fields=['contract', '-uploaded_at', '-id'],
+                name='contractdoc_contract_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.contract.title}"
+
+
+class DocumentUpload(models.Model):
+    """
+    Upload of a contract document, or of a milestone document when
+    ``milestone`` is set.
+    
+    Resumable uploads append chunks to a spool file outside MEDIA_ROOT
+    (see ``core.uploads``); ``offset`` is how many bytes of ``length`` are
+    safely on disk, and the document row is created when the last byte
+    arrives. Direct uploads go to a presigned URL (see
+    ``contracts.direct_uploads``) and become a document on ``confirm()``.
+    """
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    contract = models.ForeignKey(
+        Contract,
+        on_delete=models.CASCADE,
+        related_name='uploads'
+    )
+    milestone = models.ForeignKey(
+        'milestones.Milestone',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='uploads'
+    )
+    title = models.CharField(max_length=255)
+    filename = models.CharField(max_length=255)
+    length = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    sha256 = models.CharField(
+        max_length=64,
+        blank=True,
+        help_text='Expected hex SHA-256 of the whole file, checked on completion'
+    )
+    direct = models.BooleanField(
+        default=False,
+        help_text='Sent in one PUT to a presigned URL instead of in chunks'
+    )
+    object_name = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text='Name in the document storage a direct upload is written to'
+    )
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='document_uploads'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField(db_index=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    contract_document = models.OneToOneField(
+        ContractDocument,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='upload'
+    )
+    milestone_document = models.OneToOneField(
+        'milestones.MilestoneDocument',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='upload'
+    )
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Upload {self.id} - {self.offset}/{self.length}"
+    
+    @property
+    def spool_path(self):
+        return spool_path(self.id)
+    
+    def record_offset(self, offset):
+        """Store the new offset; call with the spool locked"""
+        self.offset = offset
+        self.save(update_fields=['offset', 'updated_at'])
+    
+    def _new_document(self):
+        from milestones.models import MilestoneDocument
+        
+        filename = os.path.basename(self.filename)
+        if self.milestone_id:
+            return MilestoneDocument(milestone_id=self.milestone_id, title=self.title,
+                                     filename=filename, uploaded_by=self.created_by)
+        return ContractDocument(contract_id=self.contract_id, title=self.title,
+                                filename=filename, uploaded_by=self.created_by)
+    
+    def _complete(self, document):
+        self.completed_at = timezone.now()
+        if self.milestone_id:
+            self.milestone_document = document
+        else:
+            self.contract_document = document
+        self.save()
+    
+    def finish(self):
+        """
+        Hash the complete spool file and move it into a ContractDocument or
+        MilestoneDocument; call with the spool locked. The document row and
+        the completion are committed together.
+        
+        The file is stored first, outside that transaction, so the blob
+        reference it takes is settled in the caller's transaction; if the
+        document transaction fails, exactly that reference is released.
+        """
+        digest = file_sha256(self.spool_path)
+        if self.sha256 and digest != self.sha256:
+            raise ChecksumMismatch(self.spool_path)
+        
+        document = self._new_document()
+        with open(self.spool_path, 'rb') as handle:
+            # Storage copies from the handle in chunks
+            document.file.save(document.filename, File(handle), save=False)
+        try:
+            with transaction.atomic():
+                document.save()
+                self.sha256 = digest
+                self._complete(document)
+        except Exception:
+            document.file.storage.delete(document.file.name)
+            raise
+        os.unlink(self.spool_path)
+        return document
+    
+    def confirm(self, name):
+        """
+        Record a directly uploaded object, already ingested into the document
+        storage as ``name``, as the document; only metadata is written. The
+        reference ``name`` holds is released if that fails.
+        """
+        document = self._new_document()
+        document.file.name = name
+        try:
+            with transaction.atomic():
+                document.save()
+                self._complete(document)
+        except Exception:
+            document.file.storage.delete(name)
+            raise
+        return document
+    
+    def discard(self):
+        """Delete the upload with any object stored for it but not yet confirmed"""
+        from .direct_uploads import get_direct_uploads
+        
+        with transaction.atomic():
+            if self.direct and self.object_name and not self.completed_at:
+                get_direct_uploads().delete(self)
+            self.delete()
@@ -1,22 +1,68 @@
+import re
+
+from django.conf import settings
+from django.urls import reverse
 from rest_framework import serializers
-from .models import Contract, ContractDocument
+from .models import Contract, ContractDocument, ContractParticipant, ContractRollup, DocumentUpload
 from user.serializers import UserListSerializer
+from core.serializers import ExpandableFieldsMixin
 
 
 class ContractDocumentSerializer(serializers.ModelSerializer):
     uploaded_by = UserListSerializer(read_only=True)
+    download_url = serializers.SerializerMethodField()
     
     class Meta:
         model = ContractDocument
-        fields = ('id', 'title', 'file', 'uploaded_at', 'uploaded_by')
-        read_only_fields = ('id', 'uploaded_at', 'uploaded_by')
+        fields = ('id', 'title', 'file', 'filename', 'download_url', 'uploaded_at', 'uploaded_by')
+        read_only_fields = ('id', 'filename', 'uploaded_at', 'uploaded_by')
+        # Media is not served directly; download_url is the only link
+        extra_kwargs = {'file': {'write_only': True}}
+    
+    def get_download_url(self, obj):
+        """Permission-checked link; media is not served directly in production"""
+        url = reverse('contract-document-download', args=[obj.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+class ContractParticipantSerializer(serializers.ModelSerializer):
+    
+    class Meta:
+        model = ContractParticipant
+        fields = ('id', 'user', 'role', 'created_at')
+        read_only_fields = ('id', 'created_at')
+
+
+class ContractRollupSerializer(serializers.ModelSerializer):
+    completion_percentage = serializers.DecimalField(max_digits=5, decimal_places=2, read_only=True)
+    outstanding_balance = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = ContractRollup
+        fields = (
+            'milestone_count',
+            'milestones_completed',
+            'completion_percentage',
+            'milestone_amount',
+            'completed_milestone_amount',
+            'total_paid',
+            'outstanding_balance',
+            'updated_at',
+        )
+        read_only_fields = fields
+    
+    def get_outstanding_balance(self, obj):
+        return f'{obj.contract.contract_amount - obj.total_paid:.2f}'
 
 
-class ContractSerializer(serializers.ModelSerializer):
+class ContractSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     intended_parent_detail = UserListSerializer(source='intended_parent', read_only=True)
     surrogate_detail = UserListSerializer(source='surrogate', read_only=True)
     created_by_detail = UserListSerializer(source='created_by', read_only=True)
     documents = ContractDocumentSerializer(many=True, read_only=True)
+    participants = ContractParticipantSerializer(many=True, read_only=True)
+    rollup = ContractRollupSerializer(read_only=True)
     
     class Meta:
         model = Contract
@@ -32,13 +78,24 @@ class ContractSerializer(serializers.ModelSerializer):
             'status',
             'start_date',
             'end_date',
+            'overdue_milestones',
+            'rollup',
             'created_at',
             'updated_at',
+            'version',
             'created_by',
             'created_by_detail',
             'documents',
+            'participants',
+        )
+        read_only_fields = ('id', 'created_at', 'updated_at', 'version', 'created_by')
+        expandable_fields = (
+            'intended_parent_detail',
+            'surrogate_detail',
+            'created_by_detail',
+            'documents',
+            'participants',
         )
-        read_only_fields = ('id', 'created_at', 'updated_at', 'created_by')
 
 
 class ContractCreateSerializer(serializers.ModelSerializer):
@@ -56,3 +113,117 @@ class ContractCreateSerializer(serializers.ModelSerializer):
             'start_date',
             'end_date',
         )
+
+
+class ContractDashboardSerializer(serializers.ModelSerializer):
+    """Compact per-contract summary built from queryset annotations"""
+    
+    milestones = serializers.SerializerMethodField()
+    next_milestone = serializers.SerializerMethodField()
+    amount_paid = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    amount_pending = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    escrow_balance = serializers.DecimalField(
+        max_digits=10, decimal_places=2, read_only=True, allow_null=True
+    )
+    
+    class Meta:
+        model = Contract
+        fields = (
+            'id',
+            'title',
+            'status',
+            'contract_amount',
+            'start_date',
+            'end_date',
+            'milestones',
+            'next_milestone',
+            'amount_paid',
+            'amount_pending',
+            'escrow_balance',
+        )
+        read_only_fields = fields
+    
+    def get_milestones(self, obj):
+        return {
+            'pending': obj.milestones_pending,
+            'in_progress': obj.milestones_in_progress,
+            'completed': obj.milestones_completed,
+            'cancelled': obj.milestones_cancelled,
+        }
+    
+    def get_next_milestone(self, obj):
+        if obj.next_milestone_id is None:
+            return None
+        return {
+            'id': obj.next_milestone_id,
+            'title': obj.next_milestone_title,
+            'due_date': obj.next_milestone_due_date,
+            'amount': serializers.DecimalField(
+                max_digits=10, decimal_places=2
+            ).to_representation(obj.next_milestone_amount),
+        }
+
+
+class DocumentUploadSerializer(serializers.ModelSerializer):
+    """
+    Starts a resumable upload. ``contract`` may be left out when
+    ``milestone`` is given; the bytes are then sent with PATCH requests.
+    """
+    
+    contract = serializers.PrimaryKeyRelatedField(queryset=Contract.objects.all(), required=False)
+    
+    class Meta:
+        model = DocumentUpload
+        fields = (
+            'id',
+            'contract',
+            'milestone',
+            'title',
+            'filename',
+            'length',
+            'offset',
+            'sha256',
+            'created_at',
+            'expires_at',
+            'completed_at',
+            'contract_document',
+            'milestone_document',
+        )
+        read_only_fields = (
+            'id',
+            'offset',
+            'created_at',
+            'expires_at',
+            'completed_at',
+            'contract_document',
+            'milestone_document',
+        )
+    
+    def validate_length(self, length):
+        if length > settings.MAX_UPLOAD_SIZE:
+            raise serializers.ValidationError(
+                f'Uploads are limited to {settings.MAX_UPLOAD_SIZE} bytes'
+            )
+        return length
+    
+    def validate_sha256(self, sha256):
+        sha256 = sha256.lower()
+        if sha256 and not re.fullmatch(r'[0-9a-f]{64}', sha256):
+            raise serializers.ValidationError('Expected a hex SHA-256 digest')
+        return sha256
+    
+    def validate(self, attrs):
+        milestone = attrs.get('milestone')
+        contract = attrs.get('contract') or (milestone.contract if milestone else None)
+        if contract is None:
+            raise serializers.ValidationError({'contract': 'This field is required.'})
+        if milestone is not None and milestone.contract_id != contract.pk:
+            raise serializers.ValidationError({'milestone': 'Milestone belongs to another contract.'})
+        
+        user = self.context['request'].user
+        if not user.is_superuser and not ContractParticipant.objects.filter(
+            contract=contract, user=user
+        ).exists():
+            raise serializers.ValidationError({'contract': 'You are not a party to this contract.'})
+        attrs['contract'] = contract
+        return attrs
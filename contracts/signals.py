@@ -0,0 +1,27 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.cache import invalidate_contract
+from .models import Contract, ContractDocument, ContractParticipant
+
+
+@receiver([post_save, post_delete], sender=Contract)
+def invalidate_contract_cache(sender, instance, **kwargs):
+    invalidate_contract(instance.pk, [instance.intended_parent_id, instance.surrogate_id])
+
+
+@receiver([post_save, post_delete], sender=ContractParticipant)
+def invalidate_participant_cache(sender, instance, **kwargs):
+    invalidate_contract(instance.contract_id, [instance.user_id])
+
+
+@receiver([post_save, post_delete], sender=ContractDocument)
+def invalidate_contract_document_cache(sender, instance, **kwargs):
+    invalidate_contract(instance.contract_id)
+
+
+@receiver(post_delete, sender=ContractDocument)
+def release_contract_document_file(sender, instance, **kwargs):
+    # Drops the blob reference; the file goes with the last one
+    if instance.file:
+        instance.file.storage.delete(instance.file.name)
@@ -0,0 +1,121 @@
+import hashlib
+import os
+import re
+import tempfile
+import uuid
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, storages
+
+BLOB_PREFIX = 'blobs'
+BLOB_NAME_RE = re.compile(rf'^{BLOB_PREFIX}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/(?P<sha256>[0-9a-f]{{64}})$')
+
+
+def get_document_storage():
+    """Storage of ContractDocument and MilestoneDocument files (``STORAGES['documents']``)"""
+    return storages['documents']
+
+
+def blob_name(sha256):
+    return f'{BLOB_PREFIX}/{sha256[:2]}/{sha256[2:4]}/{sha256}'
+
+
+def blob_digest(name):
+    """SHA-256 of a blob name; None for files stored before deduplication"""
+    match = BLOB_NAME_RE.match(name or '')
+    return match.group('sha256') if match else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage keeping each distinct content once, named by its
+    SHA-256 (``blobs/3a/7b/3a7b...``), whatever name it was saved under.
+
+    Saving hashes the content while copying it to a temporary file beside
+    the blobs, then takes a reference on its ``DocumentBlob`` row and, with
+    that row locked, renames the copy into place or drops it if the blob is
+    already there. Deleting releases a reference; the file goes when the
+    last one does. Files stored under other names before deduplication are
+    read as usual and never deleted here.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Equal content shares the name; _save picks it
+        return name
+
+    def _save(self, name, content):
+        from .models import DocumentBlob
+
+        temporary, sha256, size = self._spool(content)
+        name = blob_name(sha256)
+        try:
+            DocumentBlob.acquire(sha256, size, lambda: self._put(temporary, name))
+        finally:
+            if os.path.exists(temporary):
+                os.unlink(temporary)
+        return name
+
+    def delete(self, name):
+        from .models import DocumentBlob
+
+        sha256 = blob_digest(name)
+        if sha256 is not None:
+            DocumentBlob.release(sha256, lambda: super(ContentAddressedStorage, self).delete(name))
+
+    def _spool(self, content):
+        """Copy ``content`` to a temporary file, hashing it on the way"""
+        directory = self.path(os.path.join(BLOB_PREFIX, 'tmp'))
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=directory, suffix='.part')
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(descriptor, 'wb') as handle:
+                # File.chunks() rewinds, and skips that for unseekable streams
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    handle.write(chunk)
+                    size += len(chunk)
+                handle.flush()
+                os.fsync(handle.fileno())
+        except BaseException:
+            os.unlink(temporary)
+            raise
+        return temporary, digest.hexdigest(), size
+
+    def _put(self, temporary, name):
+        """Move ``temporary`` to ``name`` unless the blob is already stored"""
+        path = self.path(name)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(temporary, self.file_permissions_mode)
+        os.replace(temporary, path)
+
+    def ingest(self, path, sha256, size):
+        """
+        Take a reference to the blob of an existing file at ``path`` with
+        known digest, hard-linking it into place rather than copying when
+        the blob is new. Returns the blob name; ``path`` is left alone.
+        """
+        from .models import DocumentBlob
+
+        name = blob_name(sha256)
+
+        def put():
+            target = self.path(name)
+            if os.path.exists(target):
+                return
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            staged = f'{target}.{uuid.uuid4().hex}.part'
+            try:
+                os.link(path, staged)
+            except OSError:
+                with open(path, 'rb') as source:
+                    temporary, _, _ = self._spool(File(source))
+                os.replace(temporary, staged)
+            os.replace(staged, target)
+
+        DocumentBlob.acquire(sha256, size, put)
+        return name
@@ -1,4 +1,704 @@
-from django.test import TestCase
+import base64
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
 
+from contracts.direct_uploads import S3PresignedUploads
+from contracts.models import Contract, ContractDocument, ContractRollup, DocumentBlob, DocumentUpload
+from contracts.storage import blob_digest, get_document_storage
+from contracts.views import ContractViewSet, ContractDocumentViewSet
+from core.pagination import KeysetPagination
+from milestones.models import Milestone, MilestoneTemplate
+from milestones.views import MilestoneViewSet
+from payments.models import Payment
+from payments.views import PaymentViewSet, EscrowAccountViewSet
+from user.models import UserAccount
+
+# Contract access is a semi-join driven by the participant table.
+PARTICIPANT_INDEXES = ['participant_user_contract_idx', 'contract_participant_unique']
+
+
+class DocumentStorageTestCase(TestCase):
+    """Blob reference counting of contract documents"""
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media, UPLOAD_SPOOL_ROOT=os.path.join(media, 'spool'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.parent = UserAccount.objects.create_user('parent@example.com', 'pw')
+        self.surrogate = UserAccount.objects.create_user('surrogate@example.com', 'pw')
+        self.contract = Contract.objects.create(
+            intended_parent=self.parent,
+            surrogate=self.surrogate,
+            title='Agreement',
+            contract_amount=1000,
+        )
+
+    def _document(self, content, name='signed.pdf'):
+        document = ContractDocument(contract=self.contract, title=name)
+        document.file.save(name, ContentFile(content), save=False)
+        document.save()
+        return document
+
+    def _blob(self, document):
+        return DocumentBlob.objects.filter(pk=blob_digest(document.file.name)).first()
+
+    def test_failed_upload_completion_keeps_shared_blob(self):
+        content = b'%PDF signed agreement'
+        document = self._document(content)
+        upload = DocumentUpload.objects.create(
+            contract=self.contract,
+            title='copy',
+            filename='copy.pdf',
+            length=len(content),
+            offset=len(content),
+            created_by=self.parent,
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+        os.makedirs(os.path.dirname(upload.spool_path), exist_ok=True)
+        with open(upload.spool_path, 'wb') as spool:
+            spool.write(content)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with mock.patch.object(DocumentUpload, '_complete', side_effect=RuntimeError):
+                with self.assertRaises(RuntimeError):
+                    upload.finish()
+
+        self.assertEqual(ContractDocument.objects.count(), 1)
+        self.assertEqual(self._blob(document).ref_count, 1)
+        self.assertTrue(get_document_storage().exists(document.file.name))
+
+    def test_replacing_file_releases_old_blob(self):
+        document = self._document(b'first draft')
+        old_name = document.file.name
+        client = APIClient()
+        client.force_authenticate(self.parent)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.patch(
+                f'/api/contracts/documents/{document.pk}/',
+                {'file': SimpleUploadedFile('final.pdf', b'final version')},
+                format='multipart',
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('file', response.json())
+        self.assertIn('download_url', response.json())
+        document.refresh_from_db()
+        self.assertEqual(document.filename, 'final.pdf')
+        self.assertEqual(self._blob(document).ref_count, 1)
+        self.assertFalse(DocumentBlob.objects.filter(pk=blob_digest(old_name)).exists())
+        self.assertFalse(get_document_storage().exists(old_name))
+
+    def test_garbage_collector_collects_unreferenced_blobs(self):
+        document = self._document(b'superseded scan')
+        name = document.file.name
+        # A release whose on_commit collect never ran
+        ContractDocument.objects.filter(pk=document.pk).delete()
+        DocumentBlob.objects.filter(pk=blob_digest(name)).update(
+            ref_count=0, created_at=timezone.now() - timedelta(days=2)
+        )
+
+        call_command('collect_orphaned_media', dry_run=True, stdout=io.StringIO())
+        self.assertTrue(get_document_storage().exists(name))
+
+        call_command('collect_orphaned_media', stdout=io.StringIO())
+        self.assertFalse(DocumentBlob.objects.filter(pk=blob_digest(name)).exists())
+        self.assertFalse(get_document_storage().exists(name))
+
+
+class DroppedConnection(io.BytesIO):
+    """Request body whose client disconnects once the bytes run out"""
+
+    def read(self, size=-1):
+        data = super().read(size)
+        if not data and size:
+            raise ConnectionResetError('client went away')
+        return data
+
+
+class ResumableUploadTestCase(TestCase):
+    """The tus protocol of resumable uploads"""
+
+    content = b'%PDF resumable upload of a signed agreement'
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media, UPLOAD_SPOOL_ROOT=os.path.join(media, 'spool'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.parent = UserAccount.objects.create_user('parent@example.com', 'pw')
+        self.contract = Contract.objects.create(
+            intended_parent=self.parent,
+            surrogate=UserAccount.objects.create_user('surrogate@example.com', 'pw'),
+            title='Agreement',
+            contract_amount=1000,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.parent)
+        response = self.client.post('/api/contracts/uploads/', {
+            'contract': self.contract.pk,
+            'title': 'Agreement scan',
+            'filename': 'scan.pdf',
+            'length': len(self.content),
+            'sha256': hashlib.sha256(self.content).hexdigest(),
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.upload = DocumentUpload.objects.get(pk=response.json()['id'])
+        self.url = f'/api/contracts/uploads/{self.upload.pk}/'
+
+    def _patch(self, chunk, offset, checksum=None, **extra):
+        if checksum is not None:
+            extra['HTTP_UPLOAD_CHECKSUM'] = 'sha256 ' + base64.b64encode(hashlib.sha256(checksum).digest()).decode()
+        return self.client.generic(
+            'PATCH',
+            self.url,
+            chunk,
+            content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset),
+            HTTP_TUS_RESUMABLE='1.0.0',
+            **extra,
+        )
+
+    def _dropped(self, received, offset, checksum=None):
+        # The client declared the whole file but only ``received`` arrived
+        return self._patch(
+            received,
+            offset,
+            checksum=checksum,
+            CONTENT_LENGTH=str(len(self.content) - offset),
+            **{'wsgi.input': DroppedConnection(received)},
+        )
+
+    def _offset(self):
+        return int(self.client.head(self.url)['Upload-Offset'])
+
+    def _spooled(self):
+        with open(self.upload.spool_path, 'rb') as spool:
+            return spool.read()
+
+    def test_chunks_complete_the_upload(self):
+        response = self._patch(self.content[:10], 0, checksum=self.content[:10])
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response['Upload-Offset'], '10')
+
+        response = self._patch(self.content[10:], 10)
+
+        self.assertEqual(response.status_code, 201)
+        document = ContractDocument.objects.get(pk=response.json()['id'])
+        self.assertEqual(document.file.read(), self.content)
+        self.assertEqual(self._patch(b'more', len(self.content)).status_code, 409)
+
+    def test_offset_mismatch(self):
+        self.assertEqual(self._patch(self.content[:10], 0).status_code, 204)
+
+        for offset in (0, 5, 20):
+            with self.subTest(offset=offset):
+                response = self._patch(self.content[offset:offset + 5], offset)
+                self.assertEqual(response.status_code, 409)
+                self.assertEqual(response['Upload-Offset'], '10')
+        self.assertEqual(self._spooled(), self.content[:10])
+
+    def test_bad_checksum_discards_the_chunk(self):
+        self.assertEqual(self._patch(self.content[:10], 0).status_code, 204)
+
+        response = self._patch(self.content[10:20], 10, checksum=b'something else')
+
+        self.assertEqual(response.status_code, 460)
+        self.assertEqual(response['Upload-Offset'], '10')
+        self.assertEqual(self._offset(), 10)
+        self.assertEqual(self._spooled(), self.content[:10])
+        self.assertEqual(self._patch(self.content[10:20], 10, checksum=self.content[10:20]).status_code, 204)
+
+    def test_file_checksum_mismatch_restarts_the_upload(self):
+        self.upload.sha256 = hashlib.sha256(b'another file').hexdigest()
+        self.upload.save(update_fields=['sha256'])
+
+        response = self._patch(self.content, 0)
+
+        self.assertEqual(response.status_code, 460)
+        self.assertEqual(self._offset(), 0)
+        self.assertFalse(ContractDocument.objects.exists())
+
+    def test_resumes_after_a_partial_chunk(self):
+        response = self._dropped(self.content[:12], 0)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self._offset(), 12)
+
+        response = self._patch(self.content[12:], self._offset())
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ContractDocument.objects.get().file.read(), self.content)
+
+    def test_partial_chunk_with_checksum_is_discarded(self):
+        # Nobody is left to answer; what matters is that nothing was kept
+        with self.assertRaises(OSError):
+            self._dropped(self.content[:12], 0, checksum=self.content)
+
+        self.assertEqual(self._offset(), 0)
+        self.assertEqual(self._spooled(), b'')
+
+    def test_expired_upload(self):
+        self.assertEqual(self._patch(self.content[:10], 0).status_code, 204)
+        DocumentUpload.objects.filter(pk=self.upload.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        response = self._patch(self.content[10:], 10)
+
+        self.assertEqual(response.status_code, 410)
+        self.assertFalse(ContractDocument.objects.exists())
+
+
+class DirectUploadTestCase(TestCase):
+    """Presign, PUT and confirm of direct uploads"""
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.parent = UserAccount.objects.create_user('parent@example.com', 'pw')
+        self.contract = Contract.objects.create(
+            intended_parent=self.parent,
+            surrogate=UserAccount.objects.create_user('surrogate@example.com', 'pw'),
+            title='Agreement',
+            contract_amount=1000,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.parent)
+
+    def _start(self, content, **fields):
+        response = self.client.post('/api/contracts/uploads/direct/', {
+            'contract': self.contract.pk,
+            'title': 'Scan',
+            'filename': 'scan.pdf',
+            'length': len(content),
+            **fields,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()
+
+    def _put(self, target, content, length=None):
+        return APIClient().put(
+            target['upload_url'],
+            content,
+            content_type='application/octet-stream',
+            HTTP_CONTENT_LENGTH=str(len(content) if length is None else length),
+        )
+
+    def _confirm(self, target):
+        return self.client.post(f"/api/contracts/uploads/{target['id']}/confirm/")
+
+    def test_presign_put_and_confirm(self):
+        content = b'%PDF direct upload'
+        target = self._start(content, sha256=hashlib.sha256(content).hexdigest())
+        self.assertEqual(target['upload_method'], 'PUT')
+
+        self.assertEqual(self._confirm(target).status_code, 409)
+        self.assertEqual(self._put(target, content).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self._confirm(target)
+
+        self.assertEqual(response.status_code, 201)
+        document = ContractDocument.objects.get()
+        self.assertEqual(document.file.read(), content)
+        # The upload's own reference was handed over to the document
+        self.assertEqual(DocumentBlob.objects.get().ref_count, 1)
+        self.assertEqual(self._confirm(target).status_code, 409)
+
+    @override_settings(DIRECT_UPLOAD_URL_LIFETIME=timedelta(seconds=-1))
+    def test_expired_url_is_refused(self):
+        content = b'late'
+        target = self._start(content)
+
+        self.assertEqual(self._put(target, content).status_code, 403)
+        self.assertFalse(DocumentBlob.objects.exists())
+
+    def test_length_mismatch_is_refused(self):
+        target = self._start(b'declared content')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self._put(target, b'short', length=len(b'declared content')).status_code, 400)
+        self.assertEqual(self._put(target, b'short').status_code, 400)
+        self.assertFalse(DocumentBlob.objects.exists())
+
+    def test_checksum_mismatch_is_refused_on_confirm(self):
+        content = b'uploaded content'
+        target = self._start(content, sha256=hashlib.sha256(b'other content').hexdigest())
+        self.assertEqual(self._put(target, content).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self._confirm(target)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ContractDocument.objects.exists())
+        self.assertFalse(DocumentBlob.objects.exists())
+        self.assertEqual(DocumentUpload.objects.get().object_name, '')
+
+
+class S3DirectUploadTestCase(DirectUploadTestCase):
+    """The S3 backend against a stubbed client"""
+
+    def setUp(self):
+        super().setUp()
+        from botocore.stub import Stubber
+
+        self.backend = S3PresignedUploads(
+            'documents',
+            region_name='us-east-1',
+            aws_access_key_id='test',
+            aws_secret_access_key='test',
+        )
+        self.stubber = Stubber(self.backend.client)
+        self.stubber.activate()
+        self.addCleanup(self.stubber.deactivate)
+        patcher = mock.patch('contracts.views.get_direct_uploads', return_value=self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _head(self, key, content):
+        checksum = base64.b64encode(hashlib.sha256(content).digest()).decode()
+        self.stubber.add_response(
+            'head_object',
+            {'ContentLength': len(content), 'ChecksumSHA256': checksum},
+            {'Bucket': 'documents', 'Key': key, 'ChecksumMode': 'ENABLED'},
+        )
+
+    def _delete(self, key):
+        self.stubber.add_response('delete_object', {}, {'Bucket': 'documents', 'Key': key})
+
+    def test_presign_put_and_confirm(self):
+        from botocore.response import StreamingBody
+
+        content = b'%PDF straight to the bucket'
+        target = self._start(content, sha256=hashlib.sha256(content).hexdigest())
+        key = f"direct-uploads/{target['id']}"
+        self.assertIn('X-Amz-Signature', target['upload_url'])
+        self.assertEqual(
+            target['upload_headers']['x-amz-checksum-sha256'],
+            base64.b64encode(hashlib.sha256(content).digest()).decode(),
+        )
+
+        self._head(key, content)
+        self.stubber.add_response(
+            'get_object',
+            {'Body': StreamingBody(io.BytesIO(content), len(content))},
+            {'Bucket': 'documents', 'Key': key},
+        )
+        self._delete(key)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self._confirm(target)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ContractDocument.objects.get().file.read(), content)
+        self.assertEqual(DocumentBlob.objects.get().ref_count, 1)
+        self.stubber.assert_no_pending_responses()
+
+    def test_sha256_is_required(self):
+        response = self.client.post('/api/contracts/uploads/direct/', {
+            'contract': self.contract.pk, 'title': 'Scan', 'filename': 'scan.pdf', 'length': 4,
+        }, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(DocumentUpload.objects.exists())
+
+    def test_nothing_uploaded(self):
+        content = b'never sent'
+        target = self._start(content, sha256=hashlib.sha256(content).hexdigest())
+        self.stubber.add_client_error('head_object', '404', http_status_code=404)
+
+        self.assertEqual(self._confirm(target).status_code, 409)
+
+    def test_length_mismatch_is_refused(self):
+        content = b'declared content'
+        target = self._start(content, sha256=hashlib.sha256(content).hexdigest())
+        key = f"direct-uploads/{target['id']}"
+        self._head(key, b'short')
+        self._delete(key)
+
+        self.assertEqual(self._confirm(target).status_code, 400)
+        self.assertFalse(ContractDocument.objects.exists())
+        self.stubber.assert_no_pending_responses()
+
+    # Local PUT view scenarios do not apply to presigned bucket URLs
+    test_expired_url_is_refused = None
+    test_checksum_mismatch_is_refused_on_confirm = None
+
+
+class ContractConditionalWriteTestCase(TestCase):
+    """Conditional reads of contracts, and their ETags as If-Match on the next write"""
+
+    def setUp(self):
+        self.parent = UserAccount.objects.create_user('parent@example.com', 'pw')
+        self.contract = Contract.objects.create(
+            intended_parent=self.parent,
+            surrogate=UserAccount.objects.create_user('surrogate@example.com', 'pw'),
+            title='Agreement',
+            contract_amount=1000,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.parent)
+
+    def test_detail_etag_as_if_match(self):
+        etag = self.client.get(f'/api/contracts/contracts/{self.contract.pk}/')['ETag']
+        url = f'/api/contracts/contracts/{self.contract.pk}/update_status/'
+
+        response = self.client.patch(url, {'status': 'active'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.patch(url, {'status': 'completed'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+
+    def test_expanded_documents_are_validated(self):
+        url = f'/api/contracts/contracts/{self.contract.pk}/?expand=documents'
+        document = ContractDocument.objects.create(
+            contract=self.contract, title='Scan', file='contracts/documents/scan.pdf'
+        )
+        etags = [self.client.get(url)['ETag']]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etags[0]).status_code, 304)
+
+        # Cached responses are invalidated once the write commits
+        with self.captureOnCommitCallbacks(execute=True):
+            ContractDocument.objects.create(contract=self.contract, title='Other', file='contracts/documents/other.pdf')
+        etags.append(self.client.get(url)['ETag'])
+        with self.captureOnCommitCallbacks(execute=True):
+            document.title = 'Signed scan'
+            document.save()
+        etags.append(self.client.get(url)['ETag'])
+        with self.captureOnCommitCallbacks(execute=True):
+            document.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[-1])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['title'] for item in response.json()['documents']], ['Other'])
+        self.assertEqual(len(set(etags + [response['ETag']])), 4)
+
+
+class ContractRollupTestCase(TestCase):
+    """Stored rollups match recompute() after every kind of write"""
+
+    def setUp(self):
+        self.parent = UserAccount.objects.create_user('parent@example.com', 'pw')
+        self.surrogate = UserAccount.objects.create_user('surrogate@example.com', 'pw')
+        self.contract, self.other = [
+            Contract.objects.create(
+                intended_parent=self.parent,
+                surrogate=self.surrogate,
+                title=title,
+                contract_amount=1000,
+            )
+            for title in ('Agreement', 'Second agreement')
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.parent)
+
+    def _milestone(self, order, **fields):
+        fields.setdefault('contract', self.contract)
+        return Milestone.objects.create(
+            title=f'Milestone {order}', amount=Decimal('100.00'), order=order, **fields
+        )
+
+    def _payment(self, **fields):
+        fields.setdefault('contract', self.contract)
+        return Payment.objects.create(
+            payer=self.parent, payee=self.surrogate, amount=Decimal('40.00'), payment_type='deposit', **fields
+        )
+
+    def assertRollupsRecomputed(self, step):
+        def totals():
+            return {
+                rollup.contract_id: {field: getattr(rollup, field) for field in ContractRollup.TOTAL_FIELDS}
+                for rollup in ContractRollup.objects.order_by('contract_id')
+            }
+
+        stored = totals()
+        ContractRollup.recompute([self.contract.pk, self.other.pk])
+        self.assertEqual(stored, totals(), step)
+
+    def test_milestone_writes(self):
+        milestone = self._milestone(1)
+        self._milestone(2, status='completed')
+        self.assertRollupsRecomputed('create')
+
+        milestone.status = 'completed'
+        milestone.save()
+        self.assertRollupsRecomputed('status change')
+
+        milestone = Milestone.objects.get(pk=milestone.pk)
+        milestone.amount = Decimal('250.00')
+        milestone.title = 'Renamed'
+        milestone.save(update_fields=['title'])
+        self.assertRollupsRecomputed('update_fields without amount')
+        milestone.save(update_fields=['amount'])
+        self.assertRollupsRecomputed('update_fields with amount')
+
+        milestone = Milestone.objects.only('id', 'title').get(pk=milestone.pk)
+        milestone.amount = Decimal('75.00')
+        milestone.save()
+        self.assertRollupsRecomputed('deferred load')
+
+        milestone = Milestone.objects.get(pk=milestone.pk)
+        milestone.contract = self.other
+        milestone.save()
+        self.assertRollupsRecomputed('contract reassignment')
+        self.assertEqual(ContractRollup.objects.get(pk=self.other.pk).milestones_completed, 1)
+
+        milestone.delete()
+        self.assertRollupsRecomputed('delete')
+
+    def test_payment_writes(self):
+        payment = self._payment()
+        self._payment(status='completed')
+        self.assertRollupsRecomputed('create')
+
+        payment.status = 'completed'
+        payment.save()
+        self.assertRollupsRecomputed('status change')
+
+        payment = Payment.objects.get(pk=payment.pk)
+        payment.amount = Decimal('60.00')
+        payment.save(update_fields=['updated_at'])
+        self.assertRollupsRecomputed('update_fields without amount')
+
+        payment = Payment.objects.get(pk=payment.pk)
+        payment.contract = self.other
+        payment.save()
+        self.assertRollupsRecomputed('contract reassignment')
+
+        payment.delete()
+        self.assertRollupsRecomputed('delete')
+
+    def test_bulk_writes(self):
+        milestones = [self._milestone(order) for order in (1, 2)]
+        payment = self._payment()
+
+        response = self.client.post('/api/milestones/milestones/bulk_update_status/', {
+            'ids': [milestone.pk for milestone in milestones], 'status': 'completed',
+        }, format='json')
+        self.assertEqual(response.json()['updated'], 2)
+        response = self.client.post('/api/payments/payments/bulk_update_status/', {
+            'ids': [payment.pk], 'status': 'completed',
+        }, format='json')
+        self.assertEqual(response.json()['updated'], 1)
+        self.assertRollupsRecomputed('bulk status update')
+
+        template = MilestoneTemplate.objects.create(name='Standard')
+        for order, share in enumerate(('25.00', '75.00')):
+            template.items.create(title=f'Step {order}', order=order, amount_percentage=Decimal(share))
+        response = self.client.post(
+            f'/api/contracts/contracts/{self.contract.pk}/apply_template/',
+            {'template': template.pk, 'start_date': date(2030, 1, 1)},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertRollupsRecomputed('bulk_create from a template')
+        self.assertEqual(ContractRollup.objects.get(pk=self.contract.pk).milestone_count, 4)
+
+    def test_repair_command(self):
+        self._milestone(1, status='completed')
+        self._payment(status='completed')
+        expected = ContractRollup.objects.get(pk=self.contract.pk)
+        ContractRollup.objects.filter(pk=self.contract.pk).update(total_paid=999, milestone_count=7)
+        ContractRollup.objects.filter(pk=self.other.pk).delete()
+
+        output = io.StringIO()
+        call_command('repair_contract_rollups', '--dry-run', stdout=output)
+        self.assertIn('2 would be repaired', output.getvalue())
+        self.assertEqual(ContractRollup.objects.get(pk=self.contract.pk).total_paid, 999)
+
+        output = io.StringIO()
+        call_command('repair_contract_rollups', '--batch-size', '1', stdout=output)
+        self.assertIn('2 repaired', output.getvalue())
+        self.assertRollupsRecomputed('repair')
+        repaired = ContractRollup.objects.get(pk=self.contract.pk)
+        self.assertEqual(
+            [getattr(repaired, field) for field in ContractRollup.TOTAL_FIELDS],
+            [getattr(expected, field) for field in ContractRollup.TOTAL_FIELDS],
+        )
+
+
+class AccessPathTestCase(TestCase):
+    """The first list page of every role-scoped viewset is served by an index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.parent = UserAccount.objects.create_user('parent@example.com', 'pw')
+        cls.contract = Contract.objects.create(
+            intended_parent=cls.parent,
+            surrogate=UserAccount.objects.create_user('surrogate@example.com', 'pw'),
+            title='Agreement',
+            contract_amount=1000,
+        )
+
+    def get_checks(self):
+        """
+        (label, viewset, query params, indexes of which one must be used).
+
+        Open-status filters list the partial index first; the planner may
+        still prefer the full composite when the open rows are not selective.
+        """
+        return [
+            ('contracts', ContractViewSet, {},
+             PARTICIPANT_INDEXES),
+            ('contracts?status=pending,active', ContractViewSet, {'status': 'pending,active'},
+             PARTICIPANT_INDEXES),
+            ('milestones', MilestoneViewSet, {},
+             PARTICIPANT_INDEXES),
+            # SQLite cannot create the deferrable unique index and falls
+            # back to the participant scope
+            ('milestones?contract', MilestoneViewSet, {'contract': self.contract.pk},
+             ['milestone_contract_order_unique', *PARTICIPANT_INDEXES]),
+            ('payments', PaymentViewSet, {},
+             ['payment_payer_created_idx', 'payment_payee_created_idx']),
+            ('payments?status=pending,processing', PaymentViewSet, {'status': 'pending,processing'},
+             ['payment_payer_active_idx', 'payment_payee_active_idx',
+              'payment_payer_created_idx', 'payment_payee_created_idx']),
+            ('escrow', EscrowAccountViewSet, {},
+             PARTICIPANT_INDEXES),
+            ('contract documents', ContractDocumentViewSet, {'contract': self.contract.pk},
+             ['contractdoc_contract_idx']),
+            ('contract documents (scope)', ContractDocumentViewSet, {},
+             PARTICIPANT_INDEXES),
+        ]
+
+    def test_list_queries_use_indexes(self):
+        if connection.vendor == 'postgresql':
+            # Small test tables: show whether an index is eligible at all
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+        factory = APIRequestFactory()
+        for label, viewset, params, expected in self.get_checks():
+            with self.subTest(label):
+                request = factory.get('/', params)
+                request.user = self.parent
+                view = viewset(request=Request(request), action='list', format_kwarg=None, kwargs={})
+                view.request.user = self.parent
+
+                ordering = getattr(view, 'keyset_ordering', KeysetPagination.ordering)
+                queryset = view.get_queryset().order_by(*ordering)[:KeysetPagination.page_size + 1]
+                plan = queryset.explain()
+                self.assertTrue(
+                    any(name in plan for name in expected),
+                    f'expected one of {", ".join(expected)} in:\n{plan}',
+                )
@@ -1,11 +1,18 @@
 from django.urls import path, include
 from rest_framework import routers
-from .views import ContractViewSet, ContractDocumentViewSet
+from .views import (
+    ContractViewSet,
+    ContractDocumentViewSet,
+    DocumentUploadViewSet,
+    LocalDirectUploadView,
+)
 
 router = routers.DefaultRouter()
 router.register(r'contracts', ContractViewSet, basename='contract')
 router.register(r'documents', ContractDocumentViewSet, basename='contract-document')
+router.register(r'uploads', DocumentUploadViewSet, basename='document-upload')
 
 urlpatterns = [
+    path('direct-uploads/<str:token>/', LocalDirectUploadView.as_view(), name='document-direct-upload'),
     path('', include(router.urls)),
 ]
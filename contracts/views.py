@@ -1,35 +1,117 @@
-from rest_framework import viewsets, status
+import io
+
+from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.views import APIView
+from django.conf import settings
+from django.core import signing
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Count, DecimalField, IntegerField, Max, OuterRef, Prefetch, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
 
-from .models import Contract, ContractDocument
+from core.cache import cached_read, invalidate_contract
+from core.downloads import document_response
+from core.mixins import (
+    BulkStatusMixin,
+    CachedReadMixin,
+    ConditionalReadMixin,
+    ExpandableQuerysetMixin,
+    VersionedUpdateMixin,
+)
+from core.models import VersionConflict
+from core.uploads import (
+    TUS_EXTENSIONS,
+    TUS_VERSION,
+    ChecksumMismatch,
+    Spool,
+    SpoolBusy,
+    SpoolLost,
+    parse_checksum,
+)
+from core.versioning import check_version, precondition_failed
+
+from .direct_uploads import LocalPresignedUploads, get_direct_uploads
+from .models import Contract, ContractDocument, ContractParticipant, ContractRollup, DocumentUpload
+from .storage import blob_digest, get_document_storage
 from .serializers import (
     ContractSerializer,
     ContractCreateSerializer,
     ContractDocumentSerializer,
+    ContractDashboardSerializer,
+    DocumentUploadSerializer,
+)
+from milestones.models import Milestone
+from milestones.serializers import (
+    ApplyTemplateSerializer,
+    MilestoneDocumentSerializer,
+    MilestoneSerializer,
 )
+from payments.models import Payment, EscrowAccount
 
 
-class ContractViewSet(viewsets.ModelViewSet):
+def _contract_aggregate(queryset, aggregate, output_field):
+    """Correlated subquery computing ``aggregate`` over rows of one contract"""
+    subquery = (
+        queryset.filter(contract=OuterRef('pk'))
+        .order_by()
+        .values('contract')
+        .annotate(value=aggregate)
+        .values('value')
+    )
+    return Coalesce(Subquery(subquery, output_field=output_field), Value(0), output_field=output_field)
+
+
+class ContractViewSet(
+    ConditionalReadMixin,
+    CachedReadMixin,
+    VersionedUpdateMixin,
+    BulkStatusMixin,
+    ExpandableQuerysetMixin,
+    viewsets.ModelViewSet,
+):
     """ViewSet for managing contracts"""
     
     permission_classes = [IsAuthenticated]
     serializer_class = ContractSerializer
+    expand_select_related = {
+        'intended_parent': 'intended_parent',
+        'surrogate': 'surrogate',
+        'created_by': 'created_by',
+    }
+    expand_prefetch_related = {
+        'documents': 'documents__uploaded_by',
+        # ContractParticipant has no default ordering; list the roles stably
+        'participants': Prefetch('participants', queryset=ContractParticipant.objects.order_by('role', 'id')),
+    }
+    conditional_expand = {
+        'documents': 'documents__updated_at',
+    }
+    bulk_status_contract_field = 'pk'
+    # Rollup totals are part of the representation, so they validate it too
+    conditional_field = Greatest('updated_at', Coalesce('rollup__updated_at', 'updated_at'))
     
     def get_queryset(self):
         """Filter contracts based on user role"""
         user = self.request.user
-        queryset = Contract.objects.all()
+        queryset = Contract.objects.select_related('rollup')
         
         # Users can see contracts where they are a party
         if not user.is_superuser:
-            queryset = queryset.filter(
-                Q(intended_parent=user) | Q(surrogate=user)
-            )
+            queryset = queryset.filter(ContractParticipant.visible_to(user))
+        
+        # Filter by status if provided (comma-separated); open statuses
+        # are served by the partial indexes
+        status_filter = self.request.query_params.get('status')
+        if status_filter:
+            queryset = queryset.filter(status__in=status_filter.split(','))
         
-        return queryset.select_related('intended_parent', 'surrogate', 'created_by')
+        return self.expand_queryset(queryset)
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -40,6 +122,46 @@ class ContractViewSet(viewsets.ModelViewSet):
         """Set the created_by field to the current user"""
         serializer.save(created_by=self.request.user)
     
+    def get_dashboard_queryset(self):
+        """Contracts annotated with milestone, payment and escrow summaries"""
+        count = IntegerField()
+        money = DecimalField(max_digits=12, decimal_places=2)
+        annotations = {
+            f'milestones_{milestone_status}': _contract_aggregate(
+                Milestone.objects.filter(status=milestone_status), Count('id'), count
+            )
+            for milestone_status, _ in Milestone.STATUS_CHOICES
+        }
+        
+        next_milestone = Milestone.objects.filter(
+            contract=OuterRef('pk'),
+            status__in=['pending', 'in_progress'],
+            due_date__isnull=False,
+        ).order_by('due_date', 'order')
+        for field in ('id', 'title', 'due_date', 'amount'):
+            annotations[f'next_milestone_{field}'] = Subquery(next_milestone.values(field)[:1])
+        
+        annotations['amount_paid'] = _contract_aggregate(
+            Payment.objects.filter(status='completed'), Sum('amount'), money
+        )
+        annotations['amount_pending'] = _contract_aggregate(
+            Payment.objects.filter(status__in=['pending', 'processing']), Sum('amount'), money
+        )
+        annotations['escrow_balance'] = Subquery(
+            EscrowAccount.objects.filter(contract=OuterRef('pk')).values('balance')[:1]
+        )
+        
+        return self.get_queryset().select_related(None).prefetch_related(None).annotate(**annotations)
+    
+    @action(detail=False, methods=['get'])
+    @cached_read
+    def dashboard(self, request):
+        """Per-contract summary for the current user in a single query"""
+        queryset = self.get_dashboard_queryset()
+        page = self.paginate_queryset(queryset)
+        serializer = ContractDashboardSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+    
     @action(detail=True, methods=['post'])
     def upload_document(self, request, pk=None):
         """Upload a document for a contract"""
@@ -54,12 +176,44 @@ class ContractViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=True, methods=['post'])
+    def apply_template(self, request, pk=None):
+        """Create a contract's milestone schedule from a template"""
+        contract = self.get_object()
+        serializer = ApplyTemplateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        template = serializer.validated_data['template']
+        start_date = serializer.validated_data.get('start_date', contract.start_date)
+        
+        with transaction.atomic():
+            # Lock the contract so concurrent applies cannot pick the same orders
+            Contract.objects.select_for_update().filter(pk=contract.pk).exists()
+            last_order = contract.milestones.aggregate(last=Max('order'))['last']
+            milestones = template.build_milestones(
+                contract,
+                start_date=start_date,
+                first_order=0 if last_order is None else last_order + 1,
+                created_by=request.user,
+            )
+            Milestone.objects.bulk_create(milestones)
+            # bulk_create bypasses save() and sends no post_save
+            ContractRollup.recompute([contract.pk])
+            invalidate_contract(contract.pk)
+        
+        data = MilestoneSerializer(milestones, many=True, context=self.get_serializer_context()).data
+        return Response(data, status=status.HTTP_201_CREATED)
+    
     @action(detail=True, methods=['patch'])
     def update_status(self, request, pk=None):
         """Update contract status"""
         contract = self.get_object()
-        new_status = request.data.get('status')
+        error = check_version(request, contract)
+        if error:
+            return error
         
+        new_status = request.data.get('status')
         if new_status not in dict(Contract.STATUS_CHOICES):
             return Response(
                 {'error': 'Invalid status'},
@@ -67,24 +221,301 @@ class ContractViewSet(viewsets.ModelViewSet):
             )
         
         contract.status = new_status
-        contract.save()
+        try:
+            contract.save()
+        except VersionConflict:
+            return precondition_failed()
         
         serializer = self.get_serializer(contract)
         return Response(serializer.data)
 
 
-class ContractDocumentViewSet(viewsets.ModelViewSet):
+class ContractDocumentViewSet(CachedReadMixin, viewsets.ModelViewSet):
     """ViewSet for managing contract documents"""
     
     permission_classes = [IsAuthenticated]
     serializer_class = ContractDocumentSerializer
+    keyset_ordering = ('-uploaded_at', '-id')
     
     def get_queryset(self):
+        user = self.request.user
+        queryset = ContractDocument.objects.all()
+        
+        # Users can see documents for their contracts
+        if not user.is_superuser:
+            queryset = queryset.filter(ContractParticipant.visible_to(user, 'contract_id'))
+        
         contract_id = self.request.query_params.get('contract')
         if contract_id:
-            return ContractDocument.objects.filter(contract_id=contract_id)
-        return ContractDocument.objects.all()
+            queryset = queryset.filter(contract_id=contract_id)
+        return queryset.select_related('uploaded_by')
     
     def perform_create(self, serializer):
         """Set the uploaded_by field to the current user"""
         serializer.save(uploaded_by=self.request.user)
+    
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """Send the document's file to a party of the contract"""
+        document = self.get_object()
+        return document_response(document.file, document.filename)
+
+
+class DocumentUploadViewSet(
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.ListModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    Resumable document uploads in the style of tus 1.0: POST starts an
+    upload, HEAD reports its ``Upload-Offset``, PATCH appends a chunk of
+    ``application/offset+octet-stream`` at that offset and DELETE cancels.
+
+    Chunks are streamed to a spool file, never read into memory whole; the
+    last one turns the upload into a ContractDocument or MilestoneDocument
+    and the response carries it.
+    """
+    
+    permission_classes = [IsAuthenticated]
+    serializer_class = DocumentUploadSerializer
+    
+    def get_queryset(self):
+        """Users only see their own uploads"""
+        return DocumentUpload.objects.filter(created_by=self.request.user)
+    
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        response['Tus-Resumable'] = TUS_VERSION
+        return response
+    
+    def options(self, request, *args, **kwargs):
+        response = super().options(request, *args, **kwargs)
+        response['Tus-Version'] = TUS_VERSION
+        response['Tus-Extension'] = TUS_EXTENSIONS
+        response['Tus-Max-Size'] = str(settings.MAX_UPLOAD_SIZE)
+        response['Tus-Checksum-Algorithm'] = 'sha256'
+        return response
+    
+    def _with_offset(self, response, upload):
+        response['Upload-Offset'] = str(upload.offset)
+        response['Upload-Length'] = str(upload.length)
+        response['Upload-Expires'] = http_date(upload.expires_at.timestamp())
+        response['Cache-Control'] = 'no-store'
+        return response
+    
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.save(
+            created_by=request.user,
+            expires_at=timezone.now() + settings.UPLOAD_SESSION_LIFETIME,
+        )
+        location = request.build_absolute_uri(reverse('document-upload-detail', args=[upload.pk]))
+        response = Response(serializer.data, status=status.HTTP_201_CREATED, headers={'Location': location})
+        return self._with_offset(response, upload)
+    
+    def retrieve(self, request, *args, **kwargs):
+        upload = self.get_object()
+        if request.method == 'HEAD':
+            return self._with_offset(Response(status=status.HTTP_200_OK), upload)
+        return self._with_offset(Response(self.get_serializer(upload).data), upload)
+    
+    def partial_update(self, request, *args, **kwargs):
+        """Append one chunk at ``Upload-Offset``"""
+        upload = self.get_object()
+        if upload.direct:
+            return Response(
+                {'error': 'Direct uploads are sent to their presigned URL'},
+                status=status.HTTP_409_CONFLICT
+            )
+        if upload.completed_at:
+            return Response({'error': 'Upload is already complete'}, status=status.HTTP_409_CONFLICT)
+        if upload.expires_at <= timezone.now():
+            return Response({'error': 'Upload has expired'}, status=status.HTTP_410_GONE)
+        if request.content_type != 'application/offset+octet-stream':
+            return Response(
+                {'error': 'Content-Type must be application/offset+octet-stream'},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+        if 'Content-Length' not in request.headers:
+            return Response({'error': 'Content-Length is required'}, status=status.HTTP_411_LENGTH_REQUIRED)
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            chunk_length = int(request.headers['Content-Length'])
+            checksum = parse_checksum(request.headers.get('Upload-Checksum'))
+        except KeyError:
+            return Response({'error': 'Upload-Offset is required'}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        if chunk_length > settings.UPLOAD_CHUNK_MAX_SIZE:
+            return Response(
+                {'error': f'Chunks are limited to {settings.UPLOAD_CHUNK_MAX_SIZE} bytes'},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        if offset + chunk_length > upload.length:
+            return Response({'error': 'Chunk runs past Upload-Length'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            with Spool(upload.spool_path) as spool:
+                # Another request may have appended while this one waited
+                upload.refresh_from_db(fields=['offset', 'completed_at'])
+                if upload.completed_at or offset != upload.offset:
+                    return self._with_offset(
+                        Response({'error': 'Upload-Offset does not match'}, status=status.HTTP_409_CONFLICT),
+                        upload
+                    )
+                written = spool.append(request.stream, offset, chunk_length, checksum) if chunk_length else 0
+                upload.record_offset(offset + written)
+                if upload.offset < upload.length:
+                    return self._with_offset(Response(status=status.HTTP_204_NO_CONTENT), upload)
+                
+                try:
+                    document = upload.finish()
+                except ChecksumMismatch:
+                    # The whole file is wrong; start again from the first byte
+                    spool.reset()
+                    upload.record_offset(0)
+                    raise
+        except SpoolBusy:
+            return Response({'error': 'Another request is writing to this upload'}, status=status.HTTP_423_LOCKED)
+        except SpoolLost as exc:
+            upload.record_offset(exc.size)
+            return self._with_offset(
+                Response({'error': 'Upload-Offset does not match'}, status=status.HTTP_409_CONFLICT),
+                upload
+            )
+        except ChecksumMismatch:
+            response = Response({'error': 'Checksum mismatch'}, status=460)
+            response.reason_phrase = 'Checksum Mismatch'
+            return self._with_offset(response, upload)
+        
+        return self._with_offset(self._document_response(upload, document), upload)
+    
+    def _document_response(self, upload, document):
+        serializer_class = MilestoneDocumentSerializer if upload.milestone_id else ContractDocumentSerializer
+        return Response(
+            serializer_class(document, context=self.get_serializer_context()).data,
+            status=status.HTTP_201_CREATED
+        )
+    
+    @action(detail=False, methods=['post'])
+    def direct(self, request):
+        """
+        Start a direct upload: the response carries a short-lived presigned
+        URL the client PUTs the whole file to, then calls ``confirm``.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        backend = get_direct_uploads()
+        if backend.requires_sha256 and not serializer.validated_data.get('sha256'):
+            return Response(
+                {'sha256': ['Direct uploads must declare the SHA-256 of the file']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        upload = serializer.save(
+            created_by=request.user,
+            direct=True,
+            expires_at=timezone.now() + settings.UPLOAD_SESSION_LIFETIME,
+        )
+        target = backend.presign(upload, request)
+        return Response(
+            {
+                **serializer.data,
+                'upload_url': target['url'],
+                'upload_method': target['method'],
+                'upload_headers': target['headers'],
+                'upload_url_expires_at': timezone.now() + settings.DIRECT_UPLOAD_URL_LIFETIME,
+            },
+            status=status.HTTP_201_CREATED
+        )
+    
+    @action(detail=True, methods=['post'])
+    def confirm(self, request, pk=None):
+        """Record a finished direct upload as a document"""
+        upload = self.get_object()
+        if not upload.direct:
+            return Response({'error': 'Not a direct upload'}, status=status.HTTP_400_BAD_REQUEST)
+        if upload.completed_at:
+            return Response({'error': 'Upload is already complete'}, status=status.HTTP_409_CONFLICT)
+        if upload.expires_at <= timezone.now():
+            return Response({'error': 'Upload has expired'}, status=status.HTTP_410_GONE)
+        
+        backend = get_direct_uploads()
+        uploaded = backend.stat(upload) if upload.object_name else None
+        if uploaded is None:
+            return Response({'error': 'Nothing has been uploaded yet'}, status=status.HTTP_409_CONFLICT)
+        if uploaded.size != upload.length or (upload.sha256 and uploaded.sha256 != upload.sha256):
+            return self._reject_direct_upload(backend, upload)
+        
+        name = backend.ingest(upload)
+        if blob_digest(name) != uploaded.sha256:
+            # Changed in storage between the check and the copy
+            get_document_storage().delete(name)
+            return self._reject_direct_upload(backend, upload)
+        upload.sha256 = uploaded.sha256
+        document = upload.confirm(name)
+        backend.delete(upload)
+        return self._document_response(upload, document)
+    
+    def _reject_direct_upload(self, backend, upload):
+        """Drop an uploaded object that failed verification; the client may PUT again"""
+        backend.delete(upload)
+        if isinstance(backend, LocalPresignedUploads):
+            DocumentUpload.objects.filter(pk=upload.pk).update(object_name='')
+        return Response(
+            {'error': 'Uploaded file does not match the declared length or sha256'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    def destroy(self, request, *args, **kwargs):
+        """Cancel an upload and remove its spool file"""
+        upload = self.get_object()
+        try:
+            with Spool(upload.spool_path) as spool:
+                spool.discard()
+                upload.discard()
+        except SpoolBusy:
+            return Response({'error': 'Another request is writing to this upload'}, status=status.HTTP_423_LOCKED)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class LocalDirectUploadView(APIView):
+    """
+    PUT target of ``LocalPresignedUploads`` URLs. The signed token in the
+    URL is the credential, as with an object store's presigned URL; the
+    body is streamed into the document storage in blocks.
+    """
+    
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    
+    def put(self, request, token):
+        if not isinstance(get_direct_uploads(), LocalPresignedUploads):
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        try:
+            upload_id = LocalPresignedUploads.unsign(token)
+        except signing.BadSignature:
+            return Response({'error': 'Invalid or expired upload URL'}, status=status.HTTP_403_FORBIDDEN)
+        upload = DocumentUpload.objects.filter(pk=upload_id, direct=True).first()
+        if upload is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        if upload.completed_at or upload.object_name:
+            return Response({'error': 'File has already been uploaded'}, status=status.HTTP_409_CONFLICT)
+        if request.headers.get('Content-Length') != str(upload.length):
+            return Response(
+                {'error': 'Content-Length must match the declared length'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        storage = get_document_storage()
+        name = storage.save(upload.filename, File(request.stream or io.BytesIO()))
+        if storage.size(name) != upload.length:
+            storage.delete(name)
+            return Response({'error': 'Upload was incomplete'}, status=status.HTTP_400_BAD_REQUEST)
+        if not DocumentUpload.objects.filter(pk=upload.pk, object_name='').update(object_name=name):
+            # A concurrent PUT for the same upload won
+            storage.delete(name)
+            return Response({'error': 'File has already been uploaded'}, status=status.HTTP_409_CONFLICT)
+        return Response(status=status.HTTP_200_OK)
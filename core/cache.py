@@ -0,0 +1,117 @@
+import functools
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+VERSION_KEY_PREFIX = 'respcache:version'
+RESPONSE_KEY_PREFIX = 'respcache:response'
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def _version_key(scope, object_id):
+    return f'{VERSION_KEY_PREFIX}:{scope}:{object_id}'
+
+
+def get_versions(scopes):
+    """
+    Current version tokens for ``[(scope, id), ...]``.
+
+    Missing tokens are created rather than defaulted, so a token evicted from
+    the cache can never make an older cached response valid again.
+    """
+    cache = get_cache()
+    keys = [_version_key(scope, object_id) for scope, object_id in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(scopes):
+    """Invalidate every cached response keyed on any of ``scopes``"""
+    get_cache().set_many(
+        {_version_key(scope, object_id): uuid.uuid4().hex for scope, object_id in scopes},
+        timeout=None,
+    )
+
+
+def invalidate_contract(contract_id, user_ids=()):
+    """
+    After the current transaction commits, bump the version of a contract,
+    of every participant of it, and of ``user_ids``.
+    """
+    def bump():
+        from contracts.models import ContractParticipant
+
+        users = set(user_ids)
+        if contract_id is not None:
+            users.update(
+                ContractParticipant.objects.filter(contract_id=contract_id)
+                .values_list('user_id', flat=True)
+            )
+        scopes = [('user', user_id) for user_id in users if user_id is not None]
+        if contract_id is not None:
+            scopes.append(('contract', contract_id))
+        bump_versions(scopes)
+
+    transaction.on_commit(bump)
+
+
+def response_cache_key(request):
+    """
+    Key for a read response: user, renderer, full path with query string,
+    the user's version and, for ``?contract=`` requests, the contract's.
+    """
+    scopes = [('user', request.user.pk)]
+    contract_id = request.query_params.get('contract')
+    if contract_id:
+        scopes.append(('contract', contract_id))
+    versions = get_versions(scopes)
+
+    renderer = getattr(request, 'accepted_renderer', None)
+    parts = [
+        str(request.user.pk),
+        renderer.format if renderer else '',
+        request.get_full_path(),
+        *versions,
+    ]
+    digest = hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+    return f'{RESPONSE_KEY_PREFIX}:{digest}'
+
+
+def cached_read(view_method):
+    """
+    Cache the data of a successful GET response per user and query string.
+
+    Superusers are not cached: their responses span every contract, so no
+    per-user version covers them.
+    """
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if request.method != 'GET' or request.user.is_superuser:
+            return view_method(self, request, *args, **kwargs)
+
+        cache = get_cache()
+        key = response_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            return Response(cached)
+
+        response = view_method(self, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK and isinstance(response, Response):
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        return response
+
+    return wrapper
+
@@ -0,0 +1,103 @@
+import functools
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+
+from .models import VersionedModel
+
+
+def read_validators(request, queryset, field='updated_at', versioned=False, related=()):
+    """
+    ETag and last-modified time of a read, from one aggregate over the
+    rows it covers: the newest ``field`` and the row count, so edits,
+    inserts and deletes all change it.
+
+    ``related`` lists timestamp lookups of related rows the response also
+    renders (``"documents__updated_at"``); their newest value and the count
+    of related rows are folded in the same way.
+
+    With ``versioned`` (a detail read of a ``VersionedModel``) the ETag
+    starts with the row's version, ``"3-<hash>"``, so a client can echo it
+    in ``If-Match`` on its next write (see ``core.versioning``).
+    """
+    aggregates = {'last_modified': Max(field), 'count': Count('pk', distinct=bool(related))}
+    if versioned:
+        aggregates['version'] = Max('version')
+    for index, lookup in enumerate(related):
+        aggregates[f'related_{index}'] = Max(lookup)
+        aggregates[f'related_count_{index}'] = Count(lookup.rsplit('__', 1)[0], distinct=True)
+    validators = queryset.order_by().aggregate(**aggregates)
+    timestamps = [validators['last_modified']]
+    timestamps += [validators[f'related_{index}'] for index in range(len(related))]
+    last_modified = max((timestamp for timestamp in timestamps if timestamp), default=None)
+
+    renderer = getattr(request, 'accepted_renderer', None)
+    parts = [
+        str(request.user.pk),
+        renderer.format if renderer else '',
+        request.get_full_path(),
+        str(validators['count']),
+    ]
+    parts += [str(validators[f'related_count_{index}']) for index in range(len(related))]
+    parts += [timestamp.isoformat() if timestamp else '' for timestamp in timestamps]
+    etag = hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()[:32]
+    if validators.get('version') is not None:
+        etag = f"{validators['version']}-{etag}"
+    etag = quote_etag(etag)
+    return etag, last_modified, validators['count']
+
+
+def conditional_read(view_method):
+    """
+    Answer a GET with ``304 Not Modified`` when the client's ``If-None-Match``
+    or ``If-Modified-Since`` still matches, before anything is serialized.
+
+    Lists are validated against the whole filtered queryset, a detail view
+    against its one row. Expansions are validated through the view's
+    ``conditional_expand``, which maps an expand path to a timestamp lookup
+    on the expanded rows; requests expanding any other path are passed
+    through. ``If-None-Match`` is the stronger check: a delete changes the
+    ETag but not ``Last-Modified``.
+    """
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if request.method != 'GET':
+            return view_method(self, request, *args, **kwargs)
+        expand = self.get_expand() if hasattr(self, 'get_expand') else set()
+        conditional_expand = getattr(self, 'conditional_expand', {})
+        if any(path not in conditional_expand for path in expand):
+            return view_method(self, request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        detail = lookup_url_kwarg in kwargs
+        if detail:
+            queryset = queryset.filter(**{self.lookup_field: kwargs[lookup_url_kwarg]})
+
+        etag, last_modified, count = read_validators(
+            request, queryset, self.conditional_field,
+            versioned=detail and issubclass(queryset.model, VersionedModel),
+            related=[conditional_expand[path] for path in sorted(expand)],
+        )
+        if detail and not count:
+            # Let the view produce its own 404
+            return view_method(self, request, *args, **kwargs)
+
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        response = not_modified or view_method(self, request, *args, **kwargs)
+
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+            # Responses are per user: browsers revalidate, shared caches keep out
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ('Authorization',))
+        return response
+
+    return wrapper
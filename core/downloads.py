@@ -0,0 +1,40 @@
+import mimetypes
+import os
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.http import content_disposition_header
+
+
+def document_response(field_file, filename=None):
+    """
+    Send ``field_file`` as an attachment, after the caller has checked
+    access.
+
+    With ``DOCUMENT_ACCEL_REDIRECT`` on, the response is headers only: nginx
+    follows ``X-Accel-Redirect`` to its internal ``DOCUMENT_ACCEL_PREFIX``
+    location and serves the bytes itself, with sendfile, ``Range`` and
+    conditional requests. Otherwise the file is streamed from storage in
+    blocks, without range support.
+    """
+    filename = filename or os.path.basename(field_file.name)
+    content_type, encoding = mimetypes.guess_type(filename)
+    if encoding or not content_type:
+        content_type = 'application/octet-stream'
+
+    if settings.DOCUMENT_ACCEL_REDIRECT:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.DOCUMENT_ACCEL_PREFIX + quote(field_file.name)
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+    else:
+        response = FileResponse(
+            field_file.open('rb'),
+            as_attachment=True,
+            filename=filename,
+            content_type=content_type,
+        )
+    # Documents are private to the contract's parties
+    patch_cache_control(response, private=True, max_age=0, must_revalidate=True)
+    return response
@@ -0,0 +1,62 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+EXPORT_CHUNK_SIZE = 2000
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to the caller"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(rows, columns):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([header for header, _ in columns])
+    for row in rows:
+        yield writer.writerow([_csv_value(row[field]) for _, field in columns])
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def _ndjson_lines(rows, columns):
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    for row in rows:
+        yield encoder.encode({header: row[field] for header, field in columns}) + '\n'
+
+
+def export_response(queryset, columns, export_format, filename):
+    """
+    Stream ``queryset`` as CSV or NDJSON.
+
+    ``columns`` is a sequence of ``(header, values() lookup)`` pairs. Rows are
+    read with ``.values().iterator()`` so PostgreSQL uses a server-side cursor
+    and memory stays bounded by ``EXPORT_CHUNK_SIZE`` regardless of the
+    number of rows.
+    """
+    queryset = queryset.select_related(None).prefetch_related(None)
+    rows = queryset.values(*[field for _, field in columns]).iterator(
+        chunk_size=EXPORT_CHUNK_SIZE
+    )
+    if export_format == 'ndjson':
+        lines = _ndjson_lines(rows, columns)
+    else:
+        lines = _csv_lines(rows, columns)
+
+    response = StreamingHttpResponse(lines, content_type=EXPORT_FORMATS[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
@@ -0,0 +1,190 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from .cache import cached_read, invalidate_contract
+from .conditional import conditional_read
+from .models import VersionConflict
+from .serializers import BulkStatusSerializer, parse_expand
+from .versioning import check_version, precondition_failed
+
+
+class ExpandableQuerysetMixin:
+    """
+    Viewset counterpart of ``ExpandableFieldsMixin``: joins and prefetches
+    are only added for the expansions the client asked for.
+
+    ``expand_select_related`` and ``expand_prefetch_related`` map an expand
+    path (``"contract.surrogate"``) to the ORM lookup that serves it.
+    """
+
+    expand_select_related = {}
+    expand_prefetch_related = {}
+
+    def get_expand(self):
+        return parse_expand(self.request.query_params.get('expand'))
+
+    def expand_queryset(self, queryset):
+        expand = self.get_expand()
+        select = [
+            lookup for path, lookup in self.expand_select_related.items()
+            if path in expand
+        ]
+        prefetch = [
+            lookup for path, lookup in self.expand_prefetch_related.items()
+            if path in expand
+        ]
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+
+class CachedReadMixin:
+    """Viewset mixin caching ``list`` and ``retrieve`` with ``cached_read``"""
+
+    @cached_read
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cached_read
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+
+class ConditionalReadMixin:
+    """
+    Viewset mixin answering conditional ``list`` and ``retrieve`` requests
+    from ``conditional_field`` with ``conditional_read``.
+    """
+
+    conditional_field = 'updated_at'
+
+    @conditional_read
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_read
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+
+class VersionedUpdateMixin:
+    """
+    Viewset mixin making PUT/PATCH of a ``VersionedModel`` conditional:
+    ``If-Match`` (or ``version`` in the body) must name the current version,
+    and a concurrent write in between is answered with 412 rather than
+    overwritten.
+    """
+
+    def update(self, request, *args, **kwargs):
+        partial = kwargs.pop('partial', False)
+        instance = self.get_object()
+        error = check_version(request, instance)
+        if error:
+            return error
+
+        serializer = self.get_serializer(instance, data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        try:
+            self.perform_update(serializer)
+        except VersionConflict:
+            return precondition_failed()
+
+        if getattr(instance, '_prefetched_objects_cache', None):
+            instance._prefetched_objects_cache = {}
+        return Response(serializer.data)
+
+
+class BulkStatusMixin:
+    """
+    Viewset mixin adding ``POST bulk_update_status/`` with
+    ``{"ids": [...], "status": "..."}``.
+
+    Visibility and ``Model.STATUS_TRANSITIONS`` are checked for the whole
+    set with one locking SELECT, and the allowed rows change with a single
+    ``UPDATE ... WHERE id IN (...)``. The response reports every id.
+    """
+
+    # Contract column and user columns whose cached reads a change invalidates
+    bulk_status_contract_field = 'contract_id'
+    bulk_status_user_fields = ()
+
+    def get_bulk_status_values(self, new_status):
+        """Extra columns to set along with ``status``"""
+        return {}
+    
+    def bulk_status_changed(self, contract_ids):
+        """Hook run in the transaction after the UPDATE, for derived data"""
+
+    @action(detail=False, methods=['post'])
+    def bulk_update_status(self, request):
+        """Move a set of objects to one status"""
+        serializer = BulkStatusSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        new_status = serializer.validated_data['status']
+
+        queryset = self.get_queryset().select_related(None).prefetch_related(None)
+        model = queryset.model
+        if new_status not in dict(model.STATUS_CHOICES):
+            return Response(
+                {'error': 'Invalid status'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        fields = dict.fromkeys(
+            ('pk', 'status', self.bulk_status_contract_field, *self.bulk_status_user_fields)
+        )
+        with transaction.atomic():
+            rows = {
+                row['pk']: row
+                for row in queryset.filter(pk__in=ids)
+                .select_for_update(of=('self',))
+                .order_by('pk')
+                .values(*fields)
+            }
+
+            results = []
+            allowed = []
+            for pk in ids:
+                row = rows.get(pk)
+                if row is None:
+                    results.append({'id': pk, 'updated': False, 'error': 'Not found'})
+                elif new_status not in model.STATUS_TRANSITIONS.get(row['status'], ()):
+                    results.append({
+                        'id': pk,
+                        'updated': False,
+                        'error': f"Cannot change status from {row['status']} to {new_status}",
+                    })
+                else:
+                    results.append({'id': pk, 'updated': True})
+                    allowed.append(pk)
+
+            if allowed:
+                model._default_manager.filter(pk__in=allowed).update(
+                    status=new_status,
+                    version=F('version') + 1,
+                    updated_at=timezone.now(),
+                    **self.get_bulk_status_values(new_status),
+                )
+                # queryset.update() sends no post_save, so invalidate here
+                contracts = {}
+                for pk in allowed:
+                    row = rows[pk]
+                    users = contracts.setdefault(row[self.bulk_status_contract_field], set())
+                    users.update(row[field] for field in self.bulk_status_user_fields)
+                self.bulk_status_changed(list(contracts))
+                for contract_id, user_ids in contracts.items():
+                    invalidate_contract(contract_id, user_ids)
+
+        return Response({
+            'status': new_status,
+            'updated': len(allowed),
+            'results': results,
+        })
@@ -0,0 +1,113 @@
+from django.db import models
+from django.db.models import F
+
+
+class VersionConflict(Exception):
+    """Raised when a row was changed by someone else since it was read"""
+
+
+class DirtyFieldsMixin:
+    """
+    Model mixin that snapshots field values on load and makes ``save()``
+    write only the columns that changed, plus ``auto_now`` fields such as
+    ``updated_at``.
+
+    A status flip then no longer rewrites every column, including large
+    text fields. Opt out per call with ``save(all_fields=True)`` or per
+    model with ``save_dirty_fields_only = False``; an explicit
+    ``update_fields`` is always honoured as given.
+    """
+
+    save_dirty_fields_only = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_fields()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self._snapshot_fields(fields)
+
+    def _snapshot_fields(self, fields=None):
+        loaded = self.__dict__
+        snapshot = getattr(self, '_loaded_values', None)
+        if snapshot is None or fields is None:
+            snapshot = self._loaded_values = {}
+        for field in self._meta.concrete_fields:
+            if field.attname not in loaded:
+                continue
+            if fields is None or field.name in fields or field.attname in fields:
+                snapshot[field.attname] = loaded[field.attname]
+
+    def get_dirty_fields(self):
+        """Names of the concrete fields changed since the instance was loaded"""
+        snapshot = getattr(self, '_loaded_values', None)
+        if snapshot is None or self._state.adding:
+            return [field.name for field in self._meta.concrete_fields]
+        return [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key
+            and field.attname in self.__dict__
+            and (
+                field.attname not in snapshot
+                or self.__dict__[field.attname] != snapshot[field.attname]
+            )
+        ]
+
+    def save(self, *args, all_fields=False, **kwargs):
+        if (
+            self.save_dirty_fields_only
+            and not all_fields
+            and not args
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+            and not self._state.adding
+            and getattr(self, '_loaded_values', None) is not None
+        ):
+            kwargs['update_fields'] = self.get_dirty_fields() + [
+                field.name for field in self._meta.concrete_fields
+                if getattr(field, 'auto_now', False)
+            ]
+        super().save(*args, **kwargs)
+        # Columns left out of update_fields are still dirty
+        self._snapshot_fields(kwargs.get('update_fields'))
+
+
+class VersionedModel(models.Model):
+    """
+    Abstract model with optimistic concurrency control.
+
+    Every update of an existing row is a single
+    ``UPDATE ... SET version = version + 1 WHERE id = %s AND version = %s``
+    guarded on the version the instance was read at. If another write got
+    there first no row matches and ``VersionConflict`` is raised, so
+    concurrent edits cannot silently overwrite each other.
+    """
+
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not self._state.adding:
+            kwargs['update_fields'] = {*update_fields, 'version'}
+        super().save(*args, **kwargs)
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        expected = self.version
+        values = [
+            (field, model, F('version') + 1 if field.attname == 'version' else value)
+            for field, model, value in values
+        ]
+        updated = super()._do_update(
+            base_qs.filter(version=expected), using, pk_val, values, update_fields, forced_update
+        )
+        if updated:
+            self.version = expected + 1
+        elif base_qs.filter(pk=pk_val).exists():
+            raise VersionConflict
+        return updated
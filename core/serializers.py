@@ -0,0 +1,96 @@
+from rest_framework import serializers
+
+
+def parse_expand(value):
+    """
+    Turn ``"contract.surrogate,payer"`` into the set of requested paths,
+    including every prefix: ``{"contract", "contract.surrogate", "payer"}``.
+    """
+    paths = set()
+    for item in (value or '').split(','):
+        parts = [part for part in item.strip().split('.') if part]
+        for index in range(1, len(parts) + 1):
+            paths.add('.'.join(parts[:index]))
+    return paths
+
+
+def expand_name(field_name):
+    """``contract_detail`` is requested as ``expand=contract``."""
+    if field_name.endswith('_detail'):
+        return field_name[:-len('_detail')]
+    return field_name
+
+
+class ExpandableFieldsMixin:
+    """
+    Sparse fieldsets for model serializers.
+
+    Fields listed in ``Meta.expandable_fields`` (nested ``*_detail`` blocks
+    and related lists) are only rendered when requested with
+    ``?expand=contract,payer``. Dotted paths such as ``contract.surrogate``
+    expand into nested serializers that use this mixin as well. ``?fields=``
+    trims the top-level representation to the listed field names.
+
+    Both values are read from the serializer context (``expand`` / ``fields``)
+    and fall back to the request query parameters.
+    """
+
+    expand_query_param = 'expand'
+    fields_query_param = 'fields'
+
+    def get_fields(self):
+        fields = super().get_fields()
+        path = self._expand_path()
+        prefix = f'{path}.' if path else ''
+        requested = self._requested_expand()
+
+        for field_name in getattr(self.Meta, 'expandable_fields', ()):
+            if f'{prefix}{expand_name(field_name)}' not in requested:
+                fields.pop(field_name, None)
+
+        if not path:
+            only = self._requested_fields()
+            if only:
+                fields = {name: field for name, field in fields.items() if name in only}
+        return fields
+
+    def _expand_path(self):
+        names = []
+        node = self
+        while node.parent is not None:
+            if node.field_name:
+                names.append(expand_name(node.field_name))
+            node = node.parent
+        return '.'.join(reversed(names))
+
+    def _context_value(self, key, param):
+        context = self.root.context
+        if key in context:
+            return context[key]
+        request = context.get('request')
+        if request is None:
+            return None
+        return getattr(request, 'query_params', request.GET).get(param)
+
+    def _requested_expand(self):
+        value = self._context_value('expand', self.expand_query_param)
+        if isinstance(value, (set, frozenset, list, tuple)):
+            value = ','.join(value)
+        return parse_expand(value)
+
+    def _requested_fields(self):
+        value = self._context_value('fields', self.fields_query_param)
+        if isinstance(value, (set, frozenset, list, tuple)):
+            return set(value)
+        return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+
+class BulkStatusSerializer(serializers.Serializer):
+    """Body of a bulk status transition: ``{"ids": [1, 2], "status": "completed"}``"""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=500,
+    )
+    status = serializers.CharField()
@@ -30,6 +30,9 @@ else:
             'NAME': BASE_DIR / 'db' / 'db.sqlite3',
         }
     }
+    # SQLite has no deferrable constraints: milestone (contract, order)
+    # uniqueness is only checked by the API validators there
+    SILENCED_SYSTEM_CHECKS = ['models.W038']
 
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True
@@ -19,6 +19,9 @@ DATABASES = {
     }
 }
 
+# Documents are served by nginx's internal /protected-media/ location
+DOCUMENT_ACCEL_REDIRECT = config('DOCUMENT_ACCEL_REDIRECT', default=True, cast=bool)
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = False
 CORS_ALLOWED_ORIGINS = config('CORS_ALLOWED_ORIGINS', cast=Csv())
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 import os
 from datetime import timedelta
 from pathlib import Path
+from corsheaders.defaults import default_headers
 from decouple import config, Csv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -108,6 +109,18 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static")
 MEDIA_URL = "media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Documents are stored once per distinct content, named by SHA-256
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    "documents": {"BACKEND": "contracts.storage.ContentAddressedStorage"},
+}
+
+# Document downloads: behind nginx, hand the file off with X-Accel-Redirect
+# to the internal location that aliases MEDIA_ROOT; otherwise stream it
+DOCUMENT_ACCEL_REDIRECT = config("DOCUMENT_ACCEL_REDIRECT", default=False, cast=bool)
+DOCUMENT_ACCEL_PREFIX = "/protected-media/"
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -145,11 +158,58 @@ SIMPLE_JWT = {
 # Custom user model
 AUTH_USER_MODEL = "user.UserAccount"
 
-# File upload settings for large files
-DATA_UPLOAD_MAX_MEMORY_SIZE = 200 * 1024 * 1024  # 200MB
-FILE_UPLOAD_MAX_MEMORY_SIZE = 200 * 1024 * 1024  # 200MB
+# File upload settings for large files. Multipart files over
+# FILE_UPLOAD_MAX_MEMORY_SIZE are spooled to a temporary file rather than
+# held in worker memory; large documents should use the resumable uploads
+DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB, non-file request data
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(2.5 * 1024 * 1024)  # 2.5MB
 MAX_UPLOAD_SIZE = 200 * 1024 * 1024  # 200MB
 
+# Resumable (tus-style) document uploads
+UPLOAD_SPOOL_ROOT = config("UPLOAD_SPOOL_ROOT", default=os.path.join(BASE_DIR, "upload_spool"))
+UPLOAD_CHUNK_MAX_SIZE = 8 * 1024 * 1024  # 8MB per PATCH
+UPLOAD_SESSION_LIFETIME = timedelta(hours=24)
+
+# Presigned direct uploads; see contracts.direct_uploads. With a bucket
+# configured, clients PUT straight to S3 (or MinIO via the endpoint URL);
+# credentials come from the usual AWS_* environment variables
+DIRECT_UPLOADS_BUCKET = config("DIRECT_UPLOADS_BUCKET", default="")
+if DIRECT_UPLOADS_BUCKET:
+    DOCUMENT_DIRECT_UPLOADS = {
+        "BACKEND": "contracts.direct_uploads.S3PresignedUploads",
+        "OPTIONS": {
+            "bucket": DIRECT_UPLOADS_BUCKET,
+            "endpoint_url": config("DIRECT_UPLOADS_ENDPOINT_URL", default=None),
+            "region_name": config("DIRECT_UPLOADS_REGION", default=None),
+        },
+    }
+else:
+    DOCUMENT_DIRECT_UPLOADS = {
+        "BACKEND": "contracts.direct_uploads.LocalPresignedUploads",
+    }
+DIRECT_UPLOAD_URL_LIFETIME = timedelta(minutes=15)
+
+# Browser clients send and read the tus, idempotency and conditional
+# request headers across origins
+CORS_ALLOW_HEADERS = (
+    *default_headers,
+    "tus-resumable",
+    "upload-offset",
+    "upload-checksum",
+    "idempotency-key",
+    "if-match",
+    "if-none-match",
+)
+CORS_EXPOSE_HEADERS = (
+    "location",
+    "etag",
+    "idempotent-replayed",
+    "tus-resumable",
+    "upload-offset",
+    "upload-length",
+    "upload-expires",
+)
+
 # Django REST Framework settings
 REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
@@ -165,5 +225,25 @@ REST_FRAMEWORK = {
         "rest_framework.parsers.MultiPartParser",
         "rest_framework.parsers.FileUploadParser",
     ],
+    "DEFAULT_PAGINATION_CLASS": "core.pagination.KeysetPagination",
+    "PAGE_SIZE": 50,
 }
 
+# Idempotency-Key replay window for payment and escrow mutations
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+
+# Cache settings. File-based by default so all gunicorn workers on a host
+# share it without an outside service; set CACHE_BACKEND/CACHE_LOCATION to
+# use Redis or memcached instead.
+CACHES = {
+    "default": {
+        "BACKEND": config(
+            "CACHE_BACKEND",
+            default="django.core.cache.backends.filebased.FileBasedCache",
+        ),
+        "LOCATION": config("CACHE_LOCATION", default=os.path.join(BASE_DIR, "cache")),
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+}
+RESPONSE_CACHE_ALIAS = "default"
+RESPONSE_CACHE_TIMEOUT = config("RESPONSE_CACHE_TIMEOUT", default=300, cast=int)
@@ -0,0 +1,137 @@
+import base64
+import binascii
+import fcntl
+import hashlib
+import os
+
+from django.conf import settings
+
+TUS_VERSION = '1.0.0'
+TUS_EXTENSIONS = 'creation,termination,checksum,expiration'
+READ_SIZE = 64 * 1024
+
+
+class SpoolBusy(Exception):
+    """Raised when another request is appending to the same spool file"""
+
+
+class SpoolLost(Exception):
+    """Raised when the spool file is shorter than the offset on record"""
+
+    def __init__(self, path, size):
+        super().__init__(path, size)
+        self.size = size
+
+
+class ChecksumMismatch(Exception):
+    """Raised when received bytes do not hash to the digest the client sent"""
+
+
+def spool_path(upload_id):
+    return os.path.join(settings.UPLOAD_SPOOL_ROOT, f'{upload_id}.part')
+
+
+def parse_checksum(header):
+    """
+    Digest from an ``Upload-Checksum: sha256 <base64>`` header; None when
+    the header is absent. Raises ValueError for other algorithms or bad
+    encodings.
+    """
+    if not header:
+        return None
+    algorithm, _, encoded = header.strip().partition(' ')
+    if algorithm.lower() != 'sha256':
+        raise ValueError('Only sha256 checksums are supported')
+    try:
+        digest = base64.b64decode(encoded.strip(), validate=True)
+    except binascii.Error:
+        raise ValueError('Checksum is not valid base64')
+    if len(digest) != hashlib.sha256().digest_size:
+        raise ValueError('Checksum is not a sha256 digest')
+    return digest
+
+
+def file_sha256(path):
+    """Hex SHA-256 of a file, read in ``READ_SIZE`` pieces"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for piece in iter(lambda: handle.read(READ_SIZE), b''):
+            digest.update(piece)
+    return digest.hexdigest()
+
+
+class Spool:
+    """
+    Append-only spool file of one resumable upload, exclusively locked
+    while open so two requests never write the same upload at once.
+
+    The offset on record is the source of truth: bytes past it (left by a
+    request that died between writing and recording) are discarded before
+    appending. Memory use is bounded by ``READ_SIZE`` whatever the chunk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.handle = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        self.handle = os.fdopen(fd, 'r+b')
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self.handle.close()
+            raise SpoolBusy(self.path)
+        return self
+
+    def __exit__(self, *exc_info):
+        # Closing the descriptor releases the lock
+        self.handle.close()
+
+    def append(self, stream, offset, length, checksum=None):
+        """
+        Copy up to ``length`` bytes from ``stream`` to the spool at ``offset``
+        and return the number written.
+
+        Without ``checksum`` whatever arrived before a disconnect is kept,
+        so the client resumes from there. With one, the chunk is kept only
+        if it arrived whole and hashes to it.
+        """
+        size = os.fstat(self.handle.fileno()).st_size
+        if size < offset:
+            raise SpoolLost(self.path, size)
+        self.handle.truncate(offset)
+        self.handle.seek(offset)
+
+        digest = hashlib.sha256()
+        written = 0
+        try:
+            while written < length:
+                piece = stream.read(min(READ_SIZE, length - written))
+                if not piece:
+                    break
+                digest.update(piece)
+                self.handle.write(piece)
+                written += len(piece)
+        except OSError:
+            # Client went away mid-chunk; keep what was received
+            if checksum is not None:
+                raise
+        finally:
+            self.handle.flush()
+            if checksum is not None and (written != length or digest.digest() != checksum):
+                self.handle.truncate(offset)
+                written = 0
+            os.fsync(self.handle.fileno())
+
+        if checksum is not None and not written and length:
+            raise ChecksumMismatch(self.path)
+        return written
+
+    def reset(self):
+        self.handle.truncate(0)
+        os.fsync(self.handle.fileno())
+
+    def discard(self):
+        os.unlink(self.path)
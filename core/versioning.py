@@ -0,0 +1,46 @@
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def expected_version(request):
+    """
+    Version a write was based on, from ``If-Match`` or else a ``version``
+    field in the body. ``None`` when the client sent neither (or ``*``).
+
+    ``If-Match`` carries the ``version`` of the representation the client
+    read, quoted or bare: ``If-Match: "3"``, or the ETag of the detail read
+    it came from, which starts with it: ``If-Match: "3-9f86d081..."``.
+    """
+    value = request.headers.get('If-Match')
+    if value is None:
+        value = request.data.get('version') if hasattr(request.data, 'get') else None
+    if value is None:
+        return None
+
+    value = str(value).strip()
+    if value == '*':
+        return None
+    if value.startswith('W/'):
+        value = value[2:]
+    return int(value.strip('"').split('-', 1)[0])
+
+
+def precondition_failed():
+    return Response(
+        {'error': 'The resource was modified by another request, reload it and retry'},
+        status=status.HTTP_412_PRECONDITION_FAILED
+    )
+
+
+def check_version(request, instance):
+    """Error response when the request's expected version is not ``instance.version``"""
+    try:
+        expected = expected_version(request)
+    except ValueError:
+        return Response(
+            {'error': 'Invalid version'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if expected is not None and expected != instance.version:
+        return precondition_failed()
+    return None
@@ -27,6 +27,10 @@ export const USER_DETAIL_URL = (id: number) => `${API_URL}/auth/users/${id}/`;
 // Contract Endpoints
 // ============================================================================
 
+// Nested blocks are only returned when asked for with ?expand=; the store
+// keeps the documents of contracts and milestones
+export const EXPAND_DOCUMENTS = { expand: 'documents' };
+
 // Contract CRUD operations
 export const CONTRACTS_URL = `${API_URL}/contracts/contracts/`;
 export const CONTRACT_URL = (id: number) => `${API_URL}/contracts/contracts/${id}/`;
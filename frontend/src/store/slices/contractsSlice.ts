@@ -5,8 +5,9 @@ import {
   CONTRACT_UPLOAD_DOCUMENT_URL,
   CONTRACT_UPDATE_STATUS_URL,
   CONTRACT_DOCUMENTS_URL,
+  EXPAND_DOCUMENTS,
 } from "../../constants/api";
-import api from "../../utils/api";
+import api, { fetchAllPages } from "../../utils/api";
 
 interface ContractsState {
   // eslint-disable-next-line @typescript-eslint/no-explicit-any
@@ -47,8 +48,7 @@ export const fetchContracts = createAsyncThunk(
   "contracts/fetchContracts",
   async (_, { rejectWithValue }) => {
     try {
-      const response = await api.get(CONTRACTS_URL);
-      return response.data; // DRF returns array directly for list view
+      return await fetchAllPages(CONTRACTS_URL, EXPAND_DOCUMENTS);
     } catch (error: unknown) {
       const axiosError = error as {
         response?: { data?: { detail?: string; message?: string } };
@@ -67,7 +67,9 @@ export const fetchContract = createAsyncThunk(
   "contracts/fetchContract",
   async (id: number, { rejectWithValue }) => {
     try {
-      const response = await api.get(CONTRACT_URL(id));
+      const response = await api.get(CONTRACT_URL(id), {
+        params: EXPAND_DOCUMENTS,
+      });
       return response.data;
     } catch (error: unknown) {
       const axiosError = error as {
@@ -116,7 +118,9 @@ export const updateContract = createAsyncThunk(
     { rejectWithValue }
   ) => {
     try {
-      const response = await api.put(CONTRACT_URL(id), data);
+      const response = await api.put(CONTRACT_URL(id), data, {
+        params: EXPAND_DOCUMENTS,
+      });
       return response.data;
     } catch (error: unknown) {
       const axiosError = error as {
@@ -205,9 +209,11 @@ export const updateContractStatus = createAsyncThunk(
     { rejectWithValue }
   ) => {
     try {
-      const response = await api.patch(CONTRACT_UPDATE_STATUS_URL(id), {
-        status,
-      });
+      const response = await api.patch(
+        CONTRACT_UPDATE_STATUS_URL(id),
+        { status },
+        { params: EXPAND_DOCUMENTS }
+      );
       return response.data;
     } catch (error: unknown) {
       const axiosError = error as {
@@ -228,8 +234,7 @@ export const fetchContractDocuments = createAsyncThunk(
   async (contractId?: number, { rejectWithValue }) => {
     try {
       const params = contractId ? { contract: contractId } : {};
-      const response = await api.get(CONTRACT_DOCUMENTS_URL, { params });
-      return response.data;
+      return await fetchAllPages(CONTRACT_DOCUMENTS_URL, params);
     } catch (error: unknown) {
       const axiosError = error as {
         response?: { data?: { detail?: string; message?: string } };
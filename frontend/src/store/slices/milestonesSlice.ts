@@ -6,8 +6,9 @@ import {
   MILESTONE_UPDATE_STATUS_URL,
   MILESTONE_UPLOAD_DOCUMENT_URL,
   MILESTONE_DOCUMENTS_URL,
+  EXPAND_DOCUMENTS,
 } from "../../constants/api";
-import api from "../../utils/api";
+import api, { fetchAllPages } from "../../utils/api";
 
 interface MilestonesState {
   // eslint-disable-next-line @typescript-eslint/no-explicit-any
@@ -51,9 +52,10 @@ export const fetchMilestones = createAsyncThunk(
   "milestones/fetchMilestones",
   async ({ contractId }: { contractId: number }, { rejectWithValue }) => {
     try {
-      const params = contractId ? { contract: contractId } : {};
-      const response = await api.get(MILESTONES_URL, { params });
-      return response.data; // DRF returns array directly for list view
+      const params = contractId
+        ? { ...EXPAND_DOCUMENTS, contract: contractId }
+        : EXPAND_DOCUMENTS;
+      return await fetchAllPages(MILESTONES_URL, params);
     } catch (error: unknown) {
       const axiosError = error as {
         response?: { data?: { detail?: string; message?: string } };
@@ -72,7 +74,9 @@ export const fetchMilestone = createAsyncThunk(
   "milestones/fetchMilestone",
   async (id: number, { rejectWithValue }) => {
     try {
-      const response = await api.get(MILESTONE_URL(id));
+      const response = await api.get(MILESTONE_URL(id), {
+        params: EXPAND_DOCUMENTS,
+      });
       return response.data;
     } catch (error: unknown) {
       const axiosError = error as {
@@ -121,7 +125,9 @@ export const updateMilestone = createAsyncThunk(
     { rejectWithValue }
   ) => {
     try {
-      const response = await api.put(MILESTONE_URL(id), data);
+      const response = await api.put(MILESTONE_URL(id), data, {
+        params: EXPAND_DOCUMENTS,
+      });
       return response.data;
     } catch (error: unknown) {
       const axiosError = error as {
@@ -170,7 +176,9 @@ export const completeMilestone = createAsyncThunk(
     { rejectWithValue }
   ) => {
     try {
-      const response = await api.patch(MILESTONE_COMPLETE_URL(id), data || {});
+      const response = await api.patch(MILESTONE_COMPLETE_URL(id), data || {}, {
+        params: EXPAND_DOCUMENTS,
+      });
       return response.data;
     } catch (error: unknown) {
       const axiosError = error as {
@@ -193,9 +201,11 @@ export const updateMilestoneStatus = createAsyncThunk(
     { rejectWithValue }
   ) => {
     try {
-      const response = await api.patch(MILESTONE_UPDATE_STATUS_URL(id), {
-        status,
-      });
+      const response = await api.patch(
+        MILESTONE_UPDATE_STATUS_URL(id),
+        { status },
+        { params: EXPAND_DOCUMENTS }
+      );
       return response.data;
     } catch (error: unknown) {
       const axiosError = error as {
@@ -256,8 +266,7 @@ export const fetchMilestoneDocuments = createAsyncThunk(
   async ({ milestoneId }: { milestoneId: number }, { rejectWithValue }) => {
     try {
       const params = milestoneId ? { milestone: milestoneId } : {};
-      const response = await api.get(MILESTONE_DOCUMENTS_URL, { params });
-      return response.data;
+      return await fetchAllPages(MILESTONE_DOCUMENTS_URL, params);
     } catch (error: unknown) {
       const axiosError = error as {
         response?: { data?: { detail?: string; message?: string } };
@@ -7,7 +7,7 @@ import {
   ESCROW_DEPOSIT_URL,
   ESCROW_RELEASE_URL,
 } from "../../constants/api";
-import api from "../../utils/api";
+import api, { fetchAllPages } from "../../utils/api";
 
 interface PaymentsState {
   // eslint-disable-next-line @typescript-eslint/no-explicit-any
@@ -34,8 +34,7 @@ export const fetchPayments = createAsyncThunk(
   async (contractId?: number, { rejectWithValue }) => {
     try {
       const params = contractId ? { contract: contractId } : {};
-      const response = await api.get(PAYMENTS_URL, { params });
-      return response.data; // DRF returns array directly for list view
+      return await fetchAllPages(PAYMENTS_URL, params);
     } catch (error: unknown) {
       const axiosError = error as {
         response?: { data?: { detail?: string; message?: string } };
@@ -126,8 +125,7 @@ export const fetchEscrowAccounts = createAsyncThunk(
   async (contractId?: number, { rejectWithValue }) => {
     try {
       const params = contractId ? { contract: contractId } : {};
-      const response = await api.get(ESCROW_ACCOUNTS_URL, { params });
-      return response.data; // DRF returns array directly for list view
+      return await fetchAllPages(ESCROW_ACCOUNTS_URL, params);
     } catch (error: unknown) {
       const axiosError = error as {
         response?: { data?: { detail?: string; message?: string } };
@@ -49,4 +49,21 @@ api.interceptors.response.use(
   }
 );
 
+// List endpoints are keyset paginated ({ next, previous, results }): load
+// every page by following `next`, which carries the original query. The
+// users list keeps its rows under "users" instead of "results".
+export const fetchAllPages = async (
+  url: string,
+  params?: Record<string, unknown>,
+  key = "results"
+): Promise<any[]> => {
+  let response = await api.get(url, { params });
+  const results = [...response.data[key]];
+  while (response.data.next) {
+    response = await api.get(response.data.next);
+    results.push(...response.data[key]);
+  }
+  return results;
+};
+
 export default api;
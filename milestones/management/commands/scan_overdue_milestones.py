@@ -0,0 +1,129 @@
+import time
+from collections import Counter
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Q
+from django.utils import timezone
+
+from contracts.models import Contract
+from core.cache import invalidate_contract
+from milestones.models import Milestone
+
+OPEN_STATUSES = ['pending', 'in_progress']
+UPDATE_CHUNK_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        "Flag open milestones whose due date has passed, clear flags that no "
+        "longer apply and refresh each contract's overdue_milestones count. "
+        "Meant to run periodically."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--as-of',
+            help='Treat milestones due before this date (YYYY-MM-DD) as overdue. '
+                 'Defaults to today.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Count overdue milestones without writing anything.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        try:
+            as_of = date.fromisoformat(options['as_of']) if options['as_of'] else timezone.localdate()
+        except ValueError:
+            raise CommandError(f"Invalid --as-of date: {options['as_of']}")
+        dry_run = options['dry_run']
+        now = timezone.now()
+        started = time.perf_counter()
+
+        # Served by milestone_overdue_idx; keyset on (due_date, id) so every
+        # batch is an index range scan, however far the scan has got
+        overdue = Milestone.objects.filter(status__in=OPEN_STATUSES, due_date__lt=as_of)
+        counts = Counter()
+        touched = set()
+        scanned = flagged = batches = 0
+        last = None
+        while True:
+            batch = overdue
+            if last is not None:
+                batch = batch.filter(
+                    Q(due_date__gt=last[0]) | Q(due_date=last[0], id__gt=last[1])
+                )
+            rows = list(
+                batch.order_by('due_date', 'id')
+                .values_list('due_date', 'id', 'contract_id', 'overdue_at')[:batch_size]
+            )
+            if not rows:
+                break
+            batches += 1
+            scanned += len(rows)
+            last = rows[-1][:2]
+
+            new = [(milestone_id, contract_id) for _, milestone_id, contract_id, overdue_at in rows
+                   if overdue_at is None]
+            for _, _, contract_id, _ in rows:
+                counts[contract_id] += 1
+            if new and not dry_run:
+                flagged += Milestone.objects.filter(
+                    pk__in=[milestone_id for milestone_id, _ in new], overdue_at__isnull=True
+                ).update(overdue_at=now, updated_at=now, version=F('version') + 1)
+                touched.update(contract_id for _, contract_id in new)
+            elif new:
+                flagged += len(new)
+
+        # Flags left on milestones that were closed or rescheduled since
+        stale = Milestone.objects.filter(overdue_at__isnull=False).exclude(
+            status__in=OPEN_STATUSES, due_date__lt=as_of
+        )
+        if dry_run:
+            cleared = stale.count()
+        else:
+            touched.update(stale.order_by().values_list('contract_id', flat=True).distinct())
+            cleared = stale.update(overdue_at=None, updated_at=now, version=F('version') + 1)
+
+        changed_contracts = self._update_contract_counts(counts, now, dry_run)
+        touched.update(changed_contracts)
+        if not dry_run:
+            # queryset.update() sends no post_save
+            for contract_id in touched:
+                invalidate_contract(contract_id)
+
+        elapsed = time.perf_counter() - started
+        rate = scanned / elapsed if elapsed else 0
+        prefix = '[dry run] ' if dry_run else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}Scanned {scanned} overdue milestone(s) due before {as_of.isoformat()} '
+            f'in {batches} batch(es): {flagged} newly flagged, {cleared} flag(s) cleared, '
+            f'{len(counts)} contract(s) overdue, {len(changed_contracts)} contract count(s) updated'
+        ))
+        self.stdout.write(f'{prefix}Elapsed {elapsed:.3f}s, {rate:.0f} milestones/s')
+
+    def _update_contract_counts(self, counts, now, dry_run):
+        """Write changed overdue_milestones counts; returns the contract ids written"""
+        current = dict(
+            Contract.objects.filter(overdue_milestones__gt=0).values_list('pk', 'overdue_milestones')
+        )
+        by_count = {}
+        for contract_id in current.keys() | counts.keys():
+            new = counts.get(contract_id, 0)
+            if new != current.get(contract_id, 0):
+                by_count.setdefault(new, []).append(contract_id)
+
+        changed = [contract_id for ids in by_count.values() for contract_id in ids]
+        if dry_run:
+            return changed
+        # One UPDATE per distinct count (and chunk of ids) rather than per contract
+        for count, ids in by_count.items():
+            for start in range(0, len(ids), UPDATE_CHUNK_SIZE):
+                Contract.objects.filter(pk__in=ids[start:start + UPDATE_CHUNK_SIZE]).update(
+                    overdue_milestones=count, updated_at=now, version=F('version') + 1
+                )
+        return changed
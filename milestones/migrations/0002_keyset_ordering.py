@@ -0,0 +1,17 @@
+# Generated by Django 4.2.27 on 2026-10-18 00:50
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("milestones", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="milestonedocument",
+            options={"ordering": ["-uploaded_at", "-id"]},
+        ),
+    ]
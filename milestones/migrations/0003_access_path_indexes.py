@@ -0,0 +1,51 @@
+# Generated by Django 4.2.27 on 2026-10-18 00:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contracts", "0003_access_path_indexes"),
+        ("milestones", "0002_keyset_ordering"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="milestone",
+            index=models.Index(
+                condition=models.Q(("status__in", ["pending", "in_progress"])),
+                fields=["contract", "due_date"],
+                name="milestone_open_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="milestonedocument",
+            index=models.Index(
+                fields=["milestone", "-uploaded_at", "-id"],
+                name="milestonedoc_milestone_idx",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="milestone",
+            name="contract",
+            field=models.ForeignKey(
+                db_index=False,
+                help_text="The contract this milestone belongs to",
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="milestones",
+                to="contracts.contract",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="milestonedocument",
+            name="milestone",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="documents",
+                to="milestones.milestone",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-18 01:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("milestones", "0003_access_path_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="milestone",
+            name="version",
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
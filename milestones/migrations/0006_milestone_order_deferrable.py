@@ -0,0 +1,26 @@
+# Generated by Django 4.2.27 on 2026-10-18 01:08
+
+from django.db import migrations, models
+import django.db.models.constraints
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("milestones", "0005_milestone_templates"),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name="milestone",
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name="milestone",
+            constraint=models.UniqueConstraint(
+                deferrable=django.db.models.constraints.Deferrable["DEFERRED"],
+                fields=("contract", "order"),
+                name="milestone_contract_order_unique",
+            ),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.27 on 2026-10-18 01:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("milestones", "0006_milestone_order_deferrable"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="milestone",
+            name="overdue_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When the overdue scanner flagged the milestone",
+                null=True,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="milestone",
+            index=models.Index(
+                condition=models.Q(("status__in", ["pending", "in_progress"])),
+                fields=["due_date", "id"],
+                name="milestone_overdue_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="milestone",
+            index=models.Index(
+                condition=models.Q(("overdue_at__isnull", False)),
+                fields=["overdue_at"],
+                name="milestone_flagged_idx",
+            ),
+        ),
+    ]
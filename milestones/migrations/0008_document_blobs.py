@@ -0,0 +1,43 @@
+# Generated by Django 4.2.27 on 2026-10-18 01:21
+
+import os
+
+import contracts.storage
+from django.db import migrations, models
+
+
+def backfill_filenames(apps, schema_editor):
+    MilestoneDocument = apps.get_model("milestones", "MilestoneDocument")
+    documents = []
+    for document in MilestoneDocument.objects.filter(filename="").only("id", "file").iterator():
+        document.filename = os.path.basename(document.file.name)
+        documents.append(document)
+    MilestoneDocument.objects.bulk_update(documents, ["filename"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("milestones", "0007_overdue_tracking"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="milestonedocument",
+            name="filename",
+            field=models.CharField(
+                blank=True,
+                help_text="Name the file was uploaded under; stored files are named by content",
+                max_length=255,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="milestonedocument",
+            name="file",
+            field=models.FileField(
+                storage=contracts.storage.get_document_storage,
+                upload_to="milestones/documents/",
+            ),
+        ),
+        migrations.RunPython(backfill_filenames, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.27 on 2026-10-18 02:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_updated_at(apps, schema_editor):
+    MilestoneDocument = apps.get_model("milestones", "MilestoneDocument")
+    MilestoneDocument.objects.update(updated_at=models.F("uploaded_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("milestones", "0008_document_blobs"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="milestonedocument",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,17 @@
-from django.db import models
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import connection, models
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
 from django.conf import settings
-from contracts.models import Contract
+from contracts.models import Contract, ContractRollupMixin, DocumentFileMixin
+from contracts.storage import get_document_storage
+from core.models import DirtyFieldsMixin, VersionedModel
 
 
-class Milestone(models.Model):
+class Milestone(ContractRollupMixin, DirtyFieldsMixin, VersionedModel):
     """Milestone model for tracking contract milestones"""
     
     STATUS_CHOICES = [
@@ -13,11 +21,20 @@ class Milestone(models.Model):
         ('cancelled', 'Cancelled'),
     ]
     
+    # Statuses each status may move to in a bulk transition
+    STATUS_TRANSITIONS = {
+        'pending': ('in_progress', 'completed', 'cancelled'),
+        'in_progress': ('pending', 'completed', 'cancelled'),
+        'completed': (),
+        'cancelled': (),
+    }
+    
     # Related entities
     contract = models.ForeignKey(
         Contract,
         on_delete=models.CASCADE,
         related_name='milestones',
+        db_index=False,  # covered by milestone_contract_order_unique
         help_text='The contract this milestone belongs to'
     )
     
@@ -30,6 +47,11 @@ class Milestone(models.Model):
     # Dates
     due_date = models.DateField(null=True, blank=True)
     completed_date = models.DateField(null=True, blank=True)
+    overdue_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='When the overdue scanner flagged the milestone'
+    )
     
     # Completion tracking
     completion_notes = models.TextField(blank=True)
@@ -54,19 +76,104 @@ class Milestone(models.Model):
     
     class Meta:
         ordering = ['contract', 'order', 'created_at']
-        unique_together = ['contract', 'order']
+        constraints = [
+            # Deferred to commit so a reorder can permute orders in one UPDATE
+            models.UniqueConstraint(
+                fields=['contract', 'order'],
+                name='milestone_contract_order_unique',
+                deferrable=models.Deferrable.DEFERRED,
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['contract', 'due_date'],
+                name='milestone_open_idx',
+                condition=models.Q(status__in=['pending', 'in_progress']),
+            ),
+            # Overdue scan: open milestones by due date, keyset on (due_date, id)
+            models.Index(
+                fields=['due_date', 'id'],
+                name='milestone_overdue_idx',
+                condition=models.Q(status__in=['pending', 'in_progress']),
+            ),
+            # Flags to clear once a milestone is closed or rescheduled
+            models.Index(
+                fields=['overdue_at'],
+                name='milestone_flagged_idx',
+                condition=models.Q(overdue_at__isnull=False),
+            ),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.contract.title}"
+    
+    @staticmethod
+    def rollup_contribution(state):
+        completed = state['status'] == 'completed'
+        amount = Decimal(str(state['amount']))
+        return state['contract_id'], {
+            'milestone_count': 1,
+            'milestones_completed': int(completed),
+            'milestone_amount': amount,
+            'completed_milestone_amount': amount if completed else 0,
+        }
+    
+    @classmethod
+    def reorder(cls, contract_id, ordered_ids):
+        """
+        Renumber the milestones of a contract 0..n-1 following
+        ``ordered_ids`` with a single UPDATE.
+        
+        Intermediate (contract, order) collisions are fine because the
+        unique constraint is only checked at commit. Returns the number of
+        milestones whose order changed (PostgreSQL) or was rewritten.
+        """
+        now = timezone.now()
+        if connection.vendor == 'postgresql':
+            values = ', '.join(['(%s, %s)'] * len(ordered_ids))
+            params = [now]
+            for order, milestone_id in enumerate(ordered_ids):
+                params.extend([milestone_id, order])
+            params.append(contract_id)
+            sql = (
+                f'UPDATE {connection.ops.quote_name(cls._meta.db_table)} AS m '
+                f'SET "order" = v.new_order, "version" = m."version" + 1, "updated_at" = %s '
+                f'FROM (VALUES {values}) AS v(id, new_order) '
+                f'WHERE m."id" = v.id AND m."contract_id" = %s AND m."order" <> v.new_order'
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                return cursor.rowcount
+        
+        # Backends without deferrable constraints have no (contract, order)
+        # unique index to trip over, so a CASE update is just as atomic
+        return cls.objects.filter(contract_id=contract_id, pk__in=ordered_ids).update(
+            order=Case(
+                *[When(pk=milestone_id, then=Value(order)) for order, milestone_id in enumerate(ordered_ids)]
+            ),
+            version=F('version') + 1,
+            updated_at=now,
+        )
 
 
-class MilestoneDocument(models.Model):
+class MilestoneDocument(DocumentFileMixin, models.Model):
     """Documents associated with a milestone"""
     
-    milestone = models.ForeignKey(Milestone, on_delete=models.CASCADE, related_name='documents')
+    milestone = models.ForeignKey(
+        Milestone,
+        on_delete=models.CASCADE,
+        related_name='documents',
+        db_index=False,  # covered by milestonedoc_milestone_idx
+    )
     title = models.CharField(max_length=255)
-    file = models.FileField(upload_to='milestones/documents/')
+    file = models.FileField(upload_to='milestones/documents/', storage=get_document_storage)
+    filename = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text='Name the file was uploaded under; stored files are named by content'
+    )
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     uploaded_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.SET_NULL,
@@ -74,7 +181,106 @@ class MilestoneDocument(models.Model):
     )
     
     class Meta:
-        ordering = ['-uploaded_at']
+        ordering = ['-uploaded_at', '-id']
+        indexes = [
+            models.Index(
+                fields=['milestone', '-uploaded_at', '-id'],
+                name='milestonedoc_milestone_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.milestone.title}"
+
+
+class MilestoneTemplate(models.Model):
+    """Reusable milestone schedule that can be applied to any contract"""
+    
+    name = models.CharField(max_length=255)
+    description = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='milestone_templates'
+    )
+    
+    class Meta:
+        ordering = ['name', 'id']
+    
+    def __str__(self):
+        return self.name
+    
+    def build_milestones(self, contract, start_date=None, first_order=0, created_by=None):
+        """
+        Unsaved milestones for ``contract``, numbered from ``first_order``.
+        
+        Amounts are rounded to cents; when the shares add up to 100% the
+        last milestone absorbs the rounding so the schedule totals exactly
+        ``contract_amount``.
+        """
+        items = list(self.items.all())
+        total_percentage = sum((item.amount_percentage for item in items), Decimal('0'))
+        cent = Decimal('0.01')
+        
+        milestones = []
+        allocated = Decimal('0')
+        for index, item in enumerate(items):
+            if total_percentage == 100 and index == len(items) - 1:
+                amount = contract.contract_amount - allocated
+            else:
+                amount = (contract.contract_amount * item.amount_percentage / 100).quantize(
+                    cent, rounding=ROUND_HALF_UP
+                )
+            allocated += amount
+            
+            due_date = None
+            if start_date is not None and item.due_offset_days is not None:
+                due_date = start_date + timedelta(days=item.due_offset_days)
+            
+            milestones.append(Milestone(
+                contract=contract,
+                title=item.title,
+                description=item.description,
+                amount=amount,
+                due_date=due_date,
+                order=first_order + index,
+                created_by=created_by,
+            ))
+        return milestones
+
+
+class MilestoneTemplateItem(models.Model):
+    """
+    One milestone of a template. The due date is relative to the contract
+    start and the amount is a share of ``contract_amount``.
+    """
+    
+    template = models.ForeignKey(
+        MilestoneTemplate,
+        on_delete=models.CASCADE,
+        related_name='items'
+    )
+    title = models.CharField(max_length=255)
+    description = models.TextField(blank=True)
+    order = models.PositiveIntegerField(default=0)
+    due_offset_days = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text='Days after the contract start date the milestone is due'
+    )
+    amount_percentage = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        validators=[MinValueValidator(0), MaxValueValidator(100)],
+        help_text='Share of the contract amount, in percent'
+    )
+    
+    class Meta:
+        ordering = ['template', 'order']
+        unique_together = ['template', 'order']
+    
+    def __str__(self):
+        return f"{self.title} - {self.template.name}"
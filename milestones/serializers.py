@@ -1,19 +1,31 @@
+from django.db import transaction
+from django.urls import reverse
 from rest_framework import serializers
-from .models import Milestone, MilestoneDocument
+from .models import Milestone, MilestoneDocument, MilestoneTemplate, MilestoneTemplateItem
 from contracts.serializers import ContractSerializer
 from user.serializers import UserListSerializer
+from core.serializers import ExpandableFieldsMixin
 
 
 class MilestoneDocumentSerializer(serializers.ModelSerializer):
     uploaded_by = UserListSerializer(read_only=True)
+    download_url = serializers.SerializerMethodField()
     
     class Meta:
         model = MilestoneDocument
-        fields = ('id', 'title', 'file', 'uploaded_at', 'uploaded_by')
-        read_only_fields = ('id', 'uploaded_at', 'uploaded_by')
+        fields = ('id', 'title', 'file', 'filename', 'download_url', 'uploaded_at', 'uploaded_by')
+        read_only_fields = ('id', 'filename', 'uploaded_at', 'uploaded_by')
+        # Media is not served directly; download_url is the only link
+        extra_kwargs = {'file': {'write_only': True}}
+    
+    def get_download_url(self, obj):
+        """Permission-checked link; media is not served directly in production"""
+        url = reverse('milestone-document-download', args=[obj.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
 
 
-class MilestoneSerializer(serializers.ModelSerializer):
+class MilestoneSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     contract_detail = ContractSerializer(source='contract', read_only=True)
     completed_by_detail = UserListSerializer(source='completed_by', read_only=True)
     created_by_detail = UserListSerializer(source='created_by', read_only=True)
@@ -31,17 +43,25 @@ class MilestoneSerializer(serializers.ModelSerializer):
             'status',
             'due_date',
             'completed_date',
+            'overdue_at',
             'completion_notes',
             'completed_by',
             'completed_by_detail',
             'order',
             'created_at',
             'updated_at',
+            'version',
             'created_by',
             'created_by_detail',
             'documents',
         )
-        read_only_fields = ('id', 'created_at', 'updated_at', 'created_by')
+        read_only_fields = ('id', 'overdue_at', 'created_at', 'updated_at', 'version', 'created_by')
+        expandable_fields = (
+            'contract_detail',
+            'completed_by_detail',
+            'created_by_detail',
+            'documents',
+        )
 
 
 class MilestoneCreateSerializer(serializers.ModelSerializer):
@@ -58,3 +78,75 @@ class MilestoneCreateSerializer(serializers.ModelSerializer):
             'due_date',
             'order',
         )
+
+
+class MilestoneReorderSerializer(serializers.Serializer):
+    """Body of ``reorder``: every milestone id of the contract, in the new order"""
+    
+    contract = serializers.IntegerField(min_value=1)
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=500,
+    )
+    
+    def validate_ids(self, ids):
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError('Milestone ids must be unique')
+        return ids
+
+
+class MilestoneTemplateItemSerializer(serializers.ModelSerializer):
+    
+    class Meta:
+        model = MilestoneTemplateItem
+        fields = ('id', 'title', 'description', 'order', 'due_offset_days', 'amount_percentage')
+        read_only_fields = ('id',)
+
+
+class MilestoneTemplateSerializer(serializers.ModelSerializer):
+    """Template with its items; writes replace the whole item list"""
+    
+    items = MilestoneTemplateItemSerializer(many=True)
+    
+    class Meta:
+        model = MilestoneTemplate
+        fields = ('id', 'name', 'description', 'items', 'created_at', 'updated_at', 'created_by')
+        read_only_fields = ('id', 'created_at', 'updated_at', 'created_by')
+    
+    def validate_items(self, items):
+        orders = [item['order'] for item in items]
+        if len(orders) != len(set(orders)):
+            raise serializers.ValidationError('Item orders must be unique')
+        if sum(item['amount_percentage'] for item in items) > 100:
+            raise serializers.ValidationError('Item percentages add up to more than 100')
+        return items
+    
+    @transaction.atomic
+    def create(self, validated_data):
+        items = validated_data.pop('items')
+        template = MilestoneTemplate.objects.create(**validated_data)
+        MilestoneTemplateItem.objects.bulk_create(
+            [MilestoneTemplateItem(template=template, **item) for item in items]
+        )
+        return template
+    
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        items = validated_data.pop('items', None)
+        instance = super().update(instance, validated_data)
+        if items is not None:
+            instance.items.all().delete()
+            MilestoneTemplateItem.objects.bulk_create(
+                [MilestoneTemplateItem(template=instance, **item) for item in items]
+            )
+            if hasattr(instance, '_prefetched_objects_cache'):
+                instance._prefetched_objects_cache.pop('items', None)
+        return instance
+
+
+class ApplyTemplateSerializer(serializers.Serializer):
+    """Body of ``apply_template``; ``start_date`` defaults to the contract's"""
+    
+    template = serializers.PrimaryKeyRelatedField(queryset=MilestoneTemplate.objects.all())
+    start_date = serializers.DateField(required=False)
@@ -0,0 +1,27 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.cache import invalidate_contract
+from .models import Milestone, MilestoneDocument
+
+
+@receiver([post_save, post_delete], sender=Milestone)
+def invalidate_milestone_cache(sender, instance, **kwargs):
+    invalidate_contract(instance.contract_id)
+
+
+@receiver([post_save, post_delete], sender=MilestoneDocument)
+def invalidate_milestone_document_cache(sender, instance, **kwargs):
+    contract_id = (
+        Milestone.objects.filter(pk=instance.milestone_id)
+        .values_list('contract_id', flat=True)
+        .first()
+    )
+    invalidate_contract(contract_id)
+
+
+@receiver(post_delete, sender=MilestoneDocument)
+def release_milestone_document_file(sender, instance, **kwargs):
+    # Drops the blob reference; the file goes with the last one
+    if instance.file:
+        instance.file.storage.delete(instance.file.name)
@@ -1,4 +1,273 @@
+from datetime import date
+from decimal import Decimal
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from contracts.models import Contract, ContractRollup
+from milestones.models import Milestone
+from payments.models import EscrowAccount, EscrowLedgerEntry, Payment
+from user.models import UserAccount
+
+
+class MilestoneTestCase(TestCase):
+    """A contract with three milestones, seen by its intended parent"""
+
+    def setUp(self):
+        self.parent = UserAccount.objects.create_user('parent@example.com', 'pw')
+        self.surrogate = UserAccount.objects.create_user('surrogate@example.com', 'pw')
+        self.contract = self._contract()
+        self.milestones = [
+            Milestone.objects.create(
+                contract=self.contract,
+                title=f'Milestone {order}',
+                amount=Decimal('100.00'),
+                due_date=date(2030, 1, order),
+                order=order,
+            )
+            for order in (1, 2, 3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.parent)
+
+    def _contract(self, **fields):
+        return Contract.objects.create(
+            intended_parent=fields.pop('intended_parent', self.parent),
+            surrogate=fields.pop('surrogate', self.surrogate),
+            title='Agreement',
+            contract_amount=1000,
+            **fields,
+        )
+
+
+class MilestonePaginationTestCase(MilestoneTestCase):
+    """Milestone lists page in (contract_id, order, id) order"""
+
+    def test_pages_follow_contract_and_order(self):
+        other = self._contract()
+        # Created out of order, so ids disagree with the schedule
+        for order in (2, 1):
+            Milestone.objects.create(contract=other, title=f'Other {order}', amount=1, order=order)
+
+        ids, previous_pages = [], []
+        response = self.client.get('/api/milestones/milestones/', {'page_size': 2})
+        while response.json()['next']:
+            ids += [milestone['id'] for milestone in response.json()['results']]
+            previous_pages.append(response.json()['results'])
+            response = self.client.get(response.json()['next'])
+        ids += [milestone['id'] for milestone in response.json()['results']]
+
+        expected = list(
+            Milestone.objects.order_by('contract_id', 'order', 'id').values_list('pk', flat=True)
+        )
+        self.assertEqual(ids, expected)
+
+        response = self.client.get(response.json()['previous'])
+        self.assertEqual(response.json()['results'], previous_pages[-1])
+
+
+class MilestoneSettlementTestCase(MilestoneTestCase):
+    """complete_and_pay completes, pays and releases escrow in one transaction"""
+
+    def setUp(self):
+        super().setUp()
+        self.account = EscrowAccount.objects.create(contract=self.contract)
+        self.account.deposit(Decimal('150.00'))
+
+    def _settle(self, milestone, etag=None):
+        headers = {'HTTP_IF_MATCH': etag} if etag else {}
+        return self.client.post(
+            f'/api/milestones/milestones/{milestone.pk}/complete_and_pay/',
+            {'completion_notes': 'Done', 'payment_method': 'wire'},
+            format='json',
+            **headers,
+        )
+
+    def _etag(self, milestone):
+        return self.client.get(f'/api/milestones/milestones/{milestone.pk}/')['ETag']
+
+    def test_settles_milestone(self):
+        milestone = self.milestones[0]
+        response = self._settle(milestone, self._etag(milestone))
+
+        self.assertEqual(response.status_code, 201, response.content)
+        milestone.refresh_from_db()
+        self.assertEqual(milestone.status, 'completed')
+        self.assertEqual(milestone.completed_by, self.parent)
+        self.assertEqual(milestone.completion_notes, 'Done')
+        payment = Payment.objects.get()
+        self.assertEqual(
+            (payment.milestone, payment.payment_type, payment.status, payment.amount),
+            (milestone, 'milestone', 'completed', Decimal('100.00')),
+        )
+        entry = EscrowLedgerEntry.objects.get(entry_type=EscrowLedgerEntry.RELEASE)
+        self.assertEqual((entry.payment, entry.amount), (payment, Decimal('-100.00')))
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('50.00'))
+        self.assertEqual(response.json()['escrow_account']['balance'], '50.00')
+        rollup = ContractRollup.objects.get(pk=self.contract.pk)
+        self.assertEqual((rollup.milestones_completed, rollup.total_paid), (1, Decimal('100.00')))
+
+    def test_insufficient_funds_roll_back(self):
+        self.assertEqual(self._settle(self.milestones[0]).status_code, 201)
+        milestone = self.milestones[1]
+        version = Milestone.objects.get(pk=milestone.pk).version
+
+        response = self._settle(milestone)
+
+        self.assertEqual(response.status_code, 400)
+        milestone.refresh_from_db()
+        self.assertEqual((milestone.status, milestone.version), ('pending', version))
+        self.assertEqual(Payment.objects.filter(milestone=milestone).count(), 0)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('50.00'))
+        self.assertEqual(ContractRollup.objects.get(pk=self.contract.pk).milestones_completed, 1)
+
+    def test_repeat_is_rejected(self):
+        milestone = self.milestones[0]
+        self.assertEqual(self._settle(milestone).status_code, 201)
+
+        response = self._settle(milestone)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Payment.objects.count(), 1)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('50.00'))
+
+    def test_stale_if_match(self):
+        milestone = self.milestones[0]
+        etag = self._etag(milestone)
+        milestone.refresh_from_db()
+        milestone.title = 'Renamed'
+        milestone.save()
+
+        response = self._settle(milestone, etag)
+
+        self.assertEqual(response.status_code, 412)
+        milestone.refresh_from_db()
+        self.assertEqual(milestone.status, 'pending')
+        self.assertFalse(Payment.objects.exists())
+
+
+class MilestoneBulkStatusTestCase(MilestoneTestCase):
+    """bulk_update_status checks the whole set and updates it in one UPDATE"""
+
+    url = '/api/milestones/milestones/bulk_update_status/'
+
+    def test_reports_every_id(self):
+        first, cancelled, _ = self.milestones
+        cancelled.status = 'cancelled'
+        cancelled.save()
+        stranger = UserAccount.objects.create_user('stranger@example.com', 'pw')
+        foreign = Milestone.objects.create(
+            contract=self._contract(intended_parent=stranger, surrogate=stranger),
+            title='Foreign', amount=1, order=1,
+        )
+        versions = dict(Milestone.objects.values_list('pk', 'version'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {
+                'ids': [first.pk, cancelled.pk, foreign.pk, 999999, first.pk],
+                'status': 'completed',
+            }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['updated'], 1)
+        self.assertEqual(response.json()['results'], [
+            {'id': first.pk, 'updated': True},
+            {'id': cancelled.pk, 'updated': False, 'error': 'Cannot change status from cancelled to completed'},
+            {'id': foreign.pk, 'updated': False, 'error': 'Not found'},
+            {'id': 999999, 'updated': False, 'error': 'Not found'},
+        ])
+        updates = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE "milestones_milestone"')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"completed_by_id"', updates[0])
+
+        first.refresh_from_db()
+        self.assertEqual(first.status, 'completed')
+        self.assertEqual(first.completed_by, self.parent)
+        self.assertEqual(first.completed_date, timezone.now().date())
+        self.assertEqual(
+            dict(Milestone.objects.values_list('pk', 'version')),
+            {**versions, first.pk: versions[first.pk] + 1},
+        )
+        foreign.refresh_from_db()
+        self.assertEqual(foreign.status, 'pending')
+
+    def test_other_statuses_leave_completion_alone(self):
+        response = self.client.post(self.url, {
+            'ids': [milestone.pk for milestone in self.milestones], 'status': 'in_progress',
+        }, format='json')
+
+        self.assertEqual(response.json()['updated'], 3)
+        self.assertEqual(
+            set(Milestone.objects.values_list('status', 'completed_by', 'completed_date')),
+            {('in_progress', None, None)},
+        )
+
+    def test_invalid_status(self):
+        response = self.client.post(self.url, {
+            'ids': [self.milestones[0].pk], 'status': 'archived',
+        }, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Milestone.objects.exclude(status='pending').exists())
+
+
+class MilestoneReorderTestCase(MilestoneTestCase):
+    """reorder renumbers a contract's whole schedule or nothing"""
+
+    url = '/api/milestones/milestones/reorder/'
+
+    def _reorder(self, ids, contract=None):
+        return self.client.post(self.url, {
+            'contract': (contract or self.contract).pk, 'ids': ids,
+        }, format='json')
+
+    def _schedule(self, contract=None):
+        return list(
+            Milestone.objects.filter(contract=contract or self.contract)
+            .order_by('order').values_list('pk', flat=True)
+        )
+
+    def test_permutation(self):
+        first, second, third = [milestone.pk for milestone in self.milestones]
+        versions = dict(Milestone.objects.values_list('pk', 'version'))
+
+        response = self._reorder([third, first, second])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([milestone['id'] for milestone in response.json()], [third, first, second])
+        self.assertEqual(
+            list(Milestone.objects.order_by('order').values_list('pk', 'order')),
+            [(third, 0), (first, 1), (second, 2)],
+        )
+        for pk, version in Milestone.objects.values_list('pk', 'version'):
+            self.assertEqual(version, versions[pk] + 1)
+
+    def test_ids_must_cover_the_schedule(self):
+        first, second, third = [milestone.pk for milestone in self.milestones]
+        foreign = Milestone.objects.create(contract=self._contract(), title='Foreign', amount=1, order=1)
+        before = self._schedule()
+
+        for ids in ([third, first], [third, first, second, foreign.pk], [third, first, first], []):
+            with self.subTest(ids=ids):
+                self.assertEqual(self._reorder(ids).status_code, 400)
+        self.assertEqual(self._schedule(), before)
+        self.assertEqual(self._schedule(foreign.contract), [foreign.pk])
+
+    def test_non_participant(self):
+        stranger = UserAccount.objects.create_user('stranger@example.com', 'pw')
+        self.client.force_authenticate(stranger)
+        before = self._schedule()
 
-# Create your tests here.
+        response = self._reorder(list(reversed(before)))
 
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self._schedule(), before)
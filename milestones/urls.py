@@ -1,10 +1,11 @@
 from django.urls import path, include
 from rest_framework import routers
-from .views import MilestoneViewSet, MilestoneDocumentViewSet
+from .views import MilestoneViewSet, MilestoneDocumentViewSet, MilestoneTemplateViewSet
 
 router = routers.DefaultRouter()
 router.register(r'milestones', MilestoneViewSet, basename='milestone')
 router.register(r'documents', MilestoneDocumentViewSet, basename='milestone-document')
+router.register(r'templates', MilestoneTemplateViewSet, basename='milestone-template')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,22 +1,65 @@
+from django.db import transaction
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q
 
-from .models import Milestone, MilestoneDocument
+from contracts.models import ContractParticipant, ContractRollup
+from core.cache import cached_read, invalidate_contract
+from core.downloads import document_response
+from core.mixins import (
+    BulkStatusMixin,
+    CachedReadMixin,
+    ConditionalReadMixin,
+    ExpandableQuerysetMixin,
+    VersionedUpdateMixin,
+)
+from core.models import VersionConflict
+from core.versioning import check_version, precondition_failed
+from payments.idempotency import idempotent
+from payments.models import EscrowAccount, InsufficientFunds, MilestoneNotPayable, Payment
+from payments.serializers import EscrowAccountSerializer, PaymentSerializer
+
+from .models import Milestone, MilestoneDocument, MilestoneTemplate
 from .serializers import (
     MilestoneSerializer,
     MilestoneCreateSerializer,
     MilestoneDocumentSerializer,
+    MilestoneReorderSerializer,
+    MilestoneTemplateSerializer,
 )
 
 
-class MilestoneViewSet(viewsets.ModelViewSet):
+class MilestoneViewSet(
+    ConditionalReadMixin,
+    CachedReadMixin,
+    VersionedUpdateMixin,
+    BulkStatusMixin,
+    ExpandableQuerysetMixin,
+    viewsets.ModelViewSet,
+):
     """ViewSet for managing milestones"""
     
     permission_classes = [IsAuthenticated]
     serializer_class = MilestoneSerializer
+    expand_select_related = {
+        'contract': 'contract__rollup',
+        'contract.intended_parent': 'contract__intended_parent',
+        'contract.surrogate': 'contract__surrogate',
+        'contract.created_by': 'contract__created_by',
+        'completed_by': 'completed_by',
+        'created_by': 'created_by',
+    }
+    expand_prefetch_related = {
+        'documents': 'documents__uploaded_by',
+        'contract.documents': 'contract__documents__uploaded_by',
+    }
+    conditional_expand = {
+        'documents': 'documents__updated_at',
+    }
+    # (contract, order) is unique, so this matches Meta.ordering and is
+    # served by the milestone_contract_order_unique index.
+    keyset_ordering = ('contract_id', 'order', 'id')
     
     def get_queryset(self):
         """Filter milestones based on user role"""
@@ -25,16 +68,20 @@ class MilestoneViewSet(viewsets.ModelViewSet):
         
         # Users can see milestones for their contracts
         if not user.is_superuser:
-            queryset = queryset.filter(
-                Q(contract__intended_parent=user) | Q(contract__surrogate=user)
-            )
+            queryset = queryset.filter(ContractParticipant.visible_to(user, 'contract_id'))
         
         # Filter by contract if provided
         contract_id = self.request.query_params.get('contract')
         if contract_id:
             queryset = queryset.filter(contract_id=contract_id)
         
-        return queryset.select_related('contract', 'completed_by', 'created_by')
+        # Filter by status if provided (comma-separated); open statuses
+        # are served by the partial indexes
+        status_filter = self.request.query_params.get('status')
+        if status_filter:
+            queryset = queryset.filter(status__in=status_filter.split(','))
+        
+        return self.expand_queryset(queryset)
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -45,6 +92,52 @@ class MilestoneViewSet(viewsets.ModelViewSet):
         """Set the created_by field to the current user"""
         serializer.save(created_by=self.request.user)
     
+    def get_bulk_status_values(self, new_status):
+        """Completing records who and when in the same UPDATE"""
+        if new_status != 'completed':
+            return {}
+        from django.utils import timezone
+        return {
+            'completed_by': self.request.user,
+            'completed_date': timezone.now().date(),
+        }
+    
+    def bulk_status_changed(self, contract_ids):
+        # The bulk UPDATE skips save(), so the rollup deltas were not applied
+        ContractRollup.recompute(contract_ids)
+    
+    @action(detail=False, methods=['post'])
+    def reorder(self, request):
+        """Renumber all milestones of a contract in one transaction"""
+        serializer = MilestoneReorderSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        contract_id = serializer.validated_data['contract']
+        ids = serializer.validated_data['ids']
+        
+        queryset = Milestone.objects.filter(contract_id=contract_id)
+        if not request.user.is_superuser:
+            queryset = queryset.filter(ContractParticipant.visible_to(request.user, 'contract_id'))
+        
+        with transaction.atomic():
+            current = set(queryset.select_for_update().values_list('pk', flat=True))
+            if not current:
+                return Response(
+                    {'error': 'Contract not found or has no milestones'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            if current != set(ids):
+                return Response(
+                    {'error': 'ids must list every milestone of the contract exactly once'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            Milestone.reorder(contract_id, ids)
+            # The UPDATE sends no post_save
+            invalidate_contract(contract_id)
+        
+        milestones = queryset.order_by('order')
+        return Response(self.get_serializer(milestones, many=True).data)
+    
     @action(detail=True, methods=['post'])
     def upload_document(self, request, pk=None):
         """Upload a document for a milestone"""
@@ -63,6 +156,10 @@ class MilestoneViewSet(viewsets.ModelViewSet):
     def complete(self, request, pk=None):
         """Mark milestone as completed"""
         milestone = self.get_object()
+        error = check_version(request, milestone)
+        if error:
+            return error
+        
         completion_notes = request.data.get('completion_notes', '')
         
         milestone.status = 'completed'
@@ -70,17 +167,64 @@ class MilestoneViewSet(viewsets.ModelViewSet):
         milestone.completed_by = request.user
         from django.utils import timezone
         milestone.completed_date = timezone.now().date()
-        milestone.save()
+        try:
+            milestone.save()
+        except VersionConflict:
+            return precondition_failed()
         
         serializer = self.get_serializer(milestone)
         return Response(serializer.data)
     
+    @action(detail=True, methods=['post'])
+    @idempotent
+    def complete_and_pay(self, request, pk=None):
+        """Complete a milestone, pay it and release the amount from escrow in one transaction"""
+        milestone = self.get_object()
+        error = check_version(request, milestone)
+        if error:
+            return error
+        
+        try:
+            milestone, payment, escrow_account = Payment.settle_milestone(
+                milestone,
+                request.user,
+                completion_notes=request.data.get('completion_notes', ''),
+                payment_method=request.data.get('payment_method', ''),
+            )
+        except VersionConflict:
+            return precondition_failed()
+        except MilestoneNotPayable:
+            return Response(
+                {'error': 'Milestone is already completed or cancelled'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except EscrowAccount.DoesNotExist:
+            return Response(
+                {'error': 'Contract has no escrow account'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except InsufficientFunds:
+            return Response(
+                {'error': 'Insufficient balance'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        context = self.get_serializer_context()
+        return Response({
+            'milestone': self.get_serializer(milestone).data,
+            'payment': PaymentSerializer(payment, context=context).data,
+            'escrow_account': EscrowAccountSerializer(escrow_account, context=context).data,
+        }, status=status.HTTP_201_CREATED)
+    
     @action(detail=True, methods=['patch'])
     def update_status(self, request, pk=None):
         """Update milestone status"""
         milestone = self.get_object()
-        new_status = request.data.get('status')
+        error = check_version(request, milestone)
+        if error:
+            return error
         
+        new_status = request.data.get('status')
         if new_status not in dict(Milestone.STATUS_CHOICES):
             return Response(
                 {'error': 'Invalid status'},
@@ -92,24 +236,64 @@ class MilestoneViewSet(viewsets.ModelViewSet):
             from django.utils import timezone
             milestone.completed_date = timezone.now().date()
             milestone.completed_by = request.user
-        milestone.save()
+        try:
+            milestone.save()
+        except VersionConflict:
+            return precondition_failed()
         
         serializer = self.get_serializer(milestone)
         return Response(serializer.data)
 
 
-class MilestoneDocumentViewSet(viewsets.ModelViewSet):
+class MilestoneDocumentViewSet(CachedReadMixin, viewsets.ModelViewSet):
     """ViewSet for managing milestone documents"""
     
     permission_classes = [IsAuthenticated]
     serializer_class = MilestoneDocumentSerializer
+    keyset_ordering = ('-uploaded_at', '-id')
     
     def get_queryset(self):
+        user = self.request.user
+        queryset = MilestoneDocument.objects.all()
+        
+        # Users can see documents for milestones of their contracts
+        if not user.is_superuser:
+            queryset = queryset.filter(
+                ContractParticipant.visible_to(user, 'milestone__contract_id')
+            )
+        
         milestone_id = self.request.query_params.get('milestone')
         if milestone_id:
-            return MilestoneDocument.objects.filter(milestone_id=milestone_id)
-        return MilestoneDocument.objects.all()
+            queryset = queryset.filter(milestone_id=milestone_id)
+        return queryset.select_related('uploaded_by')
     
     def perform_create(self, serializer):
         """Set the uploaded_by field to the current user"""
         serializer.save(uploaded_by=self.request.user)
+    
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """Send the document's file to a party of the milestone's contract"""
+        document = self.get_object()
+        return document_response(document.file, document.filename)
+
+
+class MilestoneTemplateViewSet(viewsets.ModelViewSet):
+    """ViewSet for managing milestone schedule templates"""
+    
+    permission_classes = [IsAuthenticated]
+    serializer_class = MilestoneTemplateSerializer
+    keyset_ordering = ('name', 'id')
+    
+    def get_queryset(self):
+        user = self.request.user
+        queryset = MilestoneTemplate.objects.prefetch_related('items')
+        
+        # Templates are shared for reading; only their author can change them
+        if self.request.method not in ('GET', 'HEAD', 'OPTIONS') and not user.is_superuser:
+            queryset = queryset.filter(created_by=user)
+        return queryset
+    
+    def perform_create(self, serializer):
+        """Set the created_by field to the current user"""
+        serializer.save(created_by=self.request.user)
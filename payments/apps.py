@@ -5,3 +5,5 @@ class PaymentsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "payments"
 
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,112 @@
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyRecord
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+
+def request_fingerprint(request):
+    """SHA-256 over the method, path and parsed body of a request"""
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    payload = '\n'.join([request.method, request.path, body])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def idempotent(view_method):
+    """
+    Honour an ``Idempotency-Key`` header on a viewset action.
+
+    The record for the key is inserted, the action run and its response
+    stored in one transaction, so the record commits together with the
+    action's writes or not at all: a worker that dies half way leaves
+    nothing behind, and a duplicate arriving while the first request is
+    still running blocks on the record's unique index until it commits,
+    then gets the stored response back without the action running again.
+    Errors the action raises as exceptions are stored like the responses
+    it returns. Requests without the header are unaffected, and 5xx
+    responses roll the key back so that they can be retried.
+    """
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > IdempotencyRecord._meta.get_field('key').max_length:
+            return Response(
+                {'error': f'{IDEMPOTENCY_HEADER} is too long'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        with transaction.atomic():
+            record = _claim(request.user, key, request_fingerprint(request))
+            if not isinstance(record, IdempotencyRecord):
+                # Either a replayed or a rejected response
+                return record
+
+            try:
+                # A savepoint, so that a failed action leaves the record usable
+                with transaction.atomic():
+                    response = view_method(self, request, *args, **kwargs)
+            except Exception as exc:
+                # Same response dispatch() would build; unhandled errors re-raise
+                response = self.handle_exception(exc)
+
+            if response.status_code >= 500:
+                transaction.set_rollback(True)
+                return response
+
+            record.response_status = response.status_code
+            record.response_body = response.data
+            record.save(update_fields=['response_status', 'response_body'])
+        return response
+
+    return wrapper
+
+
+def _claim(user, key, fingerprint):
+    """Insert the record for ``key`` or return the response for an existing one"""
+    now = timezone.now()
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                # Waits for a concurrent transaction holding the same key
+                return IdempotencyRecord.objects.create(
+                    user=user,
+                    key=key,
+                    fingerprint=fingerprint,
+                    expires_at=now + settings.IDEMPOTENCY_KEY_TTL,
+                )
+        except IntegrityError:
+            pass
+
+        existing = IdempotencyRecord.objects.filter(user=user, key=key).first()
+        if existing is None:
+            continue
+        if existing.expires_at <= now:
+            existing.delete()
+            continue
+        if existing.fingerprint != fingerprint:
+            return Response(
+                {'error': f'{IDEMPOTENCY_HEADER} was already used for a different request'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        return Response(
+            existing.response_body,
+            status=existing.response_status,
+            headers={REPLAYED_HEADER: 'true'},
+        )
+
+    return Response(
+        {'error': f'{IDEMPOTENCY_HEADER} is being processed, retry later'},
+        status=status.HTTP_409_CONFLICT
+    )
@@ -0,0 +1,149 @@
+import random
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction, DatabaseError
+
+from contracts.models import Contract
+from payments.models import EscrowAccount, InsufficientFunds, EscrowLimitExceeded
+from user.models import UserAccount
+
+
+class Command(BaseCommand):
+    help = (
+        "Run concurrent deposits and releases against one escrow account and "
+        "verify the balance invariants afterwards. Use a PostgreSQL database; "
+        "SQLite serializes writers and reports lock errors instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=16)
+        parser.add_argument('--operations', type=int, default=800,
+                            help='Total number of deposits and releases.')
+        parser.add_argument('--escrow', type=int,
+                            help='Existing escrow account id. A throwaway one is '
+                                 'created (and removed) when omitted.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        operations = max(1, options['operations'])
+
+        cleanup = None
+        if options['escrow']:
+            try:
+                account = EscrowAccount.objects.get(pk=options['escrow'])
+            except EscrowAccount.DoesNotExist:
+                raise CommandError(f"Escrow account {options['escrow']} does not exist")
+        else:
+            account, cleanup = self._create_account()
+
+        start = EscrowAccount.objects.get(pk=account.pk)
+        results = {
+            'deposited': Decimal('0'),
+            'released': Decimal('0'),
+            'deposits': 0,
+            'releases': 0,
+            'rejected': 0,
+            'errors': 0,
+        }
+        lock = threading.Lock()
+
+        def worker(index, count):
+            rng = random.Random(options['seed'] + index)
+            local = dict.fromkeys(results, 0)
+            local['deposited'] = local['released'] = Decimal('0')
+            try:
+                for _ in range(count):
+                    amount = Decimal(rng.randint(1, 50000)) / 100
+                    target = EscrowAccount(pk=account.pk)
+                    try:
+                        if rng.random() < 0.5:
+                            target.deposit(amount)
+                            local['deposits'] += 1
+                            local['deposited'] += amount
+                        else:
+                            target.release(amount)
+                            local['releases'] += 1
+                            local['released'] += amount
+                    except (InsufficientFunds, EscrowLimitExceeded):
+                        local['rejected'] += 1
+                    except DatabaseError:
+                        local['errors'] += 1
+            finally:
+                connection.close()
+            with lock:
+                for key, value in local.items():
+                    results[key] += value
+
+        per_worker = [operations // workers + (1 if i < operations % workers else 0)
+                      for i in range(workers)]
+        threads = [threading.Thread(target=worker, args=(i, count))
+                   for i, count in enumerate(per_worker) if count]
+
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        end = EscrowAccount.objects.get(pk=account.pk)
+        failures = self._check_invariants(start, end, results)
+
+        completed = results['deposits'] + results['releases'] + results['rejected']
+        self.stdout.write(
+            f"{completed} operations in {elapsed:.2f}s "
+            f"({completed / elapsed if elapsed else 0:.0f} ops/s) with {len(threads)} workers"
+        )
+        self.stdout.write(
+            f"deposits={results['deposits']} releases={results['releases']} "
+            f"rejected={results['rejected']} errors={results['errors']}"
+        )
+        self.stdout.write(
+            f"balance {start.balance} -> {end.balance} "
+            f"(deposited {end.total_deposited}, released {end.total_released})"
+        )
+
+        if cleanup:
+            cleanup()
+
+        if failures:
+            raise CommandError('Invariant violated: ' + '; '.join(failures))
+        self.stdout.write(self.style.SUCCESS('All escrow invariants hold'))
+
+    def _check_invariants(self, start, end, results):
+        failures = []
+        if end.balance < 0:
+            failures.append(f'negative balance {end.balance}')
+        if end.balance != end.total_deposited - end.total_released:
+            failures.append('balance != total_deposited - total_released')
+        if end.total_deposited - start.total_deposited != results['deposited']:
+            failures.append('total_deposited does not match the successful deposits')
+        if end.total_released - start.total_released != results['released']:
+            failures.append('total_released does not match the successful releases')
+        if end.balance - start.balance != results['deposited'] - results['released']:
+            failures.append('balance change does not match the successful operations')
+        return failures
+
+    def _create_account(self):
+        with transaction.atomic():
+            parent = UserAccount.objects.create_user(
+                f'escrow-stress-parent-{time.time_ns()}@example.invalid')
+            surrogate = UserAccount.objects.create_user(
+                f'escrow-stress-surrogate-{time.time_ns()}@example.invalid')
+            contract = Contract.objects.create(
+                intended_parent=parent,
+                surrogate=surrogate,
+                title='Escrow stress test',
+                contract_amount=EscrowAccount.MAX_AMOUNT,
+            )
+            account = EscrowAccount.objects.create(contract=contract)
+
+        def cleanup():
+            # Cascades to the contract and the escrow account
+            UserAccount.objects.filter(pk__in=[parent.pk, surrogate.pk]).delete()
+
+        return account, cleanup
@@ -0,0 +1,200 @@
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from contracts.models import Contract, ContractRollup
+from milestones.models import Milestone
+from milestones.views import MilestoneViewSet
+from payments.models import EscrowAccount, Payment
+from payments.views import EscrowAccountViewSet, PaymentViewSet
+from user.models import UserAccount
+
+MILESTONE_AMOUNT = Decimal('125.00')
+
+
+class Command(BaseCommand):
+    help = (
+        "Settle milestones concurrently through the three-call flow "
+        "(complete, create payment, release escrow) and through "
+        "complete_and_pay, and compare throughput. Use a PostgreSQL "
+        "database; SQLite serializes writers and reports lock errors instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--milestones', type=int, default=400,
+                            help='Milestones settled by each flow.')
+        parser.add_argument('--contracts', type=int, default=4,
+                            help='Contracts the milestones are spread over; fewer '
+                                 'contracts means more contention on each escrow row.')
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        count = max(1, options['milestones'])
+        contracts = max(1, options['contracts'])
+
+        user, accounts, cleanup = self._create_contracts(contracts, count)
+        try:
+            results = []
+            for label, settle in (
+                ('three calls', self._settle_three_calls),
+                ('complete_and_pay', self._settle_pipeline),
+            ):
+                milestones = self._create_milestones(accounts, count, label)
+                results.append((label, *self._run(settle, user, milestones, workers)))
+
+            failures = self._check_invariants(accounts)
+        finally:
+            cleanup()
+
+        self.stdout.write(f"{'flow':<18} {'settled':>8} {'errors':>7} {'seconds':>8} {'per second':>11}")
+        for label, settled, errors, elapsed in results:
+            rate = settled / elapsed if elapsed else 0
+            self.stdout.write(f'{label:<18} {settled:>8} {errors:>7} {elapsed:>8.2f} {rate:>11.1f}')
+        baseline, pipeline = results
+        if baseline[3] and pipeline[3] and baseline[1]:
+            speedup = (pipeline[1] / pipeline[3]) / (baseline[1] / baseline[3])
+            self.stdout.write(f'complete_and_pay throughput: {speedup:.2f}x the three-call flow')
+
+        if failures:
+            raise CommandError('Invariant violated: ' + '; '.join(failures))
+        self.stdout.write(self.style.SUCCESS('Escrow totals match the milestone payments'))
+
+    def _run(self, settle, user, milestones, workers):
+        factory = APIRequestFactory()
+        queue = list(milestones)
+        lock = threading.Lock()
+        totals = {'settled': 0, 'errors': 0}
+
+        def worker():
+            settled = errors = 0
+            try:
+                while True:
+                    with lock:
+                        if not queue:
+                            break
+                        milestone = queue.pop()
+                    if settle(factory, user, milestone):
+                        settled += 1
+                    else:
+                        errors += 1
+            finally:
+                connection.close()
+            with lock:
+                totals['settled'] += settled
+                totals['errors'] += errors
+
+        threads = [threading.Thread(target=worker) for _ in range(workers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return totals['settled'], totals['errors'], time.perf_counter() - started
+
+    def _call(self, factory, user, viewset, actions, method, path, data, **kwargs):
+        request = getattr(factory, method)(path, data, format='json')
+        force_authenticate(request, user=user)
+        response = viewset.as_view(actions)(request, **kwargs)
+        response.render()
+        return response.status_code < 300
+
+    def _settle_three_calls(self, factory, user, milestone):
+        """What clients do today: three requests, three transactions"""
+        if not self._call(factory, user, MilestoneViewSet, {'patch': 'complete'}, 'patch',
+                          f'/api/milestones/milestones/{milestone.pk}/complete/', {},
+                          pk=milestone.pk):
+            return False
+        if not self._call(factory, user, PaymentViewSet, {'post': 'create'}, 'post',
+                          '/api/payments/payments/', {
+                              'contract': milestone.contract_id,
+                              'payer': milestone.contract.intended_parent_id,
+                              'payee': milestone.contract.surrogate_id,
+                              'amount': str(milestone.amount),
+                              'payment_type': 'milestone',
+                          }):
+            return False
+        escrow_id = milestone.contract.escrow_account.pk
+        return self._call(factory, user, EscrowAccountViewSet, {'post': 'release'}, 'post',
+                          f'/api/payments/escrow/{escrow_id}/release/',
+                          {'amount': str(milestone.amount)}, pk=escrow_id)
+
+    def _settle_pipeline(self, factory, user, milestone):
+        return self._call(factory, user, MilestoneViewSet, {'post': 'complete_and_pay'}, 'post',
+                          f'/api/milestones/milestones/{milestone.pk}/complete_and_pay/', {},
+                          pk=milestone.pk)
+
+    def _create_contracts(self, contracts, count):
+        suffix = time.time_ns()
+        funding = MILESTONE_AMOUNT * count * 2
+        with transaction.atomic():
+            parent = UserAccount.objects.create_user(
+                f'settlement-load-parent-{suffix}@example.invalid')
+            surrogate = UserAccount.objects.create_user(
+                f'settlement-load-surrogate-{suffix}@example.invalid')
+            accounts = []
+            for index in range(contracts):
+                contract = Contract.objects.create(
+                    intended_parent=parent,
+                    surrogate=surrogate,
+                    title=f'Settlement load test {index}',
+                    contract_amount=funding,
+                )
+                account = EscrowAccount.objects.create(contract=contract)
+                account.deposit(funding)
+                accounts.append(account)
+
+        def cleanup():
+            # Cascades to the contracts, milestones, payments and escrow
+            UserAccount.objects.filter(pk__in=[parent.pk, surrogate.pk]).delete()
+
+        return parent, accounts, cleanup
+
+    def _create_milestones(self, accounts, count, label):
+        offset = Milestone.objects.filter(
+            contract__in=[account.contract_id for account in accounts]
+        ).count()
+        milestones = Milestone.objects.bulk_create([
+            Milestone(
+                contract_id=accounts[index % len(accounts)].contract_id,
+                title=f'{label} {index}',
+                amount=MILESTONE_AMOUNT,
+                order=offset + index,
+            )
+            for index in range(count)
+        ])
+        ContractRollup.recompute([account.contract_id for account in accounts])
+        return list(
+            Milestone.objects.filter(pk__in=[milestone.pk for milestone in milestones])
+            .select_related('contract__escrow_account')
+        )
+
+    def _check_invariants(self, accounts):
+        failures = []
+        for account in accounts:
+            account.refresh_from_db()
+            paid = Payment.objects.filter(
+                contract_id=account.contract_id, payment_type='milestone'
+            ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+            completed = Milestone.objects.filter(
+                contract_id=account.contract_id, status='completed'
+            ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+            if account.balance != account.total_deposited - account.total_released:
+                failures.append(f'escrow {account.pk}: balance != deposited - released')
+            if account.total_released != paid:
+                failures.append(f'escrow {account.pk}: released {account.total_released} != paid {paid}')
+            if paid != completed:
+                failures.append(f'contract {account.contract_id}: paid {paid} != completed {completed}')
+            # The three-call flow leaves its payments pending, outside total_paid
+            paid_completed = Payment.objects.filter(
+                contract_id=account.contract_id, status='completed'
+            ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+            rollup = ContractRollup.objects.get(contract_id=account.contract_id)
+            if (rollup.total_paid, rollup.completed_milestone_amount) != (paid_completed, completed):
+                failures.append(f'contract {account.contract_id}: rollup out of step')
+        return failures
@@ -0,0 +1,82 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from payments.models import EscrowBalanceSnapshot, EscrowLedgerEntry
+
+
+class Command(BaseCommand):
+    help = (
+        "Write escrow balance snapshots covering the ledger entries recorded "
+        "since each account's previous snapshot. Meant to run periodically."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--settle-seconds',
+            type=int,
+            default=60,
+            help='Only cover entries older than this, so transactions still '
+                 'in flight cannot commit behind a snapshot.',
+        )
+        parser.add_argument(
+            '--min-entries',
+            type=int,
+            default=1,
+            help='Skip accounts with fewer new ledger entries than this.',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(seconds=options['settle_seconds'])
+        previous = EscrowBalanceSnapshot.objects.filter(
+            escrow_account=OuterRef('escrow_account'),
+        ).order_by('-as_of')
+
+        # One GROUP BY over the ledger tail of every account
+        tails = (
+            EscrowLedgerEntry.objects
+            .filter(created_at__lte=cutoff)
+            .annotate(previous_as_of=Subquery(previous.values('as_of')[:1]))
+            .filter(Q(previous_as_of__isnull=True) | Q(created_at__gt=F('previous_as_of')))
+            .order_by()
+            .values('escrow_account')
+            .annotate(
+                entries=Count('id'),
+                deposited=Sum('amount', filter=Q(amount__gt=0)),
+                released=Sum('amount', filter=Q(amount__lt=0)),
+                previous_id=Subquery(previous.values('id')[:1]),
+            )
+            .filter(entries__gte=options['min_entries'])
+        )
+        tails = list(tails)
+
+        previous_snapshots = EscrowBalanceSnapshot.objects.in_bulk(
+            [tail['previous_id'] for tail in tails if tail['previous_id']]
+        )
+
+        snapshots = []
+        for tail in tails:
+            base = previous_snapshots.get(tail['previous_id'])
+            deposited = tail['deposited'] or Decimal('0')
+            released = -(tail['released'] or Decimal('0'))
+            if base is not None:
+                deposited += base.total_deposited
+                released += base.total_released
+            snapshots.append(EscrowBalanceSnapshot(
+                escrow_account_id=tail['escrow_account'],
+                as_of=cutoff,
+                balance=deposited - released,
+                total_deposited=deposited,
+                total_released=released,
+            ))
+
+        with transaction.atomic():
+            EscrowBalanceSnapshot.objects.bulk_create(snapshots, batch_size=500)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {len(snapshots)} snapshot(s) as of {cutoff.isoformat()}'
+        ))
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.27 on 2026-10-18 00:50
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="escrowaccount",
+            options={"ordering": ["-created_at", "-id"]},
+        ),
+        migrations.AlterModelOptions(
+            name="payment",
+            options={"ordering": ["-created_at", "-id"]},
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 4.2.27 on 2026-10-18 00:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("contracts", "0003_access_path_indexes"),
+        ("payments", "0002_keyset_ordering"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["payer", "-created_at", "-id"], name="payment_payer_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["payee", "-created_at", "-id"], name="payment_payee_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["contract", "-created_at", "-id"],
+                name="payment_contract_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                condition=models.Q(("status__in", ["pending", "processing"])),
+                fields=["payer", "-created_at"],
+                name="payment_payer_active_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                condition=models.Q(("status__in", ["pending", "processing"])),
+                fields=["payee", "-created_at"],
+                name="payment_payee_active_idx",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="payment",
+            name="contract",
+            field=models.ForeignKey(
+                db_index=False,
+                help_text="The contract this payment is associated with",
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="payments",
+                to="contracts.contract",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="payment",
+            name="payee",
+            field=models.ForeignKey(
+                db_index=False,
+                help_text="The user receiving the payment",
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="payments_received",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="payment",
+            name="payer",
+            field=models.ForeignKey(
+                db_index=False,
+                help_text="The user making the payment",
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="payments_made",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
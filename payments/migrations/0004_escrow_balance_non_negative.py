@@ -0,0 +1,19 @@
+# Generated by Django 4.2.27 on 2026-10-18 00:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0003_access_path_indexes"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="escrowaccount",
+            constraint=models.CheckConstraint(
+                check=models.Q(("balance__gte", 0)), name="escrow_balance_non_negative"
+            ),
+        ),
+    ]
@@ -0,0 +1,147 @@
+# Generated by Django 4.2.27 on 2026-10-18 00:56
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def snapshot_opening_balances(apps, schema_editor):
+    """History before the ledger is unknown; start it from the current totals"""
+    EscrowAccount = apps.get_model("payments", "EscrowAccount")
+    EscrowBalanceSnapshot = apps.get_model("payments", "EscrowBalanceSnapshot")
+
+    as_of = django.utils.timezone.now()
+    accounts = EscrowAccount.objects.exclude(total_deposited=0, total_released=0)
+    EscrowBalanceSnapshot.objects.bulk_create(
+        [
+            EscrowBalanceSnapshot(
+                escrow_account_id=account.id,
+                as_of=as_of,
+                balance=account.balance,
+                total_deposited=account.total_deposited,
+                total_released=account.total_released,
+            )
+            for account in accounts.iterator(chunk_size=2000)
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("payments", "0004_escrow_balance_non_negative"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EscrowBalanceSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("as_of", models.DateTimeField()),
+                ("balance", models.DecimalField(decimal_places=2, max_digits=10)),
+                (
+                    "total_deposited",
+                    models.DecimalField(decimal_places=2, max_digits=10),
+                ),
+                (
+                    "total_released",
+                    models.DecimalField(decimal_places=2, max_digits=10),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "escrow_account",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="balance_snapshots",
+                        to="payments.escrowaccount",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-as_of"],
+            },
+        ),
+        migrations.CreateModel(
+            name="EscrowLedgerEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "entry_type",
+                    models.CharField(
+                        choices=[
+                            ("deposit", "Deposit"),
+                            ("release", "Release"),
+                            ("refund", "Refund"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("amount", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="escrow_ledger_entries",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "escrow_account",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ledger_entries",
+                        to="payments.escrowaccount",
+                    ),
+                ),
+                (
+                    "payment",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="ledger_entries",
+                        to="payments.payment",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at", "-id"],
+                "indexes": [
+                    models.Index(
+                        fields=["escrow_account", "created_at"],
+                        name="escrow_ledger_account_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="escrowbalancesnapshot",
+            constraint=models.UniqueConstraint(
+                fields=("escrow_account", "as_of"), name="escrow_snapshot_unique"
+            ),
+        ),
+        migrations.RunPython(snapshot_opening_balances, migrations.RunPython.noop),
+    ]
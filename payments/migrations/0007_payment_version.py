@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-18 01:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0006_idempotency_records"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payment",
+            name="version",
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.27 on 2026-10-18 01:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("milestones", "0007_overdue_tracking"),
+        ("payments", "0007_payment_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payment",
+            name="milestone",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="The milestone a milestone payment settles",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="payments",
+                to="milestones.milestone",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="payment",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("payment_type", "milestone")),
+                fields=("milestone",),
+                name="payment_milestone_unique",
+            ),
+        ),
+    ]
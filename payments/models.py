@@ -1,9 +1,31 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import F, Q, Sum
 from django.conf import settings
-from contracts.models import Contract
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from contracts.models import Contract, ContractRollupMixin
+from core.models import DirtyFieldsMixin, VersionConflict, VersionedModel
+
+
+class InsufficientFunds(Exception):
+    """Raised when a release would overdraw an escrow account"""
+
+
+class EscrowLimitExceeded(Exception):
+    """Raised when a deposit would overflow the escrow amount columns"""
 
 
-class Payment(models.Model):
+class ImmutableRecordError(Exception):
+    """Raised when an append-only record is modified or deleted"""
+
+
+class MilestoneNotPayable(Exception):
+    """Raised when settling a milestone that is already completed or cancelled"""
+
+
+class Payment(ContractRollupMixin, DirtyFieldsMixin, VersionedModel):
     """Payment model for escrow payments"""
 
     STATUS_CHOICES = [
@@ -15,6 +37,16 @@ class Payment(models.Model):
         ("refunded", "Refunded"),
     ]
 
+    # Statuses each status may move to in a bulk transition
+    STATUS_TRANSITIONS = {
+        "pending": ("processing", "completed", "failed", "cancelled"),
+        "processing": ("completed", "failed", "cancelled"),
+        "completed": ("refunded",),
+        "failed": ("pending",),
+        "cancelled": (),
+        "refunded": (),
+    }
+
     PAYMENT_TYPE_CHOICES = [
         ("deposit", "Deposit"),
         ("milestone", "Milestone Payment"),
@@ -27,20 +59,31 @@ class Payment(models.Model):
         Contract,
         on_delete=models.CASCADE,
         related_name="payments",
+        db_index=False,  # covered by payment_contract_created_idx
         help_text="The contract this payment is associated with",
     )
     payer = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
         related_name="payments_made",
+        db_index=False,  # covered by payment_payer_created_idx
         help_text="The user making the payment",
     )
     payee = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
         related_name="payments_received",
+        db_index=False,  # covered by payment_payee_created_idx
         help_text="The user receiving the payment",
     )
+    milestone = models.ForeignKey(
+        "milestones.Milestone",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="payments",
+        help_text="The milestone a milestone payment settles",
+    )
 
     # Payment details
     amount = models.DecimalField(max_digits=10, decimal_places=2)
@@ -67,13 +110,104 @@ class Payment(models.Model):
     )
 
     class Meta:
-        ordering = ["-created_at"]
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            # Role-scoped list queries: filter on one party, sort by recency.
+            models.Index(
+                fields=["payer", "-created_at", "-id"],
+                name="payment_payer_created_idx",
+            ),
+            models.Index(
+                fields=["payee", "-created_at", "-id"],
+                name="payment_payee_created_idx",
+            ),
+            models.Index(
+                fields=["contract", "-created_at", "-id"],
+                name="payment_contract_created_idx",
+            ),
+            models.Index(
+                fields=["payer", "-created_at"],
+                name="payment_payer_active_idx",
+                condition=models.Q(status__in=["pending", "processing"]),
+            ),
+            models.Index(
+                fields=["payee", "-created_at"],
+                name="payment_payee_active_idx",
+                condition=models.Q(status__in=["pending", "processing"]),
+            ),
+        ]
+        constraints = [
+            # A milestone is paid out at most once
+            models.UniqueConstraint(
+                fields=["milestone"],
+                condition=models.Q(payment_type="milestone"),
+                name="payment_milestone_unique",
+            ),
+        ]
 
     def __str__(self):
         return f"Payment {self.id} - ${self.amount} - {self.get_status_display()}"
 
+    @staticmethod
+    def rollup_contribution(state):
+        paid = state["status"] == "completed"
+        return state["contract_id"], {
+            "total_paid": Decimal(str(state["amount"])) if paid else 0,
+        }
+
+    @classmethod
+    def settle_milestone(cls, milestone, user, completion_notes="", payment_method=""):
+        """
+        Complete ``milestone``, record its milestone payment and release the
+        amount from the contract's escrow account in one transaction.
+
+        Lock order is milestone row, contract rollup row, then escrow account
+        row; anything that locks more than one must follow it. The hot escrow
+        row is taken last, by ``release()``'s conditional UPDATE, so it is
+        held only for the tail of the transaction. ``milestone`` must carry
+        the version the caller checked; a concurrent change raises
+        ``VersionConflict``.
+
+        Returns ``(milestone, payment, escrow_account)``.
+        """
+        with transaction.atomic():
+            locked = (
+                type(milestone).objects.select_for_update(of=("self",))
+                .select_related("contract")
+                .get(pk=milestone.pk)
+            )
+            if locked.version != milestone.version:
+                raise VersionConflict()
+            if locked.status not in ("pending", "in_progress"):
+                raise MilestoneNotPayable()
+            escrow_account = EscrowAccount.objects.get(contract_id=locked.contract_id)
+
+            now = timezone.now()
+            locked.status = "completed"
+            locked.completion_notes = completion_notes
+            locked.completed_by = user
+            locked.completed_date = now.date()
+            locked.save()
+
+            contract = locked.contract
+            payment = cls.objects.create(
+                contract=contract,
+                milestone=locked,
+                payer_id=contract.intended_parent_id,
+                payee_id=contract.surrogate_id,
+                amount=locked.amount,
+                payment_type="milestone",
+                status="completed",
+                payment_method=payment_method,
+                payment_date=now,
+                description=f"Milestone: {locked.title}",
+                created_by=user,
+            )
+            escrow_account.release(locked.amount, created_by=user, payment=payment)
+        return locked, payment, escrow_account
 
-class EscrowAccount(models.Model):
+
+class EscrowAccount(DirtyFieldsMixin, models.Model):
     """Escrow account to hold funds for a contract"""
 
     contract = models.OneToOneField(
@@ -86,8 +220,258 @@ class EscrowAccount(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Largest value that fits max_digits=10, decimal_places=2
+    MAX_AMOUNT = Decimal("99999999.99")
+    BALANCE_FIELDS = ("balance", "total_deposited", "total_released", "updated_at")
+
     class Meta:
-        ordering = ["-created_at"]
+        ordering = ["-created_at", "-id"]
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(balance__gte=0),
+                name="escrow_balance_non_negative",
+            ),
+        ]
 
     def __str__(self):
         return f"Escrow Account for {self.contract.title} - Balance: ${self.balance}"
+
+    def deposit(self, amount, created_by=None, payment=None):
+        """
+        Add ``amount`` to the account with a single conditional UPDATE.
+
+        The arithmetic happens in the database, so concurrent deposits and
+        releases never overwrite each other and no row lock is held beyond
+        the statement's own transaction.
+        """
+        amount = Decimal(amount)
+        headroom = self.MAX_AMOUNT - amount
+        with transaction.atomic():
+            updated = EscrowAccount.objects.filter(
+                pk=self.pk,
+                balance__lte=headroom,
+                total_deposited__lte=headroom,
+            ).update(
+                balance=F("balance") + amount,
+                total_deposited=F("total_deposited") + amount,
+                updated_at=timezone.now(),
+            )
+            if not updated:
+                raise EscrowLimitExceeded()
+            EscrowLedgerEntry.objects.create(
+                escrow_account_id=self.pk,
+                entry_type=EscrowLedgerEntry.DEPOSIT,
+                amount=amount,
+                payment=payment,
+                created_by=created_by,
+            )
+            self.refresh_from_db(fields=self.BALANCE_FIELDS)
+
+    def release(self, amount, created_by=None, payment=None, entry_type=None):
+        """
+        Remove ``amount`` from the account unless that would overdraw it.
+
+        The balance check is part of the UPDATE's WHERE clause, so two
+        concurrent releases cannot both pass it.
+        """
+        amount = Decimal(amount)
+        entry_type = entry_type or EscrowLedgerEntry.RELEASE
+        with transaction.atomic():
+            updated = EscrowAccount.objects.filter(
+                pk=self.pk,
+                balance__gte=amount,
+            ).update(
+                balance=F("balance") - amount,
+                total_released=F("total_released") + amount,
+                updated_at=timezone.now(),
+            )
+            if not updated:
+                raise InsufficientFunds()
+            EscrowLedgerEntry.objects.create(
+                escrow_account_id=self.pk,
+                entry_type=entry_type,
+                amount=-amount,
+                payment=payment,
+                created_by=created_by,
+            )
+            self.refresh_from_db(fields=self.BALANCE_FIELDS)
+
+    def refund(self, amount, created_by=None, payment=None):
+        """Return ``amount`` to the paying party; recorded as a refund entry"""
+        self.release(
+            amount,
+            created_by=created_by,
+            payment=payment,
+            entry_type=EscrowLedgerEntry.REFUND,
+        )
+
+    def balance_at(self, moment):
+        """
+        Balance and running totals as of ``moment``.
+
+        Starts from the newest snapshot taken at or before ``moment`` and adds
+        the ledger entries recorded after it, so only a short tail of the
+        ledger is read.
+        """
+        snapshot = (
+            self.balance_snapshots.filter(as_of__lte=moment)
+            .order_by("-as_of")
+            .first()
+        )
+        entries = self.ledger_entries.filter(created_at__lte=moment)
+        if snapshot is not None:
+            entries = entries.filter(created_at__gt=snapshot.as_of)
+            totals = {
+                "total_deposited": snapshot.total_deposited,
+                "total_released": snapshot.total_released,
+            }
+        else:
+            totals = {"total_deposited": Decimal("0"), "total_released": Decimal("0")}
+
+        tail = EscrowLedgerEntry.totals(entries)
+        totals["total_deposited"] += tail["total_deposited"]
+        totals["total_released"] += tail["total_released"]
+        totals["balance"] = totals["total_deposited"] - totals["total_released"]
+        return totals
+
+
+class EscrowLedgerEntry(models.Model):
+    """
+    Append-only record of every movement on an escrow account.
+
+    Entries are written in the same transaction as the balance update.
+    ``amount`` is signed: deposits are positive, releases and refunds
+    negative.
+    """
+
+    DEPOSIT = "deposit"
+    RELEASE = "release"
+    REFUND = "refund"
+    ENTRY_TYPE_CHOICES = [
+        (DEPOSIT, "Deposit"),
+        (RELEASE, "Release"),
+        (REFUND, "Refund"),
+    ]
+
+    escrow_account = models.ForeignKey(
+        EscrowAccount,
+        on_delete=models.CASCADE,
+        related_name="ledger_entries",
+        db_index=False,  # covered by escrow_ledger_account_idx
+    )
+    entry_type = models.CharField(max_length=20, choices=ENTRY_TYPE_CHOICES)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    payment = models.ForeignKey(
+        Payment,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="ledger_entries",
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="escrow_ledger_entries",
+    )
+
+    class Meta:
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            models.Index(
+                fields=["escrow_account", "created_at"],
+                name="escrow_ledger_account_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_entry_type_display()} {self.amount} on escrow {self.escrow_account_id}"
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ImmutableRecordError("Escrow ledger entries cannot be modified")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ImmutableRecordError("Escrow ledger entries cannot be deleted")
+
+    @staticmethod
+    def totals(entries):
+        """Deposited and released sums over a queryset of entries"""
+        result = entries.aggregate(
+            deposited=Sum("amount", filter=Q(amount__gt=0)),
+            released=Sum("amount", filter=Q(amount__lt=0)),
+        )
+        return {
+            "total_deposited": result["deposited"] or Decimal("0"),
+            "total_released": -(result["released"] or Decimal("0")),
+        }
+
+
+class EscrowBalanceSnapshot(models.Model):
+    """
+    Escrow totals covering every ledger entry created at or before ``as_of``.
+
+    Written periodically by the ``snapshot_escrow_balances`` command so that
+    point-in-time balances only need the ledger tail after the snapshot.
+    """
+
+    escrow_account = models.ForeignKey(
+        EscrowAccount,
+        on_delete=models.CASCADE,
+        related_name="balance_snapshots",
+        db_index=False,  # covered by escrow_snapshot_unique
+    )
+    as_of = models.DateTimeField()
+    balance = models.DecimalField(max_digits=10, decimal_places=2)
+    total_deposited = models.DecimalField(max_digits=10, decimal_places=2)
+    total_released = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-as_of"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["escrow_account", "as_of"],
+                name="escrow_snapshot_unique",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Escrow {self.escrow_account_id} balance {self.balance} as of {self.as_of}"
+
+
+class IdempotencyRecord(models.Model):
+    """
+    Stored outcome of a mutation sent with an ``Idempotency-Key`` header.
+
+    The row is inserted before the mutation runs and its response filled in
+    afterwards, all in the mutation's transaction: other transactions only
+    ever see it complete, and duplicates wait on it rather than run the
+    mutation a second time.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="idempotency_records",
+        db_index=False,  # covered by idempotency_user_key_unique
+    )
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64, help_text="SHA-256 of method, path and body")
+    response_status = models.PositiveSmallIntegerField(null=True)
+    response_body = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "key"],
+                name="idempotency_user_key_unique",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.user_id})"
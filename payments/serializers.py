@@ -1,10 +1,13 @@
+from decimal import Decimal
+
 from rest_framework import serializers
 from .models import Payment, EscrowAccount
 from contracts.serializers import ContractSerializer
 from user.serializers import UserListSerializer
+from core.serializers import ExpandableFieldsMixin
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     contract_detail = ContractSerializer(source='contract', read_only=True)
     payer_detail = UserListSerializer(source='payer', read_only=True)
     payee_detail = UserListSerializer(source='payee', read_only=True)
@@ -20,6 +23,7 @@ class PaymentSerializer(serializers.ModelSerializer):
             'payer_detail',
             'payee',
             'payee_detail',
+            'milestone',
             'amount',
             'payment_type',
             'status',
@@ -30,10 +34,17 @@ class PaymentSerializer(serializers.ModelSerializer):
             'notes',
             'created_at',
             'updated_at',
+            'version',
             'created_by',
             'created_by_detail',
         )
-        read_only_fields = ('id', 'created_at', 'updated_at', 'created_by', 'transaction_id')
+        read_only_fields = ('id', 'milestone', 'created_at', 'updated_at', 'version', 'created_by', 'transaction_id')
+        expandable_fields = (
+            'contract_detail',
+            'payer_detail',
+            'payee_detail',
+            'created_by_detail',
+        )
 
 
 class PaymentCreateSerializer(serializers.ModelSerializer):
@@ -52,7 +63,7 @@ class PaymentCreateSerializer(serializers.ModelSerializer):
         )
 
 
-class EscrowAccountSerializer(serializers.ModelSerializer):
+class EscrowAccountSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     contract_detail = ContractSerializer(source='contract', read_only=True)
     
     class Meta:
@@ -68,3 +79,12 @@ class EscrowAccountSerializer(serializers.ModelSerializer):
             'updated_at',
         )
         read_only_fields = ('id', 'balance', 'total_deposited', 'total_released', 'created_at', 'updated_at')
+        expandable_fields = ('contract_detail',)
+
+
+class EscrowAmountSerializer(serializers.Serializer):
+    """Validates the amount for escrow deposits and releases"""
+
+    amount = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=Decimal('0.01')
+    )
@@ -0,0 +1,27 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.cache import invalidate_contract
+from .models import EscrowAccount, EscrowLedgerEntry, Payment
+
+
+@receiver([post_save, post_delete], sender=Payment)
+def invalidate_payment_cache(sender, instance, **kwargs):
+    invalidate_contract(instance.contract_id, [instance.payer_id, instance.payee_id])
+
+
+@receiver([post_save, post_delete], sender=EscrowAccount)
+def invalidate_escrow_cache(sender, instance, **kwargs):
+    invalidate_contract(instance.contract_id)
+
+
+@receiver(post_save, sender=EscrowLedgerEntry)
+def invalidate_escrow_ledger_cache(sender, instance, **kwargs):
+    # Deposits and releases update the balance with queryset.update(), which
+    # sends no signal; the ledger entry written beside it does.
+    contract_id = (
+        EscrowAccount.objects.filter(pk=instance.escrow_account_id)
+        .values_list('contract_id', flat=True)
+        .first()
+    )
+    invalidate_contract(contract_id)
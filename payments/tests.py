@@ -1,4 +1,295 @@
-from django.test import TestCase
+import base64
+import json
+import threading
+import time
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.db import DatabaseError, connection
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
 
+from contracts.models import Contract
+from core.pagination import KeysetPagination
+from payments.models import EscrowAccount, EscrowLedgerEntry, IdempotencyRecord, InsufficientFunds, Payment
+from user.models import UserAccount
+
+
+class EscrowConcurrencyTestCase(TransactionTestCase):
+    """Concurrent deposits and releases on one escrow account"""
+
+    workers = 8
+    rounds = 10
+    amount = Decimal('12.50')
+
+    def setUp(self):
+        contract = Contract.objects.create(
+            intended_parent=UserAccount.objects.create_user('parent@example.com', 'pw'),
+            surrogate=UserAccount.objects.create_user('surrogate@example.com', 'pw'),
+            title='Agreement',
+            contract_amount=1000,
+        )
+        self.account = EscrowAccount.objects.create(contract=contract)
+        self.account.deposit(Decimal('100.00'))
+
+    def _retry(self, operation):
+        # SQLite serializes writers and reports a busy database instead of waiting
+        while True:
+            try:
+                return operation()
+            except DatabaseError:
+                if connection.vendor != 'sqlite':
+                    raise
+
+    def _run(self, worker):
+        barrier = threading.Barrier(self.workers)
+        errors = []
+
+        def target(index):
+            try:
+                barrier.wait()
+                worker(index)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=target, args=(i,)) for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_deposits_and_releases_balance_out(self):
+        def worker(index):
+            account = EscrowAccount(pk=self.account.pk)
+            for _ in range(self.rounds):
+                self._retry(lambda: account.deposit(self.amount))
+                self._retry(lambda: account.release(self.amount))
+
+        self._run(worker)
+
+        moved = self.amount * self.workers * self.rounds
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('100.00'))
+        self.assertEqual(self.account.total_deposited, Decimal('100.00') + moved)
+        self.assertEqual(self.account.total_released, moved)
+        self.assertEqual(
+            EscrowLedgerEntry.objects.filter(escrow_account=self.account).count(),
+            1 + 2 * self.workers * self.rounds,
+        )
+
+    def test_releases_never_overdraw(self):
+        released = []
+
+        def worker(index):
+            account = EscrowAccount(pk=self.account.pk)
+            for _ in range(self.rounds):
+                try:
+                    self._retry(lambda: account.release(self.amount))
+                except InsufficientFunds:
+                    continue
+                released.append(self.amount)
+
+        self._run(worker)
+
+        self.account.refresh_from_db()
+        self.assertEqual(sum(released), Decimal('100.00'))
+        self.assertEqual(self.account.balance, Decimal('0.00'))
+        self.assertEqual(self.account.total_released, Decimal('100.00'))
+
+
+class IdempotencyKeyTestCase(TestCase):
+    """Responses to requests with an Idempotency-Key are stored and replayed"""
+
+    def setUp(self):
+        self.parent = UserAccount.objects.create_user('parent@example.com', 'pw')
+        contract = Contract.objects.create(
+            intended_parent=self.parent,
+            surrogate=UserAccount.objects.create_user('surrogate@example.com', 'pw'),
+            title='Agreement',
+            contract_amount=1000,
+        )
+        self.account = EscrowAccount.objects.create(contract=contract)
+        self.client = APIClient()
+        self.client.force_authenticate(self.parent)
+
+    def _post(self, url, data, key):
+        return self.client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_repeat_replays_without_running_again(self):
+        url = f'/api/payments/escrow/{self.account.pk}/deposit/'
+        first = self._post(url, {'amount': '25.00'}, 'deposit-1')
+        second = self._post(url, {'amount': '25.00'}, 'deposit-1')
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.json(), first.json())
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('25.00'))
+
+    def test_raised_and_returned_errors_are_both_stored(self):
+        returned = self._post(
+            f'/api/payments/escrow/{self.account.pk}/release/', {'amount': '5.00'}, 'release-1'
+        )
+        raised = self._post('/api/payments/payments/', {'amount': 'many'}, 'payment-1')
+
+        self.assertEqual(returned.status_code, 400)
+        self.assertEqual(raised.status_code, 400)
+        for key, response in (('release-1', returned), ('payment-1', raised)):
+            with self.subTest(key):
+                record = IdempotencyRecord.objects.get(user=self.parent, key=key)
+                self.assertEqual(record.response_status, 400)
+                self.assertEqual(record.response_body, response.json())
+
+        replayed = self._post('/api/payments/payments/', {'amount': 'many'}, 'payment-1')
+        self.assertEqual(replayed['Idempotent-Replayed'], 'true')
+        self.assertEqual(replayed.json(), raised.json())
+
+    def test_crashed_action_leaves_no_record(self):
+        url = f'/api/payments/escrow/{self.account.pk}/deposit/'
+        with mock.patch.object(EscrowAccount, 'deposit', side_effect=RuntimeError('worker died')):
+            with self.assertRaises(RuntimeError):
+                self._post(url, {'amount': '25.00'}, 'deposit-1')
+
+        self.assertFalse(IdempotencyRecord.objects.exists())
+        retried = self._post(url, {'amount': '25.00'}, 'deposit-1')
+        self.assertEqual(retried.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', retried)
+
+
+class IdempotencyConcurrencyTestCase(TransactionTestCase):
+    """Duplicates sent while the first request is still running"""
+
+    workers = 4
+
+    def setUp(self):
+        self.parent = UserAccount.objects.create_user('parent@example.com', 'pw')
+        contract = Contract.objects.create(
+            intended_parent=self.parent,
+            surrogate=UserAccount.objects.create_user('surrogate@example.com', 'pw'),
+            title='Agreement',
+            contract_amount=1000,
+        )
+        self.account = EscrowAccount.objects.create(contract=contract)
+
+    def test_duplicates_wait_for_the_first_response(self):
+        barrier = threading.Barrier(self.workers)
+        responses = []
+        deposit = EscrowAccount.deposit
+
+        def slow_deposit(account, amount, **kwargs):
+            # Keep the first request in flight while the duplicates arrive
+            time.sleep(0.2)
+            return deposit(account, amount, **kwargs)
+
+        def target():
+            client = APIClient()
+            client.force_authenticate(self.parent)
+            try:
+                barrier.wait()
+                while True:
+                    try:
+                        response = client.post(
+                            f'/api/payments/escrow/{self.account.pk}/deposit/',
+                            {'amount': '25.00'},
+                            format='json',
+                            HTTP_IDEMPOTENCY_KEY='deposit-1',
+                        )
+                    except DatabaseError:
+                        # SQLite reports a locked table where Postgres waits on the index
+                        if connection.vendor != 'sqlite':
+                            raise
+                        continue
+                    responses.append(response)
+                    break
+            finally:
+                connection.close()
+
+        with mock.patch.object(EscrowAccount, 'deposit', slow_deposit):
+            threads = [threading.Thread(target=target) for _ in range(self.workers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual([response.status_code for response in responses], [200] * self.workers)
+        self.assertEqual(len({json.dumps(response.json()) for response in responses}), 1)
+        self.assertEqual(EscrowLedgerEntry.objects.filter(escrow_account=self.account).count(), 1)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('25.00'))
+
+
+class PaymentPaginationTestCase(TestCase):
+    """Keyset cursors on the payment list"""
+
+    url = '/api/payments/payments/'
+
+    def setUp(self):
+        self.parent = UserAccount.objects.create_user('parent@example.com', 'pw')
+        self.surrogate = UserAccount.objects.create_user('surrogate@example.com', 'pw')
+        self.contract = Contract.objects.create(
+            intended_parent=self.parent,
+            surrogate=self.surrogate,
+            title='Agreement',
+            contract_amount=1000,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.parent)
+
+    def _payments(self, count):
+        Payment.objects.bulk_create(
+            Payment(
+                contract=self.contract,
+                payer=self.parent,
+                payee=self.surrogate,
+                amount=Decimal('10.00'),
+                payment_type='deposit',
+            )
+            for _ in range(count)
+        )
+        # Newest first, ties on created_at broken by id
+        return list(Payment.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+
+    def _ids(self, response):
+        return [payment['id'] for payment in response.json()['results']]
+
+    def test_cursors_walk_forward_and_back(self):
+        expected = self._payments(5)
+
+        pages = []
+        response = self.client.get(self.url, {'page_size': 2})
+        self.assertIsNone(response.json()['previous'])
+        while True:
+            pages.append(self._ids(response))
+            next_link = response.json()['next']
+            if next_link is None:
+                break
+            response = self.client.get(next_link)
+        self.assertEqual(pages, [expected[0:2], expected[2:4], expected[4:5]])
+
+        response = self.client.get(response.json()['previous'])
+        self.assertEqual(self._ids(response), expected[2:4])
+        response = self.client.get(response.json()['previous'])
+        self.assertEqual(self._ids(response), expected[0:2])
+        self.assertIsNone(response.json()['previous'])
+
+    def test_bad_cursor_is_not_found(self):
+        wrong_length = base64.urlsafe_b64encode(json.dumps({'p': [1], 'r': 0}).encode()).decode()
+        wrong_type = base64.urlsafe_b64encode(json.dumps({'p': ['yesterday', 'x'], 'r': 0}).encode()).decode()
+        for cursor in ('not-a-cursor', wrong_length, wrong_type):
+            with self.subTest(cursor):
+                response = self.client.get(self.url, {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+
+    def test_page_size_is_capped(self):
+        self._payments(KeysetPagination.max_page_size + 5)
+
+        response = self.client.get(self.url, {'page_size': 10000})
+        self.assertEqual(len(response.json()['results']), KeysetPagination.max_page_size)
+        self.assertIsNotNone(response.json()['next'])
+
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.json()['results']), KeysetPagination.page_size)
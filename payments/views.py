@@ -1,22 +1,73 @@
+from collections import defaultdict
+from decimal import Decimal
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from contracts.models import ContractParticipant, ContractRollup
+from core.exports import EXPORT_FORMATS, export_response
+from core.cache import cached_read
+from core.mixins import (
+    BulkStatusMixin,
+    CachedReadMixin,
+    ConditionalReadMixin,
+    ExpandableQuerysetMixin,
+    VersionedUpdateMixin,
+)
+from core.models import VersionConflict
+from core.versioning import check_version, precondition_failed
 
-from .models import Payment, EscrowAccount
+from .idempotency import idempotent
+from .models import (
+    Payment,
+    EscrowAccount,
+    EscrowLedgerEntry,
+    InsufficientFunds,
+    EscrowLimitExceeded,
+)
 from .serializers import (
     PaymentSerializer,
     PaymentCreateSerializer,
     EscrowAccountSerializer,
+    EscrowAmountSerializer,
 )
 
 
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentViewSet(
+    ConditionalReadMixin,
+    CachedReadMixin,
+    VersionedUpdateMixin,
+    BulkStatusMixin,
+    ExpandableQuerysetMixin,
+    viewsets.ModelViewSet,
+):
     """ViewSet for managing payments"""
     
     permission_classes = [IsAuthenticated]
     serializer_class = PaymentSerializer
+    expand_select_related = {
+        'contract': 'contract__rollup',
+        'contract.intended_parent': 'contract__intended_parent',
+        'contract.surrogate': 'contract__surrogate',
+        'contract.created_by': 'contract__created_by',
+        'payer': 'payer',
+        'payee': 'payee',
+        'created_by': 'created_by',
+    }
+    expand_prefetch_related = {
+        'contract.documents': 'contract__documents__uploaded_by',
+    }
+    bulk_status_user_fields = ('payer_id', 'payee_id')
+    
+    def bulk_status_changed(self, contract_ids):
+        # The bulk UPDATE skips save(), so the rollup deltas were not applied
+        ContractRollup.recompute(contract_ids)
     
     def get_queryset(self):
         """Filter payments based on user role"""
@@ -34,23 +85,118 @@ class PaymentViewSet(viewsets.ModelViewSet):
         if contract_id:
             queryset = queryset.filter(contract_id=contract_id)
         
-        return queryset.select_related('contract', 'payer', 'payee', 'created_by')
+        # Filter by status if provided (comma-separated); open statuses
+        # are served by the partial indexes
+        status_filter = self.request.query_params.get('status')
+        if status_filter:
+            queryset = queryset.filter(status__in=status_filter.split(','))
+        
+        return self.expand_queryset(queryset)
     
     def get_serializer_class(self):
         if self.action == 'create':
             return PaymentCreateSerializer
         return PaymentSerializer
     
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+    
     def perform_create(self, serializer):
         """Set the created_by field to the current user"""
         serializer.save(created_by=self.request.user)
     
+    export_columns = (
+        ('id', 'id'),
+        ('contract', 'contract_id'),
+        ('contract_title', 'contract__title'),
+        ('payer', 'payer_id'),
+        ('payer_email', 'payer__email'),
+        ('payee', 'payee_id'),
+        ('payee_email', 'payee__email'),
+        ('amount', 'amount'),
+        ('payment_type', 'payment_type'),
+        ('status', 'status'),
+        ('transaction_id', 'transaction_id'),
+        ('payment_method', 'payment_method'),
+        ('payment_date', 'payment_date'),
+        ('description', 'description'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+    )
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream the scoped payment history as CSV or NDJSON"""
+        export_format = request.query_params.get('export_format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'error': 'Invalid export format'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        queryset = self.get_queryset().order_by('-created_at', '-id')
+        return export_response(queryset, self.export_columns, export_format, 'payments')
+    
+    @action(detail=False, methods=['get'])
+    @cached_read
+    def summary(self, request):
+        """Payment totals by status, type, contract and month"""
+        # One GROUP BY over the finest grain; the coarser breakdowns are
+        # folded from its (small) result in Python.
+        rows = (
+            self.get_queryset()
+            .select_related(None)
+            .prefetch_related(None)
+            .order_by()
+            .annotate(month=TruncMonth('created_at'))
+            .values('status', 'payment_type', 'contract_id', 'month')
+            .annotate(count=Count('id'), amount=Sum('amount'))
+        )
+        
+        groups = {
+            'by_status': defaultdict(lambda: [0, Decimal('0')]),
+            'by_payment_type': defaultdict(lambda: [0, Decimal('0')]),
+            'by_contract': defaultdict(lambda: [0, Decimal('0')]),
+            'by_month': defaultdict(lambda: [0, Decimal('0')]),
+        }
+        total = [0, Decimal('0')]
+        for row in rows:
+            keys = {
+                'by_status': row['status'],
+                'by_payment_type': row['payment_type'],
+                'by_contract': row['contract_id'],
+                'by_month': row['month'].strftime('%Y-%m'),
+            }
+            for group, key in keys.items():
+                groups[group][key][0] += row['count']
+                groups[group][key][1] += row['amount']
+            total[0] += row['count']
+            total[1] += row['amount']
+        
+        labels = {
+            'by_status': 'status',
+            'by_payment_type': 'payment_type',
+            'by_contract': 'contract',
+            'by_month': 'month',
+        }
+        data = {'total': {'count': total[0], 'amount': f'{total[1]:.2f}'}}
+        for group, values in groups.items():
+            data[group] = [
+                {labels[group]: key, 'count': count, 'amount': f'{amount:.2f}'}
+                for key, (count, amount) in sorted(values.items())
+            ]
+        return Response(data)
+    
     @action(detail=True, methods=['patch'])
     def update_status(self, request, pk=None):
         """Update payment status"""
         payment = self.get_object()
-        new_status = request.data.get('status')
+        error = check_version(request, payment)
+        if error:
+            return error
         
+        new_status = request.data.get('status')
         if new_status not in dict(Payment.STATUS_CHOICES):
             return Response(
                 {'error': 'Invalid status'},
@@ -58,17 +204,34 @@ class PaymentViewSet(viewsets.ModelViewSet):
             )
         
         payment.status = new_status
-        payment.save()
+        try:
+            payment.save()
+        except VersionConflict:
+            return precondition_failed()
         
         serializer = self.get_serializer(payment)
         return Response(serializer.data)
 
 
-class EscrowAccountViewSet(viewsets.ReadOnlyModelViewSet):
+class EscrowAccountViewSet(
+    ConditionalReadMixin,
+    CachedReadMixin,
+    ExpandableQuerysetMixin,
+    viewsets.ReadOnlyModelViewSet,
+):
     """ViewSet for viewing escrow accounts"""
     
     permission_classes = [IsAuthenticated]
     serializer_class = EscrowAccountSerializer
+    expand_select_related = {
+        'contract': 'contract__rollup',
+        'contract.intended_parent': 'contract__intended_parent',
+        'contract.surrogate': 'contract__surrogate',
+        'contract.created_by': 'contract__created_by',
+    }
+    expand_prefetch_related = {
+        'contract.documents': 'contract__documents__uploaded_by',
+    }
     
     def get_queryset(self):
         """Filter escrow accounts based on user role"""
@@ -77,57 +240,154 @@ class EscrowAccountViewSet(viewsets.ReadOnlyModelViewSet):
         
         # Users can see escrow accounts for their contracts
         if not user.is_superuser:
-            queryset = queryset.filter(
-                Q(contract__intended_parent=user) | Q(contract__surrogate=user)
-            )
+            queryset = queryset.filter(ContractParticipant.visible_to(user, 'contract_id'))
         
         # Filter by contract if provided
         contract_id = self.request.query_params.get('contract')
         if contract_id:
             queryset = queryset.filter(contract_id=contract_id)
         
-        return queryset.select_related('contract')
+        return self.expand_queryset(queryset)
+    
+    ledger_export_columns = (
+        ('id', 'id'),
+        ('escrow_account', 'escrow_account_id'),
+        ('contract', 'escrow_account__contract_id'),
+        ('entry_type', 'entry_type'),
+        ('amount', 'amount'),
+        ('payment', 'payment_id'),
+        ('created_by', 'created_by_id'),
+        ('created_at', 'created_at'),
+    )
+    
+    @action(detail=False, methods=['get'], url_path='ledger/export')
+    def ledger_export(self, request):
+        """Stream ledger entries of the scoped escrow accounts as CSV or NDJSON"""
+        export_format = request.query_params.get('export_format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'error': 'Invalid export format'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        entries = EscrowLedgerEntry.objects.filter(
+            escrow_account__in=self.get_queryset().values('id')
+        )
+        for param, lookup in (('since', 'created_at__gte'), ('until', 'created_at__lt')):
+            value = request.query_params.get(param)
+            if not value:
+                continue
+            moment = parse_datetime(value)
+            if moment is None:
+                return Response(
+                    {'error': f'Invalid {param} timestamp'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if timezone.is_naive(moment):
+                moment = timezone.make_aware(moment)
+            entries = entries.filter(**{lookup: moment})
+        
+        entries = entries.order_by('escrow_account_id', 'created_at', 'id')
+        return export_response(entries, self.ledger_export_columns, export_format, 'escrow-ledger')
+    
+    def retrieve(self, request, *args, **kwargs):
+        """Escrow account, optionally as of ``?balance_at=<ISO timestamp>``"""
+        balance_at = request.query_params.get('balance_at')
+        if not balance_at:
+            return super().retrieve(request, *args, **kwargs)
+        
+        moment = parse_datetime(balance_at)
+        if moment is None:
+            return Response(
+                {'error': 'Invalid balance_at timestamp'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        
+        escrow_account = self.get_object()
+        serializer = self.get_serializer(escrow_account)
+        data = serializer.data
+        for field_name, value in escrow_account.balance_at(moment).items():
+            if field_name in serializer.fields:
+                data[field_name] = serializer.fields[field_name].to_representation(value)
+        data['balance_at'] = moment
+        return Response(data)
+    
+    def _validated_amount(self, request):
+        amount_serializer = EscrowAmountSerializer(data=request.data)
+        if not amount_serializer.is_valid():
+            return None
+        return amount_serializer.validated_data['amount']
     
     @action(detail=True, methods=['post'])
+    @idempotent
     def deposit(self, request, pk=None):
         """Deposit funds into escrow account"""
         escrow_account = self.get_object()
-        amount = request.data.get('amount')
+        amount = self._validated_amount(request)
         
-        if not amount or float(amount) <= 0:
+        if amount is None:
             return Response(
                 {'error': 'Invalid amount'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        escrow_account.balance += float(amount)
-        escrow_account.total_deposited += float(amount)
-        escrow_account.save()
+        try:
+            escrow_account.deposit(amount, created_by=request.user)
+        except EscrowLimitExceeded:
+            return Response(
+                {'error': 'Deposit exceeds the escrow account limit'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         serializer = self.get_serializer(escrow_account)
         return Response(serializer.data)
     
     @action(detail=True, methods=['post'])
+    @idempotent
     def release(self, request, pk=None):
         """Release funds from escrow account"""
         escrow_account = self.get_object()
-        amount = request.data.get('amount')
+        amount = self._validated_amount(request)
         
-        if not amount or float(amount) <= 0:
+        if amount is None:
             return Response(
                 {'error': 'Invalid amount'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        if escrow_account.balance < float(amount):
+        try:
+            escrow_account.release(amount, created_by=request.user)
+        except InsufficientFunds:
             return Response(
                 {'error': 'Insufficient balance'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        escrow_account.balance -= float(amount)
-        escrow_account.total_released += float(amount)
-        escrow_account.save()
+        serializer = self.get_serializer(escrow_account)
+        return Response(serializer.data)
+    
+    @action(detail=True, methods=['post'])
+    @idempotent
+    def refund(self, request, pk=None):
+        """Refund funds from escrow account"""
+        escrow_account = self.get_object()
+        amount = self._validated_amount(request)
+        
+        if amount is None:
+            return Response(
+                {'error': 'Invalid amount'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            escrow_account.refund(amount, created_by=request.user)
+        except InsufficientFunds:
+            return Response(
+                {'error': 'Insufficient balance'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         serializer = self.get_serializer(escrow_account)
         return Response(serializer.data)
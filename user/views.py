@@ -16,6 +16,7 @@ from .serializers import (
     UserListSerializer,
 )
 from .models import UserAccount
+from core.pagination import KeysetPagination
 
 
 class CustomTokenObtainPairView(TokenObtainPairView):
@@ -114,12 +115,23 @@ class UserListView(APIView):
     """View for listing users with basic information"""
 
     permission_classes = (IsAuthenticated,)
+    keyset_ordering = ("email", "id")
 
     def get(self, request):
         """Get list of users with their basic information"""
-        users = UserAccount.objects.filter(is_active=True).order_by("email")
+        paginator = KeysetPagination()
+        users = paginator.paginate_queryset(
+            UserAccount.objects.filter(is_active=True), request, view=self
+        )
         serializer = UserListSerializer(users, many=True)
-        return Response({"status": "success", "users": serializer.data})
+        return Response(
+            {
+                "status": "success",
+                "users": serializer.data,
+                "next": paginator.get_next_link(),
+                "previous": paginator.get_previous_link(),
+            }
+        )
 
 
 class UserDetailView(APIView):